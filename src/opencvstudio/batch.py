@@ -0,0 +1,317 @@
+"""
+Run a saved pipeline over many images without UI.
+
+    python -m opencvstudio.batch pipeline.json scans/ -o out/
+    python -m opencvstudio.batch pipeline.json "scans/*.png" -o out/ -j 8
+    python -m opencvstudio.batch pipeline.json scans/ --check
+
+Outputs of operations besides the image, e.g. recognized text, are saved as
+JSON next to each output image (see `engine.outputs`).
+
+Only pipelines that are a chain of operations can be run. Pipeline graphs
+with branches or operations with several inputs, e.g. "mask", are rejected
+(see `engine.graph`).
+"""
+import argparse
+import csv
+import glob
+import logging
+import os
+import statistics
+import sys
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from time import perf_counter
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+
+from opencvstudio.dataops import save_image
+from opencvstudio.engine import apply_operations, validate_operations
+from opencvstudio.engine.outputs import save_outputs
+from opencvstudio.engine.parallel import imap_bounded
+from opencvstudio.engine.pipeline import PipelineFormatError, load_pipeline
+from opencvstudio.loader import load_image
+from opencvstudio.opmodel import Operation, OperationContext, \
+    OperationResult, is_error
+from opencvstudio.primitives.error import ImageOperationError
+from opencvstudio.primitives.image import ImageSpec
+
+
+logger = logging.getLogger("opencvstudio.batch")
+
+IMAGE_SUFFIXES = frozenset((
+    ".bmp", ".jpeg", ".jpg", ".jp2", ".pbm", ".pgm", ".png", ".ppm",
+    ".tif", ".tiff", ".webp",
+))
+
+
+@dataclass
+class ItemResult:
+    source: str
+    target: str
+    seconds: float
+    error: Optional[str] = None
+
+
+def iter_inputs(inputs: Iterable[str], recursive: bool = False) \
+        -> Iterator[Tuple[Path, Path]]:
+    """
+    Find images in directories or glob patterns.
+
+    :return: pairs of image path and its path relative to the input, i.e.
+      the directory or the directories of a glob pattern before the first
+      wildcard
+    """
+    for spec in inputs:
+        if os.path.isdir(spec):
+            root = Path(spec)
+            for path in _walk(root, recursive):
+                yield path, path.relative_to(root)
+        else:
+            root = _glob_root(spec)
+            for path in sorted(glob.iglob(spec, recursive=recursive)):
+                if os.path.isfile(path):
+                    yield Path(path), Path(path).relative_to(root)
+
+
+def _glob_root(pattern: str) -> Path:
+    root = Path()
+    for part in Path(pattern).parent.parts:
+        if any(c in part for c in "*?["):
+            break
+        root /= part
+    return root
+
+
+def _walk(root: Path, recursive: bool) -> Iterator[Path]:
+    with os.scandir(root) as it:
+        entries = sorted(it, key=lambda entry: entry.name)
+
+    for entry in entries:
+        if entry.is_dir():
+            if recursive:
+                yield from _walk(Path(entry.path), recursive)
+        elif os.path.splitext(entry.name)[1].lower() in IMAGE_SUFFIXES:
+            yield Path(entry.path)
+
+
+def pipeline_errors(operations: List[Operation],
+                    spec: ImageSpec) -> List[str]:
+    """
+    :return: descriptions of errors, which prevent execution of `operations`
+      on an input described by `spec`
+    """
+    return [
+        f"step {i + 1} ({operations[i]}): {error}"
+        for i, errors in validate_operations(operations, spec)
+        for error in errors
+        if is_error(error)
+    ]
+
+
+def check_inputs(operations: List[Operation],
+                 items: Iterable[Tuple[Path, Path]]) -> int:
+    """
+    Validate `operations` against each input. Usually only the image
+    headers are read.
+
+    :return: 0 if all inputs are valid, otherwise 2
+    """
+    result = 0
+    for source, _ in items:
+        try:
+            errors = pipeline_errors(operations, load_image(source).spec)
+        except OSError as e:
+            errors = [str(e)]
+        for error in errors:
+            logger.error(f"{source}: {error}")
+            result = 2
+    return result
+
+
+_operations: List[Operation] = []
+_context = OperationContext()
+
+
+def _init_worker(operations: List[Operation]) -> None:
+    global _operations
+    _operations = operations
+
+
+def outputs_path(target: Union[str, Path]) -> Path:
+    """
+    :return: path of the outputs besides the image saved at `target`, e.g.
+      "a.png.json", so images differing only in suffix keep them apart
+    """
+    target = Path(target)
+    return target.with_name(f"{target.name}.json")
+
+
+def process_image(item: Tuple[str, str]) -> ItemResult:
+    source, target = item
+    start = perf_counter()
+    try:
+        img = load_image(source)
+        errors = pipeline_errors(_operations, img.spec)
+        if errors:
+            raise ImageOperationError("; ".join(errors))
+        result = apply_operations(
+            _context, _operations, OperationResult(img))
+        os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+        save_image(target, result.image.data, result.image.color)
+        if result.outputs:
+            save_outputs(outputs_path(target), result.outputs)
+        # reuse arrays for the next image
+        _context.release(result.image)
+    except Exception as e:
+        error = f"{type(e).__name__}: {str(e).strip()}"
+        return ItemResult(source, target, perf_counter() - start, error)
+    return ItemResult(source, target, perf_counter() - start)
+
+
+def run_batch(operations: List[Operation],
+              items: Iterable[Tuple[Path, Path]],
+              jobs: Optional[int] = None,
+              max_pending: Optional[int] = None) -> Iterator[ItemResult]:
+    """
+    Process images on a process pool.
+
+    At most `max_pending` images are queued at once, so memory usage does not
+    depend on the number of images. Results are yielded in input order.
+    """
+    jobs = jobs or os.cpu_count() or 1
+    max_pending = max_pending or 2 * jobs
+
+    with ProcessPoolExecutor(jobs, initializer=_init_worker,
+                             initargs=(operations,)) as executor:
+        yield from imap_bounded(
+            executor, process_image,
+            ((str(source), str(target)) for source, target in items),
+            max_pending=max_pending)
+
+
+class Summary:
+    def __init__(self):
+        self.succeeded = 0
+        self.failed = 0
+        self.times = array("d")
+
+    def add(self, result: ItemResult) -> None:
+        self.times.append(result.seconds)
+        if result.error is None:
+            self.succeeded += 1
+        else:
+            self.failed += 1
+
+    def format(self, wall_time: float) -> str:
+        count = len(self.times)
+        lines = [
+            f"Images:     {count} ({self.succeeded} ok, {self.failed} failed)",
+            f"Wall time:  {wall_time:.2f} s",
+        ]
+        if count:
+            times = sorted(self.times)
+            lines += [
+                f"Throughput: {count / wall_time:.2f} images/s",
+                f"Per image:  mean {statistics.mean(times) * 1000:.1f} ms, "
+                f"median {statistics.median(times) * 1000:.1f} ms, "
+                f"p95 {times[int(0.95 * (count - 1))] * 1000:.1f} ms, "
+                f"max {times[-1] * 1000:.1f} ms",
+            ]
+        return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(
+        prog="python -m opencvstudio.batch",
+        description="Run a saved pipeline over many images")
+    parser.add_argument("pipeline", help="saved pipeline")
+    parser.add_argument("inputs", nargs="+",
+                        help="input directories or glob patterns")
+    parser.add_argument("-o", "--output", default=None,
+                        help="output directory")
+    parser.add_argument("-r", "--recursive", action="store_true",
+                        help="descend into subdirectories")
+    parser.add_argument("-f", "--format", default=None,
+                        help="output file suffix, e.g. png "
+                             "(default: same as input)")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="number of worker processes (default: cores)")
+    parser.add_argument("--max-pending", type=int, default=None,
+                        help="images queued at once (default: 2 * jobs)")
+    parser.add_argument("--report", default=None,
+                        help="write per-image timing as CSV")
+    parser.add_argument("--check", action="store_true",
+                        help="only validate the pipeline against the image "
+                             "headers of all inputs")
+    args = parser.parse_args(argv)
+    if args.output is None and not args.check:
+        parser.error("the following arguments are required: -o/--output")
+
+    try:
+        operations = load_pipeline(args.pipeline)
+    except (OSError, PipelineFormatError) as e:
+        logger.error(f"Failed to load pipeline: {e}")
+        return 2
+
+    if args.check:
+        return check_inputs(
+            operations, iter_inputs(args.inputs, args.recursive))
+
+    # reject pipeline before starting workers
+    first = next(iter_inputs(args.inputs, args.recursive), None)
+    if first is not None and check_inputs(operations, [first]) != 0:
+        return 2
+
+    output = Path(args.output)
+    summary = Summary()
+    report = open(args.report, "w", newline="") if args.report else None
+    writer = csv.writer(report) if report else None
+
+    def record(result: ItemResult) -> None:
+        summary.add(result)
+        if result.error is not None:
+            logger.warning(f"{result.source}: {result.error}")
+        if writer:
+            writer.writerow((result.source, result.target,
+                             f"{result.seconds:.6f}", result.error or ""))
+
+    def items():
+        # source by target, e.g. a.png and a.jpg both map to a.bmp with -f
+        sources = {}
+        for source, relative in iter_inputs(args.inputs, args.recursive):
+            if args.format:
+                relative = relative.with_suffix(f".{args.format}")
+            target = output / relative
+            if target in sources:
+                # unless matched by several inputs
+                if sources[target] != source:
+                    record(ItemResult(
+                        str(source), str(target), 0.0,
+                        f"Target is already written for {sources[target]}"))
+                continue
+            sources[target] = source
+            yield source, target
+
+    try:
+        if writer:
+            writer.writerow(("source", "target", "seconds", "error"))
+
+        start = perf_counter()
+        for result in run_batch(
+                operations, items(), args.jobs, args.max_pending):
+            record(result)
+        wall_time = perf_counter() - start
+    finally:
+        if report:
+            report.close()
+
+    print(summary.format(wall_time))
+    return 1 if summary.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
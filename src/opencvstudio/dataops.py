@@ -1,8 +1,10 @@
 import os
+import struct
 from pathlib import Path
-from typing import Union
+from typing import BinaryIO, Iterator, Optional, Tuple, Union
 
 import cv2
+import numpy
 from opencvstudio.primitives import Box, ImageData
 from opencvstudio.primitives.color import ColorSpace
 from opencvstudio.primitives.error import ImageOperationError
@@ -15,19 +17,189 @@ def open_image(path: Union[str, Path]) -> ImageData:
     return img
 
 
+def read_image(path: Union[str, Path],
+               flags: int = cv2.IMREAD_UNCHANGED) -> ImageData:
+    """
+    Decode an image file keeping alpha channel and depth unless `flags`
+    say otherwise. ``.npy`` files are memory-mapped (see `open_npy`).
+    """
+    if Path(path).suffix.lower() == ".npy":
+        return open_npy(path)
+
+    img = cv2.imread(str(path), flags)
+    if img is None:
+        raise IOError(f"Failed to load image at {path}")
+    return img
+
+
+#: header of the data returned by `read_image`
+ImageHeader = Tuple[int, int, int, numpy.dtype]
+
+
+def read_image_header(path: Union[str, Path]) -> Optional[ImageHeader]:
+    """
+    Read width, height, channels and depth of the data `read_image` returns
+    without decoding. PNG, JPEG and ``.npy`` files are supported.
+
+    :return: the header or `None` for unsupported formats
+    """
+    if Path(path).suffix.lower() == ".npy":
+        data = open_npy(path)
+        channels = data.shape[2] if data.ndim == 3 else 1
+        return data.shape[1], data.shape[0], channels, data.dtype
+
+    try:
+        with open(path, "rb") as fp:
+            signature = fp.read(8)
+            if signature == b"\x89PNG\r\n\x1a\n":
+                return _png_header(fp)
+            if signature[:2] == b"\xff\xd8":
+                fp.seek(2)
+                return _jpeg_header(fp)
+    except struct.error as e:
+        raise IOError(f"Invalid image header in {path}") from e
+    return None
+
+
+def _png_header(fp: BinaryIO) -> ImageHeader:
+    length, chunk = struct.unpack(">I4s", fp.read(8))
+    if chunk != b"IHDR":
+        raise IOError("PNG without IHDR chunk")
+    width, height, bit_depth, color_type = struct.unpack(
+        ">IIBB", fp.read(10))
+    fp.seek(length - 10 + 4, os.SEEK_CUR)
+
+    # same rules as OpenCV's PNG decoder
+    if color_type in (4, 6):  # gray + alpha, RGB + alpha
+        channels = 4
+    elif color_type in (2, 3):  # RGB, palette
+        channels = 3
+        while True:
+            length, chunk = struct.unpack(">I4s", fp.read(8))
+            if chunk == b"tRNS":
+                channels = 4
+            if chunk in (b"tRNS", b"IDAT", b"IEND"):
+                break
+            fp.seek(length + 4, os.SEEK_CUR)
+    else:
+        channels = 1
+    dtype = numpy.dtype(numpy.uint16 if bit_depth == 16 else numpy.uint8)
+    return width, height, channels, dtype
+
+
+def _jpeg_header(fp: BinaryIO) -> ImageHeader:
+    while True:
+        marker = fp.read(2)
+        while marker[1:] == b"\xff":  # fill bytes
+            marker = marker[1:] + fp.read(1)
+        if len(marker) < 2 or marker[0] != 0xff:
+            raise IOError("JPEG without frame header")
+
+        code = marker[1]
+        if 0xd0 <= code <= 0xd7 or code == 0x01:
+            continue  # without length
+        length, = struct.unpack(">H", fp.read(2))
+        if 0xc0 <= code <= 0xcf and code not in (0xc4, 0xc8, 0xcc):
+            _, height, width, components = struct.unpack(
+                ">BHHB", fp.read(6))
+            # OpenCV converts YCbCr and CMYK to BGR
+            channels = 1 if components == 1 else 3
+            return width, height, channels, numpy.dtype(numpy.uint8)
+        fp.seek(length - 2, os.SEEK_CUR)
+
+
+def open_npy(path: Union[str, Path]) -> ImageData:
+    """
+    Open image data saved with `numpy.save` memory-mapped, i.e. without
+    reading it.
+    """
+    return numpy.load(str(path), mmap_mode="r")
+
+
+def create_npy(path: Union[str, Path], shape: Tuple[int, ...],
+               dtype: numpy.dtype) -> ImageData:
+    """
+    Create a memory-mapped ``.npy`` file for image data.
+    """
+    return numpy.lib.format.open_memmap(
+        str(path), mode="w+", shape=shape, dtype=dtype)
+
+
+def read_frames(video: Union[str, Path, int, cv2.VideoCapture]) \
+        -> Iterator[ImageData]:
+    """
+    Read frames of a video file, camera or `cv2.VideoCapture` one by one.
+
+    A capture opened by this function is released when the iterator is
+    exhausted or closed.
+    """
+    if isinstance(video, cv2.VideoCapture):
+        capture = video
+    else:
+        capture = cv2.VideoCapture(
+            video if isinstance(video, int) else str(video))
+        if not capture.isOpened():
+            raise IOError(f"Failed to open video {video}")
+
+    try:
+        while True:
+            ok, frame = capture.read()
+            if not ok:
+                return
+            yield frame
+    finally:
+        if capture is not video:
+            capture.release()
+
+
+def save_image(
+        path: Union[str, Path], img: ImageData, color: ColorSpace) -> None:
+    if color == ColorSpace.RGB:
+        img = convert_color(img, color, ColorSpace.BGR)
+    elif color == ColorSpace.RGBA:
+        img = cv2.cvtColor(img, cv2.COLOR_RGBA2BGRA)
+
+    if not cv2.imwrite(str(path), img):
+        raise IOError(f"Failed to save image at {path}")
+
+
 def crop(img: ImageData, box: Box) -> ImageData:
     return img[box.y:box.y+box.height, box.x:box.x+box.width]
 
 
+def rescale(img: ImageData, factor: float) -> ImageData:
+    if factor == 1.0:
+        return img
+
+    height, width = img.shape[:2]
+    size = (max(round(width * factor), 1), max(round(height * factor), 1))
+    return cv2.resize(
+        img, size,
+        interpolation=cv2.INTER_AREA if factor < 1.0 else cv2.INTER_LINEAR)
+
+
 def convert_color(
-        img: ImageData, from_: ColorSpace, to: ColorSpace) -> ImageData:
-    conv = getattr(cv2, f"COLOR_{from_}2{to}")
+        img: ImageData, from_: ColorSpace, to: ColorSpace,
+        dst: Optional[ImageData] = None) -> ImageData:
+    """
+    :param dst: array for the result, may be `img` for conversions keeping
+      the number of channels
+    """
+    if from_ == to:
+        return img
+
+    conv = _color_conversion(from_, to)
     if conv is not None:
-        return cv2.cvtColor(img, conv)
+        return cv2.cvtColor(img, conv, dst=dst)
     else:
         raise ImageOperationError(
             f"No color convertion from {from_} to {to} supported")
 
 
 def can_convert_color(from_: ColorSpace, to: ColorSpace) -> bool:
-    return hasattr(cv2, f"COLOR_{from_}2{to}")
+    return from_ == to or _color_conversion(from_, to) is not None
+
+
+def _color_conversion(from_: ColorSpace, to: ColorSpace) -> Optional[int]:
+    return getattr(
+        cv2, f"COLOR_{ColorSpace(from_).value}2{ColorSpace(to).value}", None)
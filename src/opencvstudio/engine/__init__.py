@@ -1,38 +1,365 @@
-from functools import reduce
-from typing import Optional
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Dict, Iterable, Iterator, List, \
+    MutableMapping, NamedTuple, Optional, Tuple
+from weakref import WeakValueDictionary
 
-from opencvstudio.opmodel import Operation, OperationContext
-from opencvstudio.primitives.image import Image
+import numpy
+from opencvstudio.dataops import crop, rescale
+from opencvstudio.engine.cache import CacheKey, ResultCache, \
+    image_fingerprint, operation_key
+from opencvstudio.engine.parallel import imap_bounded
+from opencvstudio.engine.planner import plan_step
+from opencvstudio.opmodel import Errors, Operation, OperationContext, \
+    OperationResult
+from opencvstudio.primitives import Box
+from opencvstudio.primitives.image import Image, ImageSpec
+
+
+class Preview(NamedTuple):
+    #: image data of `region` scaled by `scale`
+    image: Image
+    #: region of the output in output coordinates
+    region: Box
+    scale: float
 
 
 class Engine:
 
-    def __init__(self, ctx: OperationContext):
+    def __init__(self, ctx: OperationContext,
+                 cache: Optional[ResultCache] = None):
         self.ctx = ctx
-        self.steps = []
+        self.steps: List[OperationStep] = []
         self.input = None
+        self.cache = ResultCache() if cache is None else cache
+        self.cache.on_evict = self._discard
+        self._input_key = None
+        # index of first step whose result is stale
+        self._dirty = 0
+        # results with data written only by their step and never passed
+        # outside of the engine, by id of the image
+        self._reusable: MutableMapping[int, Image] = WeakValueDictionary()
 
     def set_input(self, input: Optional[Image]):
-        self.input = input
+        self.input = None if input is None else input.shared()
+        self._input_key = None if input is None else image_fingerprint(input)
+        self.invalidate(0)
 
     def add_operation(self, operation: Operation) -> None:
         self.steps.append(OperationStep(operation))
+        self.invalidate(len(self.steps) - 1)
+
+    def set_operation(self, index: int, operation: Operation) -> None:
+        self.steps[index].operation = operation
+        self.invalidate(index)
+
+    def clear_operations(self) -> None:
+        outputs = [step.output for step in self.steps]
+        self.steps.clear()
+        self.invalidate(0)
+        for output in outputs:
+            self._discard(output)
+
+    @property
+    def operations(self) -> List[Operation]:
+        return [step.operation for step in self.steps]
+
+    def map(self, images: Iterable[Image], workers: Optional[int] = None,
+            max_pending: Optional[int] = None) -> Iterator[Image]:
+        """
+        Run the operations on each of `images`, e.g. frames of a video (see
+        `dataops.read_frames`), on a thread pool.
+
+        OpenCV releases the GIL, so images are processed in parallel. At most
+        `max_pending` images are read ahead of the result currently yielded,
+        so memory usage does not depend on the number of images. Results are
+        yielded in order. The input image and the cache are not used.
+
+        Images owning their data may be modified. Results can be passed to
+        `OperationContext.release` when no longer needed, so their arrays
+        are reused for following images.
+
+        :param workers: number of threads (default: cores)
+        :param max_pending: default: 2 * workers
+        """
+        operations = self.operations
+        workers = workers or os.cpu_count() or 1
+        max_pending = max_pending or 2 * workers
+
+        with ThreadPoolExecutor(
+                workers, thread_name_prefix="opencvstudio.map") as executor:
+            yield from imap_bounded(
+                executor, partial(run_operations, self.ctx, operations),
+                images, max_pending=max_pending)
+
+    def invalidate(self, index: int = 0) -> None:
+        """
+        Mark step at `index` and all following steps as stale.
+        """
+        if index < 0:
+            index += len(self.steps)
+        self._dirty = min(self._dirty, index)
+
+    @property
+    def dirty(self) -> int:
+        """
+        :return: Index of first step that needs to be executed again
+        """
+        for i, step in enumerate(self.steps[:self._dirty]):
+            if step.changed():
+                return i
+        return self._dirty
 
     def __getitem__(self, item):
         return self.steps[item]
 
     @property
     def output(self) -> Optional[Image]:
-        return self.input if not self.steps else self.steps[-1].result
+        if not self.steps:
+            return self.input
+        return self._expose(self.steps[-1].result)
+
+    @property
+    def outputs(self) -> Dict[str, object]:
+        """
+        :return: outputs of the last step besides the image
+        """
+        if not self.steps or self.steps[-1].output is None:
+            return {}
+        return self.steps[-1].output.outputs
+
+    def output_region(self) -> Optional[Box]:
+        """
+        :return: extent of the output derived from the input extent without
+          executing operations, or `None` if unknown
+        """
+        if self.input is None:
+            return None
+
+        region = self.input.box
+        for step in self.steps:
+            region = step.operation.output_region(region)
+            if region is None:
+                return None
+        return region
+
+    def preview(self, region: Box, scale: float = 1.0) -> Optional[Preview]:
+        """
+        Compute only `region` of the output at resolution `scale`.
+
+        The region is mapped back through the operations to the needed part
+        of the input, which is cropped and scaled before executing the
+        operations. If an operation does not support this, the full output is
+        computed instead.
+
+        :return: the preview or `None` if there is no input or `region` is
+          outside of the output
+        """
+        if self.input is None:
+            return None
+
+        input_region = region
+        for step in reversed(self.steps):
+            input_region = step.operation.input_region(input_region)
+            if input_region is None:
+                return self._preview_from_output(region, scale)
+        input_region = input_region.intersection(self.input.box)
+        if input_region.empty:
+            return None
+
+        operations = []
+        current = input_region
+        for step in self.steps:
+            operations.append(step.operation.localize(current, scale))
+            current = step.operation.output_region(current)
+            if operations[-1] is None or current is None:
+                return self._preview_from_output(region, scale)
+            if current.empty:
+                return None
+
+        # e.g. decoded at reduced resolution
+        source, source_scale = self.input.reduced(scale)
+        img = source.replace_data(
+            rescale(crop(source.data, input_region.scaled(source_scale)),
+                    scale / source_scale),
+            owned=scale != source_scale)
+        img = run_operations(self.ctx, operations, img)
+
+        # neighborhood operations compute a margin around the region
+        part = region.intersection(current)
+        if part != current:
+            img = img.replace_data(crop(
+                img.data,
+                part.translated(-current.x, -current.y).scaled(scale)))
+        return Preview(img, part, scale)
+
+    def viewport_preview(self, viewport: Optional[Box], zoom: float,
+                         max_pixels: int) \
+            -> Optional[Tuple[Box, Optional[Preview]]]:
+        """
+        Preview of the visible part of the output before the full output is
+        computed. Only the header of a lazily loaded input is read, so large
+        files are decoded at reduced resolution if possible.
+
+        :param viewport: visible part in view coordinates, i.e. scaled by
+          `zoom`, default: the whole output
+        :param max_pixels: inputs up to this size are not previewed at zoom
+          1 or more
+        :return: extent of output and preview of the visible part, or `None`
+          if no preview is needed
+        """
+        input = self.input
+        if input is None or (self.steps and self.dirty >= len(self.steps)):
+            return None
+
+        size = input.size
+        if zoom >= 1.0 and size.width * size.height <= max_pixels:
+            return None
+
+        extent = self.output_region()
+        if extent is None:
+            return None
+
+        region = extent
+        if viewport is not None:
+            region = viewport.scaled(1.0 / zoom).intersection(extent)
+        return extent, self.preview(region, zoom)
+
+    def _expose(self, img: Optional[Image]) -> Optional[Image]:
+        """
+        Never reuse the data of `img`, because it is passed outside of the
+        engine, e.g. to the UI thread.
+        """
+        if img is not None:
+            self._reusable.pop(id(img), None)
+        return img
+
+    def _discard(self, result: Optional[OperationResult]) -> None:
+        """
+        Return the data of `result`, which is not the result of a step
+        anymore or was evicted from the cache, to `ctx.buffers` unless it
+        is still used.
+        """
+        if result is None or self._reusable.get(id(result.image)) \
+                is not result.image:
+            return
+
+        img = result.image
+        kept = [step.output for step in self.steps] + self.cache.results()
+        data = img.data
+        for other in kept:
+            if other is None or other.image is self.input:
+                continue
+            # also views, e.g. of a crop
+            if other.image is img or numpy.may_share_memory(
+                    other.image.data, data):
+                return
+
+        del self._reusable[id(img)]
+        self.ctx.buffers.release(data)
+
+    def _preview_from_output(
+            self, region: Box, scale: float) -> Optional[Preview]:
+        self.update()
+        output = self.output
+        region = region.intersection(output.box)
+        if region.empty:
+            return None
+        return Preview(
+            output.replace_data(rescale(crop(output.data, region), scale)),
+            region, scale)
+
+    def validate(self, spec: Optional[ImageSpec] = None) \
+            -> List[Tuple[int, Errors]]:
+        """
+        Check operations for an input described by `spec` without executing
+        them. The spec of the current input is used by default.
+
+        :return: pairs of step index and errors of that step
+        """
+        if spec is None:
+            if self.input is None:
+                return []
+            spec = self.input.spec
+        return validate_operations(self.operations, spec)
+
+    def result(self, index: int) -> Optional[Image]:
+        """
+        :return: result of step at `index` if it is up to date, else `None`
+        """
+        result = self.operation_result(index)
+        return None if result is None else result.image
 
-    def update(self):
-        if self.input is not None:
-            img = self.input
+    def operation_result(self, index: int) -> Optional[OperationResult]:
+        """
+        :return: image and outputs of step at `index` if it is up to date,
+          else `None`
+        """
+        if index < 0:
+            index += len(self.steps)
+        if index >= self.dirty:
+            return None
+        result = self.steps[index].output
+        if result is not None:
+            self._expose(result.image)
+        return result
+
+    def update(self, cancelled: Optional[Callable[[], bool]] = None,
+               until: Optional[int] = None) -> bool:
+        """
+        Execute stale steps.
+
+        :param cancelled: checked before each step, stops execution if it
+          returns `True`
+        :param until: only bring the first `until` steps up to date
+        :return: `False` if execution was cancelled
+        """
+        if self.input is None:
             for step in self.steps:
-                img = step.execute(self.ctx, img)
+                output, step.output = step.output, None
+                self._discard(output)
+            self._dirty = 0
+            return True
+
+        operations = self.operations
+        end = len(operations) if until is None else min(until, len(operations))
+        self._dirty = self.dirty
+        start = min(self._dirty, end)
+        if start == end and end > 0 and self.steps[end - 1].output is None:
+            start = end - 1
+        # steps fused into following steps have no result
+        while start > 0 and self.steps[start - 1].output is None:
+            start -= 1
+
+        if start == 0:
+            result, key = OperationResult(self.input), self._input_key
         else:
-            for step in self.steps:
-                step.result = None
+            previous = self.steps[start - 1]
+            result, key = previous.output, previous.key
+
+        while start < end:
+            if cancelled is not None and cancelled():
+                return False
+
+            stop, operation = plan_step(
+                operations, start, end, result.image.color)
+            # stale results can provide the buffer of the new one
+            for step in self.steps[start:stop]:
+                output, step.output = step.output, None
+                self._discard(output)
+            for step in self.steps[start:stop - 1]:
+                step.fuse(key)
+                key = step.key
+
+            last = self.steps[stop - 1]
+            result = last.execute(self.ctx, result, key, self.cache, operation)
+            if last.produced:
+                self._reusable[id(result.image)] = result.image
+            key = last.key
+            self._dirty = max(self._dirty, stop)
+            start = stop
+        return True
 
 
 class OperationStep:
@@ -40,10 +367,133 @@ class OperationStep:
     Wrapper for `Operation`
     """
 
-    def __init__(self, operation: Operation, result: Image = None):
+    def __init__(self, operation: Operation,
+                 output: Optional[OperationResult] = None):
         self.operation = operation
-        self.result = result
+        self.output = output
+        self.key: Optional[CacheKey] = None
+        #: whether the data of `output` was written by the last execution
+        #: and is not used by anything else
+        self.produced = False
+        self._parameters = None
+
+    def _prepare(self, key: Optional[CacheKey]) -> None:
+        self._parameters = parameter_values(self.operation)
+        self.key = None if key is None else operation_key(
+            key, self.operation, self._parameters)
+
+    @property
+    def result(self) -> Optional[Image]:
+        return None if self.output is None else self.output.image
+
+    def changed(self) -> bool:
+        """
+        :return: whether operation parameters were edited since last execution
+        """
+        return self._parameters != parameter_values(self.operation)
+
+    def fuse(self, key: Optional[CacheKey] = None) -> None:
+        """
+        Mark step as executed as part of a following step, without result.
+        """
+        self._prepare(key)
+        self.output = None
+
+    def execute(self, ctx: OperationContext, input: OperationResult,
+                key: Optional[CacheKey] = None,
+                cache: Optional[ResultCache] = None,
+                operation: Optional[Operation] = None) -> OperationResult:
+        """
+        Execute operation on `input` identified by `key`.
+
+        A result for the same input, operation type and parameters is
+        taken from `cache` instead.
+
+        :param operation: equivalent operation to execute instead, e.g. one
+          fused with previous steps
+        """
+        self._prepare(key)
+
+        result = None
+        self.produced = False
+        if cache is not None and self.key is not None:
+            result = cache.get(self.key)
+        if result is None:
+            result = (operation or self.operation).apply(ctx, input)
+            self.produced = result.image.owned
+            # results are kept, so following steps must not modify them
+            result = result.shared()
+            if cache is not None and self.key is not None:
+                cache.put(self.key, result)
+
+        self.output = result
+        return result
+
+
+def parameter_values(operation: Operation) -> Tuple:
+    """
+    :return: Current values of all parameters of `operation`
+    """
+    return tuple(
+        (param.name, getattr(operation, param.name, None))
+        for param in operation.parameters())
+
+
+def run_operations(ctx: OperationContext, operations: Iterable[Operation],
+                   img: Image) -> Image:
+    """
+    Execute `operations` one after another on `img` without keeping
+    intermediate results.
+
+    Operations may write into data owned by `img` or intermediate results.
+    Their arrays are returned to `ctx.buffers` when no longer needed.
+    """
+    return apply_operations(ctx, operations, OperationResult(img)).image
+
+
+def apply_operations(ctx: OperationContext, operations: Iterable[Operation],
+                     input: OperationResult) -> OperationResult:
+    """
+    Like `run_operations`, but passes outputs of operations on to the
+    following operations.
+
+    :return: image of the last operation and outputs of all operations
+    """
+    operations = list(operations)
+    result = input
+    start = 0
+    while start < len(operations):
+        start, operation = plan_step(
+            operations, start, len(operations), result.image.color)
+        img = result.image
+        result = operation.apply(ctx, result)
+        if img.owned and not numpy.may_share_memory(
+                img.data, result.image.data):
+            ctx.release(img)
+    return result
+
+
+def validate_operations(operations: Iterable[Operation],
+                        spec: ImageSpec) -> List[Tuple[int, Errors]]:
+    """
+    Check `operations` for an input described by `spec` by propagating the
+    spec through the operations.
+
+    Checking stops at the first operation whose output spec is unknown.
+    Operations with more than one input (see `Operation.inputs`) need a
+    pipeline graph and are errors here.
+
+    :return: pairs of step index and errors of that step
+    """
+    result = []
+    for i, operation in enumerate(operations):
+        errors = [f"{operation} needs a {input} input"
+                  for input in operation.inputs[1:]]
+        errors += operation.errors(spec)
+        if errors:
+            result.append((i, errors))
 
-    def execute(self, ctx: OperationContext, img: Image) -> Image:
-        self.result = self.operation.execute(ctx, img)
-        return self.result
+        spec = operation.output_spec(spec)
+        if spec is None:
+            break
+    return result
@@ -0,0 +1,129 @@
+from collections import OrderedDict
+from hashlib import blake2b
+from typing import Callable, Hashable, List, Optional, Tuple
+
+import numpy
+from opencvstudio.engine.outputs import output_nbytes
+from opencvstudio.loader import LazyImage
+from opencvstudio.opmodel import Operation, OperationResult
+from opencvstudio.primitives.image import Image
+
+
+CacheKey = Hashable
+
+
+def image_fingerprint(img: Image) -> bytes:
+    """
+    :return: Digest of the content of `img`. For lazily loaded images the
+      file is identified instead, so the image is not decoded.
+    """
+    digest = blake2b(digest_size=20)
+    if isinstance(img, LazyImage):
+        digest.update(f"{img.path}:{img.stat.st_mtime_ns}:"
+                      f"{img.stat.st_size}".encode())
+        return digest.digest()
+
+    data = img.data
+    digest.update(f"{img.color}:{data.dtype.str}:{data.shape}".encode())
+    digest.update(numpy.ascontiguousarray(data))
+    return digest.digest()
+
+
+def operation_key(
+        input_key: CacheKey, operation: Operation,
+        parameters: Tuple) -> Optional[CacheKey]:
+    """
+    Key of the result of `operation` applied on the input identified by
+    `input_key`.
+
+    :return: the key or `None` if the result can not be cached, because
+      parameters are not hashable or the operation has undeclared state
+    """
+    names = {name for name, _ in parameters}
+    if not set(getattr(operation, "__dict__", ())) <= names:
+        return None
+
+    key = (input_key, type(operation), parameters)
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+
+def result_nbytes(result: OperationResult) -> int:
+    """
+    :return: byte size of the image and outputs of `result`
+    """
+    return result.image.data.nbytes + sum(
+        output_nbytes(value) for value in result.outputs.values())
+
+
+class ResultCache:
+    """
+    LRU cache for operation results bounded by the byte size of their images
+    and outputs.
+    """
+
+    def __init__(self, max_bytes: int = 512 * 1024 * 1024,
+                 on_evict: Optional[Callable[[OperationResult], None]] = None):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evicted_bytes = 0
+        #: called with results removed from the cache
+        self.on_evict = on_evict
+        self._entries = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def results(self) -> List[OperationResult]:
+        return list(self._entries.values())
+
+    def get(self, key: CacheKey) -> Optional[OperationResult]:
+        result = self._entries.get(key)
+        if result is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._entries.move_to_end(key)
+        return result
+
+    def put(self, key: CacheKey, result: OperationResult) -> None:
+        nbytes = result_nbytes(result)
+        if nbytes > self.max_bytes:
+            return
+
+        old = self._entries.pop(key, None)
+        self._entries[key] = result
+        self.size += nbytes
+        if old is not None:
+            self.size -= result_nbytes(old)
+            self._evicted(old)
+        self._shrink(self.max_bytes)
+
+    def resize(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self._shrink(max_bytes)
+
+    def clear(self) -> None:
+        entries = list(self._entries.values())
+        self._entries.clear()
+        self.size = 0
+        for result in entries:
+            self._evicted(result)
+
+    def _shrink(self, max_bytes: int) -> None:
+        while self.size > max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            nbytes = result_nbytes(evicted)
+            self.size -= nbytes
+            self.evicted_bytes += nbytes
+            self._evicted(evicted)
+
+    def _evicted(self, result: OperationResult) -> None:
+        if self.on_evict is not None and all(
+                entry is not result for entry in self._entries.values()):
+            self.on_evict(result)
@@ -0,0 +1,402 @@
+"""
+Pipelines as directed acyclic graphs.
+
+Each node of a `PipelineGraph` has a unique name and connects the named
+inputs of its operation (see `Operation.inputs`) to the results of other
+nodes or to the input image of the pipeline (`INPUT`)::
+
+    graph = PipelineGraph()
+    graph.add("gray", ChangeColorSpaceOp(ColorSpace.GRAY))
+    graph.add("binary", ThresholdOp(otsu=True), "gray")
+    graph.add("masked", MaskOp(), {"image": INPUT, "mask": "binary"})
+
+`GraphEngine` executes a graph. Results used by several nodes are computed
+once and independent branches run concurrently on a thread pool.
+"""
+import heapq
+import os
+from concurrent.futures import FIRST_COMPLETED, Future, \
+    ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterable, Iterator, List, Mapping, \
+    NamedTuple, Optional, Set, Tuple, Union
+
+from opencvstudio.engine import parameter_values
+from opencvstudio.engine.cache import CacheKey, ResultCache, \
+    image_fingerprint, operation_key
+from opencvstudio.opmodel import Operation, OperationContext, \
+    OperationResult
+from opencvstudio.primitives.image import Image
+
+
+#: name of the input image of a pipeline graph
+INPUT = "input"
+
+
+class GraphError(Exception):
+    pass
+
+
+class Node:
+    """
+    Operation in a `PipelineGraph` with the names of the nodes connected to
+    its inputs.
+    """
+
+    def __init__(self, name: str, operation: Operation,
+                 inputs: Mapping[str, str]):
+        self.name = name
+        self.operation = operation
+        #: input name of the operation -> name of the source node
+        self.inputs: Dict[str, str] = dict(inputs)
+        self.output: Optional[OperationResult] = None
+        self.key: Optional[CacheKey] = None
+        #: incremented each time `output` is replaced
+        self.version = 0
+        self._parameters = None
+        self._sources = None
+
+    @property
+    def result(self) -> Optional[Image]:
+        return None if self.output is None else self.output.image
+
+
+class TreeItem(NamedTuple):
+    name: str
+    #: nodes whose first input is this node
+    children: Tuple["TreeItem", ...]
+
+
+class PipelineGraph:
+
+    def __init__(self):
+        self._nodes: Dict[str, Node] = {}
+
+    @classmethod
+    def from_operations(cls, operations: Iterable[Operation]) \
+            -> "PipelineGraph":
+        """
+        :return: chain of `operations` named "step1", "step2", ...
+        """
+        graph = cls()
+        source = INPUT
+        for i, operation in enumerate(operations):
+            source = graph.add(f"step{i + 1}", operation, source).name
+        return graph
+
+    def __len__(self) -> int:
+        return len(self._nodes)
+
+    def __iter__(self) -> Iterator[Node]:
+        """
+        :return: nodes in the order they were added
+        """
+        return iter(list(self._nodes.values()))
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._nodes
+
+    def __getitem__(self, name: str) -> Node:
+        return self._nodes[name]
+
+    def add(self, name: str, operation: Operation,
+            inputs: Union[str, Mapping[str, str]] = INPUT) -> Node:
+        """
+        :param inputs: name of the source node of all inputs of `operation`
+          or the source node for each input name
+        :raises GraphError: if `name` is taken or inputs are not connected
+          to existing nodes
+        """
+        if name == INPUT or name in self._nodes:
+            raise GraphError(f"Node name {name} is already used")
+        if isinstance(inputs, str):
+            inputs = {input: inputs for input in operation.inputs}
+        self._check_inputs(operation, inputs)
+
+        node = Node(name, operation, inputs)
+        self._nodes[name] = node
+        return node
+
+    def set_operation(self, name: str, operation: Operation) -> None:
+        node = self._nodes[name]
+        self._check_inputs(operation, node.inputs)
+        node.operation = operation
+        node.output = None
+
+    def connect(self, name: str, input: str, source: str) -> None:
+        """
+        Connect `input` of node `name` to node `source`.
+
+        :raises GraphError: if this would create a cycle
+        """
+        node = self._nodes[name]
+        if source != INPUT and name in self.ancestors([source]) | {source}:
+            raise GraphError(f"Connecting {source} to {name} creates a cycle")
+        self._check_inputs(node.operation, {**node.inputs, input: source})
+        node.inputs[input] = source
+
+    def remove(self, name: str) -> None:
+        """
+        :raises GraphError: if other nodes use the node
+        """
+        users = sorted(self.consumers(name))
+        if users:
+            raise GraphError(f"Node {name} is used by {', '.join(users)}")
+        del self._nodes[name]
+
+    def consumers(self, name: str) -> Set[str]:
+        """
+        :return: names of nodes with an input connected to node `name`
+        """
+        return {node.name for node in self._nodes.values()
+                if name in node.inputs.values()}
+
+    def ancestors(self, names: Iterable[str]) -> Set[str]:
+        """
+        :return: names of nodes `names` depend on, excluding `INPUT`
+        """
+        result = set()
+        pending = list(names)
+        while pending:
+            node = self._nodes.get(pending.pop())
+            if node is None:
+                continue
+            for source in node.inputs.values():
+                if source != INPUT and source not in result:
+                    result.add(source)
+                    pending.append(source)
+        return result
+
+    def outputs(self) -> List[str]:
+        """
+        :return: names of nodes not used by other nodes
+        """
+        used = {source for node in self._nodes.values()
+                for source in node.inputs.values()}
+        return [name for name in self._nodes if name not in used]
+
+    def order(self, targets: Optional[Iterable[str]] = None) -> List[str]:
+        """
+        :param targets: only include these nodes and the nodes they depend
+          on, default: all nodes
+        :return: names of nodes sorted so that nodes come after their
+          sources. Ties are resolved in the order nodes were added.
+        """
+        if targets is None:
+            names = set(self._nodes)
+        else:
+            targets = list(targets)
+            names = self.ancestors(targets) | set(targets)
+        position = {name: i for i, name in enumerate(self._nodes)}
+
+        missing = {name: {source for source in self._nodes[name].inputs
+                          .values() if source != INPUT}
+                   for name in names}
+        ready = [(position[name], name) for name, sources in missing.items()
+                 if not sources]
+        heapq.heapify(ready)
+        result = []
+        while ready:
+            _, name = heapq.heappop(ready)
+            result.append(name)
+            for consumer in self.consumers(name) & names:
+                missing[consumer].discard(name)
+                if not missing[consumer]:
+                    heapq.heappush(ready, (position[consumer], consumer))
+        if len(result) < len(names):
+            raise GraphError("Pipeline graph contains a cycle")
+        return result
+
+    def tree(self) -> List[TreeItem]:
+        """
+        Present the graph as tree for display: each node is a child of the
+        source of its first input. Nodes connected to further sources
+        appear only once.
+
+        :return: nodes connected to the input image
+        """
+        children: Dict[str, List[str]] = {INPUT: []}
+        for name in self.order():
+            node = self._nodes[name]
+            children[name] = []
+            first = node.inputs[node.operation.inputs[0]]
+            children[first].append(name)
+
+        def item(name: str) -> TreeItem:
+            return TreeItem(name, tuple(item(child)
+                                        for child in children[name]))
+
+        return [item(name) for name in children[INPUT]]
+
+    def chain(self) -> Optional[List[Operation]]:
+        """
+        :return: operations if the graph is a chain of operations with a
+          single input each, else `None`
+        """
+        source = INPUT
+        operations = []
+        for node in self._nodes.values():
+            if set(node.inputs.values()) != {source}:
+                return None
+            operations.append(node.operation)
+            source = node.name
+        return operations
+
+    def _check_inputs(self, operation: Operation,
+                      inputs: Mapping[str, str]) -> None:
+        if set(inputs) != set(operation.inputs):
+            raise GraphError(
+                f"{operation} has inputs {', '.join(operation.inputs)}, "
+                f"not {', '.join(inputs)}")
+        for source in inputs.values():
+            if source != INPUT and source not in self._nodes:
+                raise GraphError(f"Unknown node {source}")
+
+
+class GraphEngine:
+    """
+    Executes a `PipelineGraph` on an input image.
+
+    Like `Engine`, only nodes whose parameters, sources or input changed are
+    executed again and results are cached by the content of their inputs.
+    """
+
+    def __init__(self, ctx: OperationContext,
+                 graph: Optional[PipelineGraph] = None,
+                 cache: Optional[ResultCache] = None,
+                 workers: Optional[int] = None):
+        self.ctx = ctx
+        self.graph = PipelineGraph() if graph is None else graph
+        self.cache = ResultCache() if cache is None else cache
+        self.workers = workers or os.cpu_count() or 1
+        self.input: Optional[Image] = None
+        self._input: Optional[OperationResult] = None
+        self._input_key: Optional[CacheKey] = None
+        self._input_version = 0
+
+    def set_input(self, input: Optional[Image]) -> None:
+        self.input = None if input is None else input.shared()
+        self._input = None if input is None else OperationResult(self.input)
+        self._input_key = None if input is None else image_fingerprint(input)
+        self._input_version += 1
+
+    def invalidate(self, name: str) -> None:
+        """
+        Mark node `name` and all nodes depending on it as stale.
+        """
+        self.graph[name].output = None
+
+    def stale(self, targets: Optional[Iterable[str]] = None) -> List[str]:
+        """
+        :return: names of nodes to execute to bring `targets` (default: all
+          nodes) up to date, sources first
+        """
+        result = []
+        stale = set()
+        for name in self.graph.order(targets):
+            node = self.graph[name]
+            if node.output is None or any(
+                    source in stale for source in node.inputs.values()) \
+                    or node._parameters != parameter_values(node.operation) \
+                    or node._sources != self._sources(node):
+                result.append(name)
+                stale.add(name)
+        return result
+
+    def result(self, name: str) -> Optional[OperationResult]:
+        """
+        :return: image and outputs of node `name` if up to date, else `None`
+        """
+        if self.input is None or self.stale([name]):
+            return None
+        return self.graph[name].output
+
+    def update(self, cancelled: Optional[Callable[[], bool]] = None,
+               targets: Optional[Iterable[str]] = None) -> bool:
+        """
+        Execute stale nodes needed for `targets` (default: all nodes).
+
+        A node is submitted to the thread pool as soon as its sources are up
+        to date. Cache lookups happen in the calling thread.
+
+        :param cancelled: checked before submitting each node, stops
+          execution if it returns `True`
+        :return: `False` if execution was cancelled
+        """
+        if self.input is None:
+            for node in self.graph:
+                node.output = None
+            return True
+
+        stale = self.stale(targets)
+        waiting = {name: {source for source in self.graph[name].inputs
+                          .values() if source in stale}
+                   for name in stale}
+        ready = [name for name in stale if not waiting[name]]
+        running: Dict[Future, str] = {}
+        with ThreadPoolExecutor(
+                self.workers, thread_name_prefix="opencvstudio.graph") \
+                as executor:
+            try:
+                while ready or running:
+                    while ready:
+                        if cancelled is not None and cancelled():
+                            ready.clear()
+                            break
+                        name = ready.pop(0)
+                        future = self._submit(executor, self.graph[name])
+                        running[future] = name
+
+                    if not running:
+                        break
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        name = running.pop(future)
+                        self._finish(self.graph[name], future.result())
+                        for consumer in sorted(
+                                self.graph.consumers(name) & waiting.keys(),
+                                key=stale.index):
+                            waiting[consumer].discard(name)
+                            if not waiting[consumer]:
+                                ready.append(consumer)
+            finally:
+                for future in running:
+                    future.cancel()
+        return not self.stale(targets)
+
+    def _sources(self, node: Node) -> Tuple:
+        return tuple(sorted(
+            (input, source, self._input_version if source == INPUT
+             else self.graph[source].version)
+            for input, source in node.inputs.items()))
+
+    def _source(self, name: str) -> Tuple[OperationResult, CacheKey]:
+        if name == INPUT:
+            return self._input, self._input_key
+        node = self.graph[name]
+        return node.output, node.key
+
+    def _submit(self, executor: ThreadPoolExecutor, node: Node) -> Future:
+        node._parameters = parameter_values(node.operation)
+        inputs = {}
+        keys = []
+        for input, source in sorted(node.inputs.items()):
+            inputs[input], key = self._source(source)
+            keys.append((input, key))
+        node.key = None if any(key is None for _, key in keys) \
+            else operation_key(tuple(keys), node.operation, node._parameters)
+
+        result = None if node.key is None else self.cache.get(node.key)
+        if result is not None:
+            future = Future()
+            future.set_result(result)
+            return future
+        return executor.submit(node.operation.combine, self.ctx, inputs)
+
+    def _finish(self, node: Node, result: OperationResult) -> None:
+        # results are kept, so following nodes must not modify them
+        result = result.shared()
+        if node.key is not None:
+            self.cache.put(node.key, result)
+        node._sources = self._sources(node)
+        node.output = result
+        node.version += 1
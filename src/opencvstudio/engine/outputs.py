@@ -0,0 +1,99 @@
+"""
+Serialization of the outputs of `OperationResult` as JSON.
+
+Numbers, strings and booleans are stored as they are, sequences of them as
+lists. Box arrays and NumPy arrays are stored as objects with a type::
+
+    {"text": "Hello",
+     "mean": 127.5,
+     "words": {"type": "boxes", "value": [[0, 0, 10, 8]]},
+     "confidences": {"type": "array", "dtype": "<f8", "value": [91.5]}}
+"""
+import json
+from pathlib import Path
+from typing import Dict, Mapping, Union
+
+import numpy
+from opencvstudio.primitives.box import BoxArray
+
+
+class OutputFormatError(Exception):
+    pass
+
+
+def dump_outputs(outputs: Mapping[str, object]) -> dict:
+    """
+    :raises OutputFormatError: for values of unsupported types
+    """
+    return {name: _encode(name, value) for name, value in outputs.items()}
+
+
+def parse_outputs(data: dict) -> Dict[str, object]:
+    if not isinstance(data, dict):
+        raise OutputFormatError("Outputs are not an object")
+    return {name: _decode(name, value) for name, value in data.items()}
+
+
+def save_outputs(path: Union[str, Path],
+                 outputs: Mapping[str, object]) -> None:
+    with open(path, "w", encoding="utf-8") as fp:
+        json.dump(dump_outputs(outputs), fp, indent=2)
+        fp.write("\n")
+
+
+def load_outputs(path: Union[str, Path]) -> Dict[str, object]:
+    with open(path, "r", encoding="utf-8") as fp:
+        try:
+            data = json.load(fp)
+        except ValueError as e:
+            raise OutputFormatError(f"Invalid outputs {path}: {e}") from e
+    return parse_outputs(data)
+
+
+def output_nbytes(value: object) -> int:
+    """
+    :return: approximate memory used by an output value
+    """
+    if isinstance(value, BoxArray):
+        return value.data.nbytes
+    if isinstance(value, numpy.ndarray):
+        return value.nbytes
+    if isinstance(value, str):
+        return len(value)
+    if isinstance(value, (list, tuple)):
+        return sum(output_nbytes(item) for item in value)
+    return 8
+
+
+def _encode(name: str, value: object):
+    if isinstance(value, BoxArray):
+        return {"type": "boxes", "value": value.to_xywh().tolist()}
+    if isinstance(value, numpy.ndarray):
+        return {"type": "array", "dtype": value.dtype.str,
+                "value": value.tolist()}
+    if isinstance(value, numpy.generic):
+        return value.item()
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, (list, tuple)):
+        return [_encode(name, item) for item in value]
+    raise OutputFormatError(
+        f"Output {name} of type {type(value).__name__} can not be saved")
+
+
+def _decode(name: str, value: object):
+    if isinstance(value, list):
+        return tuple(_decode(name, item) for item in value)
+    if not isinstance(value, dict):
+        return value
+
+    try:
+        if value["type"] == "boxes":
+            return BoxArray.from_xywh(
+                numpy.array(value["value"], dtype=numpy.int64))
+        if value["type"] == "array":
+            return numpy.array(value["value"],
+                               dtype=numpy.dtype(value["dtype"]))
+    except (KeyError, TypeError, ValueError) as e:
+        raise OutputFormatError(f"Invalid output {name}: {e}") from e
+    raise OutputFormatError(f"Unknown type of output {name}")
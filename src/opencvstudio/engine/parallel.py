@@ -0,0 +1,32 @@
+from collections import deque
+from concurrent.futures import Executor
+from typing import Callable, Iterable, Iterator, TypeVar
+
+
+T = TypeVar("T")
+
+
+def imap_bounded(executor: Executor, fn: Callable[..., T],
+                 *iterables: Iterable, max_pending: int) -> Iterator[T]:
+    """
+    Like `Executor.map`, but consumes `iterables` lazily and submits at most
+    `max_pending` calls ahead of the result currently yielded.
+
+    Results are yielded in order. Exceptions of `fn` are raised when the
+    corresponding result is reached.
+    """
+    if max_pending < 1:
+        raise ValueError("max_pending must be at least 1")
+
+    pending = deque()
+    try:
+        for args in zip(*iterables):
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+            pending.append(executor.submit(fn, *args))
+
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
@@ -0,0 +1,200 @@
+"""
+Saving and loading of pipelines, i.e. lists of operations.
+
+Pipelines are stored as JSON::
+
+    {
+      "format": "opencvstudio.pipeline",
+      "version": 1,
+      "operations": [
+        {"type": "crop",
+         "parameters": {"box": {"x": 0, "y": 0, "width": 5, "height": 5}}}
+      ]
+    }
+
+Pipeline graphs (see `engine.graph`) are stored as version 2, where each
+operation has a node name and the names of the nodes connected to its
+inputs::
+
+    {"name": "binary", "type": "threshold", "parameters": {"otsu": true},
+     "inputs": {"image": "gray"}}
+
+Operation types are looked up by the name given to `register_operation`.
+Parameter values are converted according to the `Parameter` descriptors of
+the operation type. No UI modules are imported.
+"""
+import json
+from dataclasses import asdict, is_dataclass
+from enum import Enum
+from pathlib import Path
+from typing import Iterable, List, Union
+
+import opencvstudio.ops  # noqa: F401 -- registers builtin operations
+from opencvstudio.engine.graph import GraphError, PipelineGraph
+from opencvstudio.opmodel import Operation, Parameter, operation_type
+
+
+FORMAT = "opencvstudio.pipeline"
+#: version of lists of operations
+VERSION = 1
+#: version of pipeline graphs
+GRAPH_VERSION = 2
+
+
+class PipelineFormatError(Exception):
+    pass
+
+
+def save_pipeline(path: Union[str, Path],
+                  operations: Iterable[Operation]) -> None:
+    with open(path, "w", encoding="utf-8") as fp:
+        json.dump(dump_pipeline(operations), fp, indent=2)
+        fp.write("\n")
+
+
+def load_pipeline(path: Union[str, Path]) -> List[Operation]:
+    with open(path, "r", encoding="utf-8") as fp:
+        try:
+            data = json.load(fp)
+        except ValueError as e:
+            raise PipelineFormatError(f"Invalid pipeline {path}: {e}") from e
+    return parse_pipeline(data)
+
+
+def dump_pipeline(operations: Iterable[Operation]) -> dict:
+    return {
+        "format": FORMAT,
+        "version": VERSION,
+        "operations": [_dump_operation(op) for op in operations],
+    }
+
+
+def parse_pipeline(data: dict) -> List[Operation]:
+    """
+    :raises PipelineFormatError: also for graphs which are not a chain of
+      operations
+    """
+    if _parse_version(data) == VERSION:
+        return [_parse_operation(item)
+                for item in data.get("operations", [])]
+
+    operations = parse_graph(data).chain()
+    if operations is None:
+        raise PipelineFormatError("Pipeline has branches")
+    return operations
+
+
+def save_graph(path: Union[str, Path], graph: PipelineGraph) -> None:
+    with open(path, "w", encoding="utf-8") as fp:
+        json.dump(dump_graph(graph), fp, indent=2)
+        fp.write("\n")
+
+
+def load_graph(path: Union[str, Path]) -> PipelineGraph:
+    with open(path, "r", encoding="utf-8") as fp:
+        try:
+            data = json.load(fp)
+        except ValueError as e:
+            raise PipelineFormatError(f"Invalid pipeline {path}: {e}") from e
+    return parse_graph(data)
+
+
+def dump_graph(graph: PipelineGraph) -> dict:
+    return {
+        "format": FORMAT,
+        "version": GRAPH_VERSION,
+        "operations": [
+            {"name": node.name, **_dump_operation(node.operation),
+             "inputs": dict(node.inputs)}
+            for node in graph
+        ],
+    }
+
+
+def parse_graph(data: dict) -> PipelineGraph:
+    """
+    Pipelines of version 1 are read as a chain of operations.
+    """
+    if _parse_version(data) == VERSION:
+        return PipelineGraph.from_operations(parse_pipeline(data))
+
+    graph = PipelineGraph()
+    for item in data.get("operations", []):
+        try:
+            graph.add(item["name"], _parse_operation(item), item["inputs"])
+        except KeyError as e:
+            raise PipelineFormatError(f"Missing {e} of node") from e
+        except GraphError as e:
+            raise PipelineFormatError(str(e)) from e
+    return graph
+
+
+def _parse_version(data: dict) -> int:
+    if not isinstance(data, dict) or data.get("format") != FORMAT:
+        raise PipelineFormatError("Not a pipeline")
+
+    version = data.get("version")
+    if not isinstance(version, int) or not 1 <= version <= GRAPH_VERSION:
+        raise PipelineFormatError(f"Unsupported pipeline version {version}")
+    return version
+
+
+def _dump_operation(operation: Operation) -> dict:
+    if operation.type_name is None:
+        raise PipelineFormatError(
+            f"Operation type {type(operation).__name__} is not registered")
+
+    return {
+        "type": operation.type_name,
+        "parameters": {
+            param.name: _encode(getattr(operation, param.name))
+            for param in operation.parameters()
+        },
+    }
+
+
+def _parse_operation(item: dict) -> Operation:
+    if "type" not in item:
+        raise PipelineFormatError("Missing type of operation")
+    try:
+        cls = operation_type(item["type"])
+    except KeyError as e:
+        raise PipelineFormatError(f"Unknown operation type {e}") from e
+
+    values = item.get("parameters", {})
+    kwargs = {
+        param.name: _decode(param, values[param.name])
+        for param in cls.parameters()
+        if param.name in values
+    }
+    try:
+        return cls(**kwargs)
+    except TypeError as e:
+        raise PipelineFormatError(
+            f"Invalid parameters for {item['type']}: {e}") from e
+
+
+def _encode(value):
+    if is_dataclass(value):
+        return asdict(value)
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (list, tuple)):
+        return [_encode(item) for item in value]
+    return value
+
+
+def _decode(param: Parameter, value):
+    try:
+        if param.item is not None:
+            return param.ty(_decode_value(param.item, item) for item in value)
+        return _decode_value(param.ty, value)
+    except (TypeError, ValueError) as e:
+        raise PipelineFormatError(
+            f"Invalid value for parameter {param.name}: {value!r}") from e
+
+
+def _decode_value(ty, value):
+    if is_dataclass(ty):
+        return ty(**value)
+    return ty(value)
@@ -0,0 +1,85 @@
+"""
+Planning of operation execution.
+
+Consecutive color space conversions are fused: conversions to color spaces
+which are converted again without losing information are skipped,
+conversions without effect are dropped and conversions not supported
+directly are routed through other color spaces.
+"""
+from collections import deque
+from typing import List, Optional, Sequence, Tuple
+
+from opencvstudio.dataops import can_convert_color
+from opencvstudio.opmodel import Operation
+from opencvstudio.ops.color_ops import ChangeColorSpaceOp, ColorPathOp
+from opencvstudio.primitives.color import ColorSpace
+
+
+def plan_step(operations: Sequence[Operation], start: int, end: int,
+              color: ColorSpace) -> Tuple[int, Operation]:
+    """
+    Plan execution of the operation at `start` for an input in `color`.
+
+    :return: index after the last operation covered and the operation
+      with the same result as the covered operations
+    """
+    operation = operations[start]
+    if not isinstance(operation, ChangeColorSpaceOp):
+        return start + 1, operation
+
+    stop = start + 1
+    while stop < end and isinstance(operations[stop], ChangeColorSpaceOp):
+        stop += 1
+
+    last = operations[stop - 1]
+    path = color_path(color, [op.target for op in operations[start:stop]])
+    if path == [last.target]:
+        return stop, last
+    return stop, ColorPathOp(tuple(path))
+
+
+def color_path(color: ColorSpace,
+               targets: Sequence[ColorSpace]) -> List[ColorSpace]:
+    """
+    :return: shortest sequence of supported conversions with the same result
+      as converting from `color` to each of `targets` one after another
+    """
+    chain = [color]
+    for target in targets:
+        if target == chain[-1]:
+            continue
+        # intermediate color spaces, which did not drop channels, can be
+        # skipped
+        if len(chain) >= 2 and chain[-1].channels >= chain[-2].channels:
+            chain.pop()
+        if target != chain[-1]:
+            chain.append(target)
+
+    path = []
+    for from_, to in zip(chain, chain[1:]):
+        path += _route(from_, to) or [to]
+    return path
+
+
+def _route(from_: ColorSpace, to: ColorSpace) -> Optional[List[ColorSpace]]:
+    """
+    :return: shortest path of supported conversions through color spaces
+      without dropping channels of `from_`
+    """
+    previous = {from_: None}
+    queue = deque((from_,))
+    while queue:
+        color = queue.popleft()
+        for next_ in ColorSpace:
+            if next_ in previous or not can_convert_color(color, next_):
+                continue
+
+            previous[next_] = color
+            if next_ == to:
+                path = [to]
+                while previous[path[-1]] != from_:
+                    path.append(previous[path[-1]])
+                return path[::-1]
+            if next_.channels >= from_.channels:
+                queue.append(next_)
+    return None
@@ -0,0 +1,121 @@
+"""
+Tiled execution of operations on images larger than memory.
+
+The output is computed in tiles. For each tile, the needed part of the input
+is found with `Operation.input_region`, read from the source, e.g. a memory
+mapped file (see `dataops.open_npy`), and processed by the operations
+localized to it. Operations with a footprint larger than a pixel declare it
+by their input region, e.g. `NeighborhoodOperation`. Operations without
+region support can not be tiled.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy
+from opencvstudio.dataops import crop
+from opencvstudio.engine import run_operations
+from opencvstudio.engine.parallel import imap_bounded
+from opencvstudio.opmodel import Operation, OperationContext
+from opencvstudio.primitives import Box, ImageData
+from opencvstudio.primitives.error import ImageOperationError
+from opencvstudio.primitives.image import Image
+
+
+Allocator = Callable[[Tuple[int, ...], numpy.dtype], ImageData]
+
+
+def iter_tiles(region: Box, tile_size: int) -> Iterator[Box]:
+    """
+    :return: tiles covering `region` row by row
+    """
+    for y in range(region.y, region.y + region.height, tile_size):
+        for x in range(region.x, region.x + region.width, tile_size):
+            yield Box(x, y,
+                      min(tile_size, region.x + region.width - x),
+                      min(tile_size, region.y + region.height - y))
+
+
+def tiled_output_region(operations: Sequence[Operation],
+                        region: Box) -> Box:
+    """
+    :return: region of the output computed from `region` of the input
+    :raises ImageOperationError: if an operation can not be tiled
+    """
+    for operation in operations:
+        output = operation.output_region(region)
+        if output is None or operation.input_region(output) is None:
+            raise ImageOperationError(
+                f"{operation} does not support tiled execution")
+        region = output
+    return region
+
+
+def run_tiled(ctx: OperationContext, operations: Sequence[Operation],
+              source: Image, tile_size: int = 1024,
+              allocate: Allocator = numpy.empty,
+              workers: Optional[int] = None) -> Image:
+    """
+    Execute `operations` on `source` tile by tile.
+
+    Tiles are computed on a thread pool and written to the output in order,
+    so at most a few tiles are in memory at once besides the output.
+
+    :param allocate: creates the output array from shape and dtype, e.g.
+      ``partial(create_npy, path)`` to write to a memory mapped file
+    :param workers: number of threads (default: cores)
+    :raises ImageOperationError: if an operation can not be tiled
+    """
+    operations = list(operations)
+    extent = tiled_output_region(operations, source.box)
+    workers = workers or os.cpu_count() or 1
+
+    output = None
+    color = source.color
+    with ThreadPoolExecutor(
+            workers, thread_name_prefix="opencvstudio.tiled") as executor:
+        tiles = imap_bounded(
+            executor, partial(_execute_tile, ctx, operations, source),
+            iter_tiles(extent, tile_size), max_pending=2 * workers)
+        for region, tile in tiles:
+            if output is None:
+                output = allocate(
+                    (extent.height, extent.width) + tile.data.shape[2:],
+                    tile.data.dtype)
+                color = tile.color
+            region = region.translated(-extent.x, -extent.y)
+            crop(output, region)[...] = tile.data
+
+    if output is None:
+        output = allocate((0, 0) + source.data.shape[2:], source.data.dtype)
+    if hasattr(output, "flush"):
+        output.flush()
+    return Image(output, color)
+
+
+def _execute_tile(ctx: OperationContext, operations: List[Operation],
+                  source: Image, tile: Box) -> Tuple[Box, Image]:
+    region = tile
+    for operation in reversed(operations):
+        region = operation.input_region(region)
+    region = region.intersection(source.box)
+
+    localized = []
+    current = region
+    for operation in operations:
+        localized.append(operation.localize(current, 1.0))
+        current = operation.output_region(current)
+        if localized[-1] is None:
+            raise ImageOperationError(
+                f"{operation} does not support tiled execution")
+
+    # read tile into memory
+    img = source.replace_data(numpy.ascontiguousarray(
+        crop(source.data, region)))
+    img = run_operations(ctx, localized, img)
+
+    # neighborhood operations compute a margin around the tile
+    part = tile.intersection(current)
+    return part, img.replace_data(
+        crop(img.data, part.translated(-current.x, -current.y)))
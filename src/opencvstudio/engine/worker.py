@@ -0,0 +1,110 @@
+import logging
+from contextlib import contextmanager
+from threading import Condition, Event, Lock, Thread
+from typing import Callable, Iterator, List, NamedTuple, Optional
+
+from opencvstudio.engine import Engine
+
+
+logger = logging.getLogger("opencvstudio.engine")
+
+Cancelled = Callable[[], bool]
+
+
+class Task(NamedTuple):
+    #: called on the worker thread with the engine and a function returning
+    #: whether the task should stop early
+    job: Callable[[Engine, Cancelled], object]
+    #: called with the result of `job` through `post`
+    callback: Callable[[object], None]
+
+
+class EngineWorker(Thread):
+    """
+    Executes tasks on an `Engine` in a background thread.
+
+    Only the newest request is executed: a new request replaces a pending
+    one and cancels the running one. Results are handed to `post`, e.g.
+    `GLib.idle_add`, to call the callback on the UI thread. Results of
+    replaced requests are dropped.
+    """
+
+    def __init__(self, engine: Engine,
+                 post: Callable[..., object] = lambda fn, *args: fn(*args)):
+        super().__init__(daemon=True, name="opencvstudio.EngineWorker")
+        self.engine = engine
+        self.post = post
+
+        self._pending: Optional[List[Task]] = None
+        self._generation = 0
+        self._should_exit = False
+        self._cancel = Event()
+        self._engine_lock = Lock()
+        self.cond = Condition(Lock())
+
+    def request(self, *tasks: Task) -> None:
+        """
+        Execute `tasks` one after another, replacing previous requests.
+        """
+        with self.cond:
+            self._generation += 1
+            self._pending = list(tasks)
+            self._cancel.set()
+            self.cond.notify()
+
+    @contextmanager
+    def modify(self) -> Iterator[Engine]:
+        """
+        Lock engine for modification. A running task is cancelled and
+        executed again afterwards.
+        """
+        self._cancel.set()
+        with self._engine_lock:
+            yield self.engine
+
+    def close(self) -> None:
+        with self.cond:
+            self._should_exit = True
+            self._cancel.set()
+            self.cond.notify()
+
+        self.join()
+
+    def run(self) -> None:
+        while True:
+            with self.cond:
+                while self._pending is None and not self._should_exit:
+                    self.cond.wait()
+
+                if self._should_exit:
+                    return
+
+                tasks, self._pending = self._pending, None
+                generation = self._generation
+                self._cancel.clear()
+
+            self._execute(tasks, generation)
+
+    def _execute(self, tasks: List[Task], generation: int) -> None:
+        for i, task in enumerate(tasks):
+            with self._engine_lock:
+                try:
+                    result = task.job(self.engine, self._cancel.is_set)
+                except Exception:
+                    logger.error("Engine task failed", exc_info=True)
+                    return
+
+            if self._cancel.is_set():
+                with self.cond:
+                    if self._pending is None and not self._should_exit:
+                        # cancelled by modification: repeat remaining tasks
+                        self._pending = tasks[i:]
+                return
+
+            self.post(self._deliver, generation, task.callback, result)
+
+    def _deliver(self, generation: int, callback: Callable[[object], None],
+                 result: object) -> bool:
+        if generation == self._generation:
+            callback(result)
+        return False
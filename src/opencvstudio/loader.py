@@ -0,0 +1,136 @@
+"""
+Lazy loading of image files.
+
+`load_image` reads only the header of a file, so size and color space are
+known without decoding pixels. The pixels are decoded on first access of
+`Image.data`.
+"""
+import os
+from pathlib import Path
+from threading import Lock
+from typing import Optional, Tuple, Union
+
+import cv2
+import numpy
+from opencvstudio.dataops import read_image, read_image_header
+from opencvstudio.primitives import Box, ImageData, Size
+from opencvstudio.primitives.color import ColorSpace
+from opencvstudio.primitives.image import Image, ImageSpec
+
+
+#: reduction factors supported by OpenCV's decoders
+_REDUCED_FLAGS = {
+    ColorSpace.BGR: ((8, cv2.IMREAD_REDUCED_COLOR_8),
+                     (4, cv2.IMREAD_REDUCED_COLOR_4),
+                     (2, cv2.IMREAD_REDUCED_COLOR_2)),
+    ColorSpace.GRAY: ((8, cv2.IMREAD_REDUCED_GRAYSCALE_8),
+                      (4, cv2.IMREAD_REDUCED_GRAYSCALE_4),
+                      (2, cv2.IMREAD_REDUCED_GRAYSCALE_2)),
+}
+
+
+def color_space(channels: int) -> ColorSpace:
+    """
+    :return: color space of data decoded by OpenCV with `channels`
+    """
+    try:
+        return {1: ColorSpace.GRAY, 3: ColorSpace.BGR,
+                4: ColorSpace.BGRA}[channels]
+    except KeyError:
+        raise IOError(f"Unsupported number of channels {channels}") from None
+
+
+def data_color_space(data: ImageData) -> ColorSpace:
+    return color_space(data.shape[2] if data.ndim == 3 else 1)
+
+
+class LazyImage(Image):
+    """
+    Image file decoded on first access of its data.
+    """
+
+    def __init__(self, path: Union[str, Path], size: Size,
+                 color: ColorSpace, dtype: numpy.dtype):
+        self.path = str(path)
+        self.dtype = dtype
+        # identifies the version of the file
+        self.stat = os.stat(self.path)
+        self._size = size
+        self._color = color
+        self._decoded: Optional[ImageData] = None
+        self._reduced: Optional[Tuple[int, Image]] = None
+        self._lock = Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._decoded is not None
+
+    @property
+    def _data(self) -> ImageData:
+        with self._lock:
+            if self._decoded is None:
+                data = read_image(self.path)
+                if data.shape[:2] != (self._size.height, self._size.width) \
+                        or data_color_space(data) != self._color:
+                    raise IOError(f"Image {self.path} does not match its "
+                                  f"header")
+                self._decoded = data
+                self._reduced = None
+            return self._decoded
+
+    @property
+    def size(self) -> Size:
+        return self._size
+
+    @property
+    def box(self) -> Box:
+        return Box.from_size(self._size)
+
+    def reduced(self, scale: float) -> Tuple[Image, float]:
+        if self.loaded or self.dtype != numpy.uint8 \
+                or self._color not in _REDUCED_FLAGS \
+                or self.path.lower().endswith(".npy"):
+            return self, 1.0
+
+        for factor, flags in _REDUCED_FLAGS[self._color]:
+            if scale * factor <= 1.0:
+                break
+        else:
+            return self, 1.0
+
+        with self._lock:
+            if self._reduced is None or self._reduced[0] != factor:
+                self._reduced = (factor, Image(
+                    read_image(self.path, flags), self._color))
+            return self._reduced[1], 1.0 / factor
+
+
+def read_spec(path: Union[str, Path]) -> Optional[ImageSpec]:
+    """
+    :return: size and color space of an image file without decoding it, or
+      `None` if the format is not supported
+    """
+    header = read_image_header(path)
+    if header is None:
+        return None
+    width, height, channels, _ = header
+    return ImageSpec(Size(width, height), color_space(channels))
+
+
+def load_image(path: Union[str, Path]) -> Image:
+    """
+    Open an image file with alpha channel and depth.
+
+    For PNG, JPEG and ``.npy`` files only the header is read and a
+    `LazyImage` is returned. Other formats are decoded immediately.
+    """
+    if not os.path.isfile(path):
+        raise IOError(f"Failed to load image at {path}")
+
+    header = read_image_header(path)
+    if header is None:
+        data = read_image(path)
+        return Image(data, data_color_space(data))
+
+    width, height, channels, dtype = header
+    return LazyImage(path, Size(width, height), color_space(channels), dtype)
@@ -0,0 +1,231 @@
+"""
+Text recognition with Tesseract.
+
+Tesseract has no server mode and pytesseract starts a process per call, so
+`TesseractPool` passes many regions to one process instead: the regions are
+written to a temporary directory and listed in a text file, which tesseract
+reads as the pages of one document. Results are cached by the content of
+the regions.
+"""
+import os
+import tempfile
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import blake2b
+from threading import Lock
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, \
+    Tuple
+
+import cv2
+import numpy
+from opencvstudio.primitives import ImageData
+from opencvstudio.primitives.box import BoxArray
+
+
+class OcrResult(NamedTuple):
+    #: recognized text, lines separated by newlines and paragraphs by empty
+    #: lines
+    text: str
+    #: boxes of `words`
+    boxes: BoxArray
+    words: Tuple[str, ...]
+    #: confidence of each word from 0 to 100
+    confidences: numpy.ndarray
+
+    @classmethod
+    def empty(cls) -> "OcrResult":
+        return cls("", BoxArray(), (), numpy.empty(0))
+
+    def translated(self, dx: int, dy: int) -> "OcrResult":
+        return self._replace(boxes=self.boxes.translated(dx, dy))
+
+    @classmethod
+    def concat(cls, results: Sequence["OcrResult"]) -> "OcrResult":
+        """
+        :return: words of all `results`, texts separated by empty lines
+        """
+        if not results:
+            return cls.empty()
+        return cls(
+            "\n\n".join(result.text for result in results if result.text),
+            BoxArray(numpy.concatenate(
+                [result.boxes.data for result in results])),
+            sum((result.words for result in results), ()),
+            numpy.concatenate(
+                [result.confidences for result in results]))
+
+
+#: recognizes the images with language and configuration
+Recognizer = Callable[[Sequence[ImageData], str, str], List[OcrResult]]
+
+
+def run_tesseract(images: Sequence[ImageData], language: str,
+                  config: str) -> List[OcrResult]:
+    """
+    Recognize `images` in one tesseract process.
+    """
+    import pytesseract
+
+    with tempfile.TemporaryDirectory(prefix="opencvstudio-ocr-") as directory:
+        paths = []
+        for i, img in enumerate(images):
+            path = os.path.join(directory, f"{i}.png")
+            if not cv2.imwrite(path, img):
+                raise IOError(f"Failed to save region at {path}")
+            paths.append(path)
+
+        list_path = os.path.join(directory, "regions.txt")
+        with open(list_path, "w", encoding="utf-8") as fp:
+            fp.write("\n".join(paths) + "\n")
+
+        data = pytesseract.image_to_data(
+            list_path, lang=language, config=config,
+            output_type=pytesseract.Output.DICT)
+    return parse_data(data, len(images))
+
+
+def parse_data(data: Dict[str, list], pages: int) -> List[OcrResult]:
+    """
+    Split the output of ``pytesseract.image_to_data`` into the results of
+    its pages.
+    """
+    # (block, paragraph, line), text, confidence, box of each word
+    words: List[list] = [[] for _ in range(pages)]
+    for i, text in enumerate(data["text"]):
+        # levels: page, block, paragraph, line, word
+        if data["level"][i] != 5 or not str(text).strip():
+            continue
+        page = int(data["page_num"][i]) - 1
+        if not 0 <= page < pages:
+            continue
+        line = (int(data["block_num"][i]), int(data["par_num"][i]),
+                int(data["line_num"][i]))
+        box = (data["left"][i], data["top"][i], data["width"][i],
+               data["height"][i])
+        words[page].append((line, str(text).strip(),
+                            float(data["conf"][i]), box))
+
+    return [_page_result(page) for page in words]
+
+
+def _page_result(words) -> OcrResult:
+    if not words:
+        return OcrResult.empty()
+
+    text = []
+    previous = None
+    for line, word, _, _ in words:
+        if previous is not None:
+            if line[:2] != previous[:2]:
+                text.append("\n\n")
+            elif line != previous:
+                text.append("\n")
+            else:
+                text.append(" ")
+        text.append(word)
+        previous = line
+
+    return OcrResult(
+        "".join(text),
+        BoxArray.from_xywh([box for _, _, _, box in words]),
+        tuple(word for _, word, _, _ in words),
+        numpy.array([conf for _, _, conf, _ in words]))
+
+
+def region_key(img: ImageData, language: str, config: str) -> bytes:
+    digest = blake2b(digest_size=20)
+    digest.update(f"{language}:{config}:{img.dtype.str}:{img.shape}".encode())
+    digest.update(numpy.ascontiguousarray(img))
+    return digest.digest()
+
+
+class TesseractPool:
+    """
+    Recognizes batches of regions with at most `workers` tesseract
+    processes at once. A batch is split into one chunk per worker and each
+    chunk is recognized by a single process.
+
+    Processes are not kept between calls: each call of `run` with uncached
+    regions starts up to `workers` new tesseract processes, each loading the
+    language data again. Only the LRU cache of `cache_size` regions avoids
+    this cost for repeated regions.
+    """
+
+    def __init__(self, workers: Optional[int] = None, cache_size: int = 4096,
+                 recognize: Recognizer = run_tesseract):
+        self.workers = workers or os.cpu_count() or 1
+        self.cache_size = cache_size
+        self.recognize = recognize
+        self.hits = 0
+        self.misses = 0
+        #: number of calls of `recognize`, i.e. tesseract processes
+        self.processes = 0
+        self._cache: "OrderedDict[bytes, OcrResult]" = OrderedDict()
+        self._lock = Lock()
+        self._executor = ThreadPoolExecutor(
+            self.workers, thread_name_prefix="opencvstudio.ocr")
+
+    def run(self, images: Sequence[ImageData], language: str = "eng",
+            config: str = "") -> List[OcrResult]:
+        """
+        :return: result of each image in region coordinates
+        """
+        keys = [region_key(img, language, config) for img in images]
+        results: Dict[bytes, OcrResult] = {}
+        missing: Dict[bytes, ImageData] = {}
+        with self._lock:
+            for key, img in zip(keys, images):
+                result = self._cache.get(key)
+                if result is not None:
+                    self._cache.move_to_end(key)
+                    results[key] = result
+                    self.hits += 1
+                elif img.size == 0:
+                    results[key] = OcrResult.empty()
+                elif key not in missing:
+                    missing[key] = img
+                    self.misses += 1
+
+        if missing:
+            items = list(missing.items())
+            size = -(-len(items) // self.workers)
+            chunks = [items[i:i + size] for i in range(0, len(items), size)]
+            futures = [
+                self._executor.submit(
+                    self.recognize, [img for _, img in chunk], language,
+                    config)
+                for chunk in chunks]
+            for chunk, future in zip(chunks, futures):
+                recognized = future.result()
+                with self._lock:
+                    self.processes += 1
+                    for (key, _), result in zip(chunk, recognized):
+                        results[key] = result
+                        self._put(key, result)
+
+        return [results[key] for key in keys]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+    def _put(self, key: bytes, result: OcrResult) -> None:
+        self._cache[key] = result
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+
+_pool: Optional[TesseractPool] = None
+_pool_lock = Lock()
+
+
+def get_pool() -> TesseractPool:
+    """
+    :return: pool used by `OcrOp`, created on first use
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = TesseractPool()
+        return _pool
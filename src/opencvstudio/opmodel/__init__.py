@@ -1,19 +1,71 @@
 from abc import ABC
 from dataclasses import dataclass
-from typing import Callable, Iterable, List, Type, Union
+from typing import Callable, Dict, Iterable, List, Mapping, Optional, \
+    Tuple, Type, TypeVar, Union
 
+import numpy
+from opencvstudio.primitives import Box
+from opencvstudio.primitives.buffers import BufferPool
 from opencvstudio.primitives.image import Image, ImageSpec
 
 
 class OperationContext:
 
-    def __init__(self):
-        pass
+    def __init__(self, buffers: Optional[BufferPool] = None):
+        #: arrays for results of operations
+        self.buffers = BufferPool() if buffers is None else buffers
+
+    def output(self, img: Image, shape: Tuple[int, ...],
+               dtype: numpy.dtype) -> numpy.ndarray:
+        """
+        :return: array for the result of an operation on `img`. This is the
+          data of `img` itself if `img` owns it and it has the same shape and
+          dtype, otherwise an array from `buffers`.
+        """
+        data = img.data
+        if img.owned and data.shape == tuple(shape) and data.dtype == dtype:
+            return data
+        return self.buffers.take(shape, dtype)
+
+    def release(self, img: Image) -> None:
+        """
+        Make the data of `img` available for other results if `img` owns
+        it. `img` must not be used anymore.
+        """
+        if img.owned:
+            self.buffers.release(img.data)
 
 
 class OperationResult:
-    def __init__(self, image: Image):
+    """
+    Image and named outputs of an operation, e.g. a `BoxArray` of detected
+    objects, recognized text or measurements as numbers.
+
+    Outputs are passed on to following steps, which can use them (see
+    `Operation.apply`) or replace them by outputs of the same name. Values
+    should be of types `engine.outputs` can serialize.
+    """
+
+    def __init__(self, image: Image,
+                 outputs: Optional[Mapping[str, object]] = None):
         self.image = image
+        self.outputs: Dict[str, object] = {} if outputs is None \
+            else dict(outputs)
+
+    def updated(self, result: Union[Image, "OperationResult"]) \
+            -> "OperationResult":
+        """
+        :param result: result of an operation on `image`
+        :return: `result` with the outputs of this result it does not replace
+        """
+        if isinstance(result, Image):
+            return OperationResult(result, self.outputs)
+        outputs = dict(self.outputs)
+        outputs.update(result.outputs)
+        return OperationResult(result.image, outputs)
+
+    def shared(self) -> "OperationResult":
+        return OperationResult(self.image.shared(), self.outputs)
 
 
 Errors = Iterable[Union[str, Exception, Warning]]
@@ -24,18 +76,156 @@ class Operation(ABC):
     Extension point for operations
     """
 
-    def execute(self, ctx: OperationContext, image: Image) -> Image:
+    #: name under which the type is registered (see `register_operation`)
+    type_name: str = None
+
+    #: names of the inputs in a pipeline graph (see `combine`)
+    inputs: Tuple[str, ...] = ("image",)
+
+    @classmethod
+    def parameters(cls) -> List["Parameter"]:
+        return []
+
+    def execute(self, ctx: OperationContext, image: Image) \
+            -> Union[Image, OperationResult]:
         pass
 
+    def apply(self, ctx: OperationContext,
+              input: OperationResult) -> OperationResult:
+        """
+        Execute on the image of `input`. Operations using outputs of
+        previous steps override this.
+
+        :return: result with the outputs of `input` and of this operation
+        """
+        return input.updated(self.execute(ctx, input.image))
+
+    def combine(self, ctx: OperationContext,
+                inputs: Mapping[str, OperationResult]) -> OperationResult:
+        """
+        Execute on the results connected to the named `inputs` in a
+        pipeline graph. Operations with more than one input override this,
+        others apply to their only input.
+        """
+        return self.apply(ctx, inputs[self.inputs[0]])
+
     def errors(self, img: ImageSpec) -> Errors:
         return []
 
+    def output_spec(self, img: ImageSpec) -> Optional[ImageSpec]:
+        """
+        :return: size and color space of the result for an input described
+          by `img` or `None` if unknown without execution
+        """
+        return None
+
+    def input_region(self, region: Box) -> Optional[Box]:
+        """
+        :return: region of the input needed to compute `region` of the
+          output or `None` if the whole input is needed
+        """
+        return None
+
+    def output_region(self, region: Box) -> Optional[Box]:
+        """
+        :return: region of the output computed from `region` of the input or
+          `None` if unknown
+        """
+        return None
+
+    def localize(self, region: Box, scale: float) -> Optional["Operation"]:
+        """
+        :return: operation with the same effect on the part of the input
+          given by `region` and scaled by `scale`, or `None` if the
+          operation does not support it
+        """
+        return None
+
+
+def is_error(error: Union[str, Exception, Warning]) -> bool:
+    """
+    :return: whether `error` prevents execution, i.e. is not a warning
+    """
+    return not isinstance(error, Warning)
+
+
+class PointwiseOperation(Operation):
+    """
+    Operation computing each output pixel from the input pixel at the same
+    position.
+    """
+
+    def input_region(self, region: Box) -> Optional[Box]:
+        return region
+
+    def output_region(self, region: Box) -> Optional[Box]:
+        return region
+
+    def localize(self, region: Box, scale: float) -> Optional[Operation]:
+        return self
+
+
+class NeighborhoodOperation(Operation):
+    """
+    Operation computing each output pixel from the input pixels within
+    `radius` of the same position, e.g. a filter. The output has the size
+    of the input.
+    """
+
+    def radius(self) -> int:
+        return 0
+
+    def input_region(self, region: Box) -> Optional[Box]:
+        return region.expanded(self.radius())
+
+    def output_region(self, region: Box) -> Optional[Box]:
+        return region
+
+    def localize(self, region: Box, scale: float) -> Optional[Operation]:
+        # pixels near the border of `region` differ from the full result
+        return self if scale == 1.0 else None
+
 
 @dataclass
 class Parameter:
     name: str
     ty: Type
     default: Union[Callable[[Image], object], object]
+    #: type of the items if `ty` is a sequence type like `tuple`
+    item: Optional[Type] = None
+
+
+OperationType = TypeVar("OperationType", bound=Type[Operation])
+
+_registry: Dict[str, Type[Operation]] = {}
+
+
+def register_operation(name: str) \
+        -> Callable[[OperationType], OperationType]:
+    """
+    Class decorator to make an operation type known under `name`, e.g. for
+    saving pipelines. A class of the same module and name replaces the
+    registered one, e.g. when the module is reloaded.
+
+    :raises ValueError: if another class is registered under `name`
+    """
+    def decorator(cls: OperationType) -> OperationType:
+        registered = _registry.get(name, cls)
+        if (registered.__module__, registered.__qualname__) != \
+                (cls.__module__, cls.__qualname__):
+            raise ValueError(f"Operation name {name} already registered")
+        _registry[name] = cls
+        cls.type_name = name
+        return cls
+    return decorator
+
+
+def operation_type(name: str) -> Type[Operation]:
+    """
+    :return: operation type registered under `name`
+    :raises KeyError: if no operation type is registered under `name`
+    """
+    return _registry[name]
 
 
 class Module:
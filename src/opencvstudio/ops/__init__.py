@@ -0,0 +1,4 @@
+# import builtin operations to register them
+from opencvstudio.ops import box_ops, color_ops, filter_ops  # noqa: F401
+from opencvstudio.ops import ocr_ops  # noqa: F401
+from opencvstudio.ops import mask_ops  # noqa: F401
@@ -1,11 +1,14 @@
 from dataclasses import dataclass
+from typing import Optional
 
 from opencvstudio.dataops import crop
-from opencvstudio.opmodel import Operation, OperationContext, Parameter
-from opencvstudio.primitives.image import Image
-from opencvstudio.primitives import Box
+from opencvstudio.opmodel import Errors, Operation, OperationContext, \
+    Parameter, register_operation
+from opencvstudio.primitives.image import Image, ImageSpec
+from opencvstudio.primitives import Box, Size
 
 
+@register_operation("crop")
 @dataclass
 class CropOp(Operation):
 
@@ -20,7 +23,29 @@ class CropOp(Operation):
     def execute(self, ctx: OperationContext, img: Image) -> Image:
         return img.replace_data(crop(img.data, self.box))
 
-    def __str__(self):
-        return f"Crop {self.box}"
+    def errors(self, img: ImageSpec) -> Errors:
+        if self.box.empty:
+            return (f"Crop box {self.box} is empty",)
+        if self.box.intersection(Box.from_size(img.size)) != self.box:
+            return (f"Crop box {self.box} exceeds image of size {img.size}",)
+
+        return ()
+
+    def output_spec(self, img: ImageSpec) -> Optional[ImageSpec]:
+        box = self.box.intersection(Box.from_size(img.size))
+        return ImageSpec(Size(box.width, box.height), img.color)
 
+    def input_region(self, region: Box) -> Optional[Box]:
+        output = Box(0, 0, self.box.width, self.box.height)
+        return region.intersection(output).translated(self.box.x, self.box.y)
 
+    def output_region(self, region: Box) -> Optional[Box]:
+        return region.intersection(self.box).translated(
+            -self.box.x, -self.box.y)
+
+    def localize(self, region: Box, scale: float) -> Optional[Operation]:
+        box = region.intersection(self.box).translated(-region.x, -region.y)
+        return CropOp(box.scaled(scale))
+
+    def __str__(self):
+        return f"Crop {self.box}"
@@ -1,14 +1,16 @@
 from dataclasses import dataclass
-from typing import Iterable, Union
+from typing import Optional, Tuple
 
-from opencvstudio.opmodel import Errors, Operation, OperationContext, Parameter
+from opencvstudio.opmodel import Errors, OperationContext, Parameter, \
+    PointwiseOperation, register_operation
 from opencvstudio.primitives.color import ColorSpace
 from opencvstudio.dataops import can_convert_color, convert_color
 from opencvstudio.primitives.image import Image, ImageSpec
 
 
+@register_operation("change_color_space")
 @dataclass
-class ChangeColorSpaceOp(Operation):
+class ChangeColorSpaceOp(PointwiseOperation):
 
     target: ColorSpace = ColorSpace.GRAY
 
@@ -22,9 +24,7 @@ class ChangeColorSpaceOp(Operation):
         self.target = target
 
     def execute(self, ctx: OperationContext, img: Image) -> Image:
-        return img.replace_color_data(
-            convert_color(img.data, img.color, self.target),
-            self.target)
+        return _convert(ctx, img, self.target)
 
     def errors(self, img: ImageSpec) -> Errors:
         if not can_convert_color(img.color, self.target):
@@ -32,3 +32,43 @@ class ChangeColorSpaceOp(Operation):
                     f" color space",)
 
         return ()
+
+    def output_spec(self, img: ImageSpec) -> Optional[ImageSpec]:
+        return ImageSpec(img.size, self.target)
+
+
+@dataclass(frozen=True)
+class ColorPathOp(PointwiseOperation):
+    """
+    Converts color space along `path`, e.g. to replace consecutive
+    `ChangeColorSpaceOp`.
+    """
+
+    path: Tuple[ColorSpace, ...]
+
+    def execute(self, ctx: OperationContext, img: Image) -> Image:
+        result = img
+        for target in self.path:
+            converted = _convert(ctx, result, target)
+            if result is not img and converted.data is not result.data:
+                ctx.release(result)
+            result = converted
+        return result
+
+    def output_spec(self, img: ImageSpec) -> Optional[ImageSpec]:
+        return ImageSpec(img.size, self.path[-1] if self.path else img.color)
+
+    def __str__(self):
+        return "Convert " + " -> ".join(color.value for color in self.path)
+
+
+def _convert(ctx: OperationContext, img: Image, target: ColorSpace) -> Image:
+    if img.color == target:
+        return img
+
+    data = img.data
+    shape = data.shape[:2] + ((target.channels,) if target.channels > 1
+                              else ())
+    dst = ctx.output(img, shape, data.dtype)
+    return img.replace_color_data(
+        convert_color(data, img.color, target, dst), target, owned=True)
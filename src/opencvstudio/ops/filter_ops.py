@@ -0,0 +1,42 @@
+from dataclasses import dataclass
+from math import ceil
+from typing import Optional
+
+import cv2
+from opencvstudio.opmodel import Errors, NeighborhoodOperation, \
+    OperationContext, Parameter, register_operation
+from opencvstudio.primitives.image import Image, ImageSpec
+
+
+@register_operation("gaussian_blur")
+@dataclass
+class GaussianBlurOp(NeighborhoodOperation):
+
+    sigma: float = 2.0
+
+    @classmethod
+    def parameters(cls):
+        return [
+            Parameter("sigma", float, 2.0)
+        ]
+
+    def radius(self) -> int:
+        return max(ceil(3 * self.sigma), 1)
+
+    def execute(self, ctx: OperationContext, img: Image) -> Image:
+        size = 2 * self.radius() + 1
+        dst = ctx.output(img, img.data.shape, img.data.dtype)
+        return img.replace_data(
+            cv2.GaussianBlur(img.data, (size, size), self.sigma, dst=dst),
+            owned=True)
+
+    def errors(self, img: ImageSpec) -> Errors:
+        if self.sigma <= 0:
+            return (f"Sigma {self.sigma} is not positive",)
+        return ()
+
+    def output_spec(self, img: ImageSpec) -> Optional[ImageSpec]:
+        return img
+
+    def __str__(self):
+        return f"Gaussian blur {self.sigma}"
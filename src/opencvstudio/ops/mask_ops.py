@@ -0,0 +1,91 @@
+from dataclasses import dataclass
+from typing import Mapping, Optional
+
+import cv2
+from opencvstudio.opmodel import Errors, Operation, OperationContext, \
+    OperationResult, Parameter, PointwiseOperation, register_operation
+from opencvstudio.primitives import Box
+from opencvstudio.primitives.color import ColorSpace
+from opencvstudio.primitives.error import ImageOperationError
+from opencvstudio.primitives.image import Image, ImageSpec
+
+
+@register_operation("threshold")
+@dataclass
+class ThresholdOp(PointwiseOperation):
+    """
+    Sets pixels above `threshold` to 255, others to 0. With `otsu` the
+    threshold is computed from the histogram of the image instead.
+    """
+
+    threshold: float = 128.0
+    otsu: bool = False
+
+    @classmethod
+    def parameters(cls):
+        return [
+            Parameter("threshold", float, 128.0),
+            Parameter("otsu", bool, False),
+        ]
+
+    def execute(self, ctx: OperationContext, img: Image) -> Image:
+        flags = cv2.THRESH_BINARY | (cv2.THRESH_OTSU if self.otsu else 0)
+        dst = ctx.output(img, img.data.shape, img.data.dtype)
+        _, data = cv2.threshold(img.data, self.threshold, 255, flags, dst=dst)
+        return img.replace_data(data, owned=True)
+
+    def errors(self, img: ImageSpec) -> Errors:
+        if self.otsu and img.color != ColorSpace.GRAY:
+            return (f"Otsu's method needs a gray image, not {img.color}",)
+        return ()
+
+    def output_spec(self, img: ImageSpec) -> Optional[ImageSpec]:
+        return img
+
+    def localize(self, region: Box, scale: float) -> Optional[Operation]:
+        # the histogram of a part differs from the one of the whole image
+        return None if self.otsu else self
+
+    def __str__(self):
+        return "Threshold (Otsu)" if self.otsu \
+            else f"Threshold {self.threshold}"
+
+
+@register_operation("mask")
+@dataclass
+class MaskOp(Operation):
+    """
+    Keeps pixels of the "image" input where the gray "mask" input is not
+    zero and sets the others to zero. Needs a pipeline graph to connect
+    both inputs.
+    """
+
+    inputs = ("image", "mask")
+
+    def combine(self, ctx: OperationContext,
+                inputs: Mapping[str, OperationResult]) -> OperationResult:
+        input = inputs["image"]
+        img = input.image
+        mask = inputs["mask"].image
+        if mask.color != ColorSpace.GRAY:
+            raise ImageOperationError(
+                f"Mask must be a gray image, not {mask.color}")
+        if mask.size != img.size:
+            raise ImageOperationError(
+                f"Mask of size {mask.size} does not match image of size "
+                f"{img.size}")
+
+        # masked out pixels of `dst` are left as they are
+        dst = ctx.buffers.take(img.data.shape, img.data.dtype)
+        dst[...] = 0
+        data = cv2.bitwise_and(img.data, img.data, dst=dst, mask=mask.data)
+        return input.updated(img.replace_data(data, owned=True))
+
+    def execute(self, ctx: OperationContext, img: Image) -> Image:
+        raise ImageOperationError("Mask needs a mask input")
+
+    def output_spec(self, img: ImageSpec) -> Optional[ImageSpec]:
+        return img
+
+    def __str__(self):
+        return "Mask"
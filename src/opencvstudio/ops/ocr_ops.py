@@ -0,0 +1,114 @@
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+import cv2
+import numpy
+from opencvstudio import ocr
+from opencvstudio.dataops import convert_color
+from opencvstudio.opmodel import Errors, Operation, OperationContext, \
+    OperationResult, Parameter, register_operation
+from opencvstudio.primitives import Box, Size
+from opencvstudio.primitives.box import BoxArray
+from opencvstudio.primitives.color import ColorSpace
+from opencvstudio.primitives.error import ImageOperationError
+from opencvstudio.primitives.image import Image, ImageSpec
+
+
+#: red in each color space, black for gray images
+_FRAME_COLORS = {
+    ColorSpace.RGB: (255, 0, 0),
+    ColorSpace.RGBA: (255, 0, 0, 255),
+    ColorSpace.BGR: (0, 0, 255),
+    ColorSpace.BGRA: (0, 0, 255, 255),
+}
+
+
+@register_operation("ocr")
+@dataclass
+class OcrOp(Operation):
+    """
+    Recognizes text in `regions` or the whole image if no regions are given.
+    The result is the input with the recognized words framed and the
+    outputs "text", "word_boxes", "words" and "word_confidences".
+    """
+
+    regions: Tuple[Box, ...] = ()
+    language: str = "eng"
+    #: tesseract page segmentation mode
+    page_segmentation: int = 3
+    #: name of an output of a previous step with the regions as `BoxArray`,
+    #: used instead of `regions`
+    regions_from: str = ""
+
+    @classmethod
+    def parameters(cls):
+        return [
+            Parameter("regions", tuple, (), item=Box),
+            Parameter("language", str, "eng"),
+            Parameter("page_segmentation", int, 3),
+            Parameter("regions_from", str, ""),
+        ]
+
+    def recognize(self, img: Image,
+                  regions: Optional[BoxArray] = None) -> ocr.OcrResult:
+        """
+        :param regions: default: `regions` of the operation
+        :return: text and word boxes in image coordinates
+        """
+        data = img.data
+        if data.dtype != numpy.uint8:
+            raise ImageOperationError(
+                f"OCR needs 8 bit images, not {data.dtype}")
+
+        if img.color != ColorSpace.GRAY:
+            data = convert_color(data, img.color, ColorSpace.GRAY)
+        if regions is None:
+            regions = BoxArray.from_boxes(self.regions or (img.box,))
+        boxes = regions.clipped(Size(data.shape[1], data.shape[0]))
+        results = ocr.get_pool().run(
+            boxes.crop(data), self.language,
+            f"--psm {self.page_segmentation}")
+        return ocr.OcrResult.concat([
+            result.translated(box.x, box.y)
+            for box, result in zip(boxes, results)])
+
+    def apply(self, ctx: OperationContext,
+              input: OperationResult) -> OperationResult:
+        if not self.regions_from:
+            return super().apply(ctx, input)
+
+        regions = input.outputs.get(self.regions_from)
+        if not isinstance(regions, BoxArray):
+            raise ImageOperationError(
+                f"No boxes in output {self.regions_from} of previous steps")
+        return input.updated(self._execute(input.image, regions))
+
+    def execute(self, ctx: OperationContext, img: Image) -> OperationResult:
+        return self._execute(img, None)
+
+    def _execute(self, img: Image,
+                 regions: Optional[BoxArray]) -> OperationResult:
+        result = self.recognize(img, regions)
+        data = img.data.copy()
+        color = _FRAME_COLORS.get(img.color, (0,))
+        for x, y, width, height in result.boxes.to_xywh().tolist():
+            cv2.rectangle(data, (x, y), (x + width - 1, y + height - 1),
+                          color)
+        return OperationResult(img.replace_data(data, owned=True), {
+            "text": result.text,
+            "word_boxes": result.boxes,
+            "words": result.words,
+            "word_confidences": result.confidences,
+        })
+
+    def errors(self, img: ImageSpec) -> Errors:
+        bounds = Box.from_size(img.size)
+        return tuple(f"OCR region {box} exceeds image of size {img.size}"
+                     for box in self.regions
+                     if box.intersection(bounds) != box)
+
+    def output_spec(self, img: ImageSpec) -> Optional[ImageSpec]:
+        return img
+
+    def __str__(self):
+        return f"OCR ({self.language})"
@@ -1,4 +1,5 @@
 from dataclasses import dataclass
+from math import ceil, floor
 from typing import Tuple, Union
 
 import numpy
@@ -6,6 +7,8 @@ import numpy
 
 @dataclass(frozen=True)
 class Box:
+    # no instance dict; dataclass(slots=True) requires Python 3.10
+    __slots__ = ("x", "y", "width", "height")
     x: int
     y: int
     width: int
@@ -13,38 +16,85 @@ class Box:
 
     @classmethod
     def from_size(cls, size: Union["Size", Tuple[int, int]]):
+        if isinstance(size, Size):
+            return cls(0, 0, size.width, size.height)
         return cls(0, 0, size[0], size[1])
 
+    @property
+    def empty(self) -> bool:
+        return self.width <= 0 or self.height <= 0
+
+    def intersection(self, other: "Box") -> "Box":
+        x = max(self.x, other.x)
+        y = max(self.y, other.y)
+        right = min(self.x + self.width, other.x + other.width)
+        bottom = min(self.y + self.height, other.y + other.height)
+        return Box(x, y, max(right - x, 0), max(bottom - y, 0))
+
+    def expanded(self, margin: int) -> "Box":
+        return Box(self.x - margin, self.y - margin,
+                   self.width + 2 * margin, self.height + 2 * margin)
+
+    def translated(self, dx: int, dy: int) -> "Box":
+        return Box(self.x + dx, self.y + dy, self.width, self.height)
+
+    def scaled(self, factor: float) -> "Box":
+        """
+        :return: smallest box with integer coordinates covering this box
+          scaled by `factor`
+        """
+        x = floor(self.x * factor)
+        y = floor(self.y * factor)
+        return Box(x, y,
+                   ceil((self.x + self.width) * factor) - x,
+                   ceil((self.y + self.height) * factor) - y)
+
+    def __reduce__(self):
+        # default pickling restores slots with the frozen __setattr__
+        return Box, (self.x, self.y, self.width, self.height)
+
     def __str__(self):
         return f"{self.x}x{self.y}x{self.width}x{self.height}"
 
 
 @dataclass(frozen=True)
 class Size:
+    __slots__ = ("width", "height")
     width: int
     height: int
 
+    def __reduce__(self):
+        return Size, (self.width, self.height)
+
     def __str__(self):
         return f"{self.width}x{self.height}"
 
 
 @dataclass(frozen=True)
 class RgbColor:
+    __slots__ = ("r", "g", "b")
     r: int
     g: int
     b: int
 
+    def __reduce__(self):
+        return RgbColor, (self.r, self.g, self.b)
+
     def __str__(self):
         return f"#{self.r:02X}{self.g:02X}{self.b:02X}"
 
 
 @dataclass(frozen=True)
 class RgbaColor:
+    __slots__ = ("r", "g", "b", "a")
     r: int
     g: int
     b: int
     a: int
 
+    def __reduce__(self):
+        return RgbaColor, (self.r, self.g, self.b, self.a)
+
     def __str__(self):
         return f"#{self.r:02X}{self.g:02X}{self.b:02X}{self.a:02X}"
 
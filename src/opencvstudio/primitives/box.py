@@ -1,2 +1,263 @@
-from dataclasses import dataclass
+"""
+Many boxes at once, e.g. from detection or OCR.
 
+`BoxArray` keeps boxes in a structured NumPy array, so clipping,
+intersection, areas and non-maximum suppression work on all boxes without a
+Python loop over `Box` instances.
+"""
+from typing import Iterable, Iterator, List, Union
+
+import numpy
+from opencvstudio.primitives import Box, ImageData, Size
+
+
+#: fields of the structured array of `BoxArray`
+BOX_DTYPE = numpy.dtype([
+    ("x", numpy.int32),
+    ("y", numpy.int32),
+    ("width", numpy.int32),
+    ("height", numpy.int32),
+])
+
+
+class BoxArray:
+    """
+    Boxes in a one-dimensional array of `BOX_DTYPE`.
+
+    Indexing with an integer returns a `Box`, indexing with a slice, mask or
+    index array returns a `BoxArray`.
+    """
+
+    __slots__ = ("data",)
+
+    def __init__(self, data: numpy.ndarray = None):
+        if data is None:
+            data = numpy.empty(0, BOX_DTYPE)
+        if data.dtype != BOX_DTYPE or data.ndim != 1:
+            raise ValueError(f"Expected one-dimensional array of {BOX_DTYPE}")
+        self.data = data
+
+    @classmethod
+    def from_columns(cls, x, y, width, height) -> "BoxArray":
+        """
+        :param x: sequence or array of x coordinates. The other parameters
+          are the same length or scalars.
+        """
+        x, y, width, height = numpy.broadcast_arrays(
+            numpy.asarray(x), numpy.asarray(y), numpy.asarray(width),
+            numpy.asarray(height))
+        data = numpy.empty(x.size, BOX_DTYPE)
+        data["x"] = x.ravel()
+        data["y"] = y.ravel()
+        data["width"] = width.ravel()
+        data["height"] = height.ravel()
+        return cls(data)
+
+    @classmethod
+    def from_xywh(cls, xywh) -> "BoxArray":
+        """
+        :param xywh: array of shape (n, 4), e.g. from `cv2.boundingRect`
+          or a detector
+        """
+        xywh = numpy.asarray(xywh).reshape(-1, 4)
+        return cls.from_columns(xywh[:, 0], xywh[:, 1], xywh[:, 2],
+                                xywh[:, 3])
+
+    @classmethod
+    def from_corners(cls, x1, y1, x2, y2) -> "BoxArray":
+        """
+        :return: boxes from top left (inclusive) and bottom right
+          (exclusive) corners
+        """
+        x1 = numpy.asarray(x1)
+        y1 = numpy.asarray(y1)
+        return cls.from_columns(x1, y1, numpy.asarray(x2) - x1,
+                                numpy.asarray(y2) - y1)
+
+    @classmethod
+    def from_boxes(cls, boxes: Iterable[Box]) -> "BoxArray":
+        return cls(numpy.array(
+            [(box.x, box.y, box.width, box.height) for box in boxes],
+            BOX_DTYPE))
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __iter__(self) -> Iterator[Box]:
+        for x, y, width, height in self.data.tolist():
+            yield Box(x, y, width, height)
+
+    def __getitem__(self, item) -> Union[Box, "BoxArray"]:
+        if isinstance(item, (int, numpy.integer)):
+            return Box(*self.data[item].tolist())
+        return BoxArray(self.data[item])
+
+    def __repr__(self):
+        return f"BoxArray({self.to_xywh().tolist()})"
+
+    @property
+    def x(self) -> numpy.ndarray:
+        return self.data["x"]
+
+    @property
+    def y(self) -> numpy.ndarray:
+        return self.data["y"]
+
+    @property
+    def width(self) -> numpy.ndarray:
+        return self.data["width"]
+
+    @property
+    def height(self) -> numpy.ndarray:
+        return self.data["height"]
+
+    @property
+    def right(self) -> numpy.ndarray:
+        return self.x + self.width
+
+    @property
+    def bottom(self) -> numpy.ndarray:
+        return self.y + self.height
+
+    @property
+    def empty(self) -> numpy.ndarray:
+        """
+        :return: mask of boxes without area
+        """
+        return (self.width <= 0) | (self.height <= 0)
+
+    def area(self) -> numpy.ndarray:
+        """
+        :return: areas as int64, zero for empty boxes
+        """
+        return (numpy.maximum(self.width, 0).astype(numpy.int64)
+                * numpy.maximum(self.height, 0))
+
+    def to_xywh(self) -> numpy.ndarray:
+        """
+        :return: array of shape (n, 4)
+        """
+        return numpy.stack(
+            [self.x, self.y, self.width, self.height], axis=1)
+
+    def translated(self, dx: int, dy: int) -> "BoxArray":
+        return BoxArray.from_columns(
+            self.x + dx, self.y + dy, self.width, self.height)
+
+    def expanded(self, margin: int) -> "BoxArray":
+        return BoxArray.from_columns(
+            self.x - margin, self.y - margin,
+            self.width + 2 * margin, self.height + 2 * margin)
+
+    def intersection(self, other: Union[Box, "BoxArray"]) -> "BoxArray":
+        """
+        :param other: a box intersected with every box, or boxes intersected
+          element-wise
+        :return: intersections, empty boxes have zero width or height like
+          `Box.intersection`
+        """
+        if isinstance(other, Box):
+            other = BoxArray.from_columns(
+                other.x, other.y, other.width, other.height)
+        x = numpy.maximum(self.x, other.x)
+        y = numpy.maximum(self.y, other.y)
+        return BoxArray.from_columns(
+            x, y,
+            numpy.maximum(numpy.minimum(self.right, other.right) - x, 0),
+            numpy.maximum(numpy.minimum(self.bottom, other.bottom) - y, 0))
+
+    def clipped(self, bounds: Union[Box, Size]) -> "BoxArray":
+        """
+        :param bounds: e.g. the size of the image
+        """
+        if isinstance(bounds, Size):
+            bounds = Box.from_size(bounds)
+        return self.intersection(bounds)
+
+    def iou(self, other: "BoxArray") -> numpy.ndarray:
+        """
+        :return: intersection over union of each box with each box of
+          `other` as array of shape (len(self), len(other))
+        """
+        width = numpy.minimum(self.right[:, None], other.right[None, :]) \
+            - numpy.maximum(self.x[:, None], other.x[None, :])
+        height = numpy.minimum(self.bottom[:, None], other.bottom[None, :]) \
+            - numpy.maximum(self.y[:, None], other.y[None, :])
+        inter = (numpy.maximum(width, 0).astype(numpy.int64)
+                 * numpy.maximum(height, 0))
+        union = self.area()[:, None] + other.area()[None, :] - inter
+        return _divide(inter, union)
+
+    def nms(self, scores, threshold: float = 0.5) -> numpy.ndarray:
+        """
+        Non-maximum suppression: visit boxes by descending score and drop
+        the boxes overlapping a kept box by more than `threshold`
+        intersection over union.
+
+        :return: indices of kept boxes, highest score first
+        """
+        scores = numpy.asarray(scores)
+        if scores.shape != (len(self),):
+            raise ValueError("Expected one score per box")
+
+        x1, y1, x2, y2 = self.x, self.y, self.right, self.bottom
+        area = self.area()
+        order = numpy.argsort(-scores, kind="stable")
+        keep = []
+        while order.size:
+            i = order[0]
+            keep.append(i)
+            rest = order[1:]
+            width = numpy.minimum(x2[i], x2[rest]) \
+                - numpy.maximum(x1[i], x1[rest])
+            height = numpy.minimum(y2[i], y2[rest]) \
+                - numpy.maximum(y1[i], y1[rest])
+            inter = (numpy.maximum(width, 0).astype(numpy.int64)
+                     * numpy.maximum(height, 0))
+            iou = _divide(inter, area[i] + area[rest] - inter)
+            order = rest[iou <= threshold]
+        return numpy.array(keep, dtype=numpy.intp)
+
+    def crop(self, img: ImageData) -> List[ImageData]:
+        """
+        :return: views of `img` for each box clipped to the image
+        """
+        height, width = img.shape[:2]
+        clipped = self.clipped(Size(width, height))
+        return [img[y:y + h, x:x + w]
+                for x, y, w, h in clipped.data.tolist()]
+
+    def extract(self, img: ImageData, size: Size) -> ImageData:
+        """
+        Sample every box to `size` with nearest neighbor interpolation in a
+        single indexing operation. Pixels outside of `img` repeat the
+        border.
+
+        :return: array of shape (len(self), height, width, ...)
+        """
+        rows = _sample(self.y, self.height, size.height, img.shape[0])
+        cols = _sample(self.x, self.width, size.width, img.shape[1])
+        return img[rows[:, :, None], cols[:, None, :]]
+
+
+def _sample(start: numpy.ndarray, length: numpy.ndarray, samples: int,
+            limit: int) -> numpy.ndarray:
+    """
+    :return: array of shape (len(start), samples) with the indices of the
+      pixel centers
+    """
+    offsets = (numpy.arange(samples) + 0.5) / samples
+    indices = start[:, None] + numpy.floor(
+        offsets[None, :] * length[:, None]).astype(numpy.intp)
+    return numpy.clip(indices, 0, limit - 1)
+
+
+def _divide(numerator: numpy.ndarray,
+            denominator: numpy.ndarray) -> numpy.ndarray:
+    """
+    :return: quotient, zero where `denominator` is zero
+    """
+    result = numpy.zeros(numpy.broadcast(numerator, denominator).shape)
+    numpy.divide(numerator, denominator, out=result,
+                 where=denominator != 0)
+    return result
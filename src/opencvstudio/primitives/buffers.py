@@ -0,0 +1,57 @@
+from collections import defaultdict
+from threading import Lock
+from typing import Dict, List, Tuple
+
+import numpy
+
+
+class BufferPool:
+    """
+    Arrays for reuse by shape and dtype, bounded by their total byte size.
+
+    Arrays given to `release` must not be used elsewhere anymore.
+    """
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._free: Dict[Tuple[Tuple[int, ...], numpy.dtype],
+                         List[numpy.ndarray]] = defaultdict(list)
+        self._lock = Lock()
+
+    def take(self, shape: Tuple[int, ...],
+             dtype: numpy.dtype) -> numpy.ndarray:
+        """
+        :return: uninitialized array, released before or new
+        """
+        key = (tuple(shape), numpy.dtype(dtype))
+        with self._lock:
+            free = self._free.get(key)
+            if free:
+                array = free.pop()
+                self.size -= array.nbytes
+                self.hits += 1
+                return array
+            self.misses += 1
+        return numpy.empty(shape, dtype)
+
+    def release(self, array: numpy.ndarray) -> None:
+        """
+        Keep `array` for reuse unless it is a view or the pool is full.
+        """
+        if array.base is not None or not array.flags.c_contiguous \
+                or not array.flags.writeable:
+            return
+
+        with self._lock:
+            if self.size + array.nbytes > self.max_bytes:
+                return
+            self._free[(array.shape, array.dtype)].append(array)
+            self.size += array.nbytes
+
+    def clear(self) -> None:
+        with self._lock:
+            self._free.clear()
+            self.size = 0
@@ -8,5 +8,17 @@ class ColorSpace(str, Enum):
     RGBA = "RGBA"
 
     BGR = "BGR"
+    BGRA = "BGRA"
 
+    @property
+    def channels(self) -> int:
+        return _CHANNELS[self]
 
+
+_CHANNELS = {
+    ColorSpace.GRAY: 1,
+    ColorSpace.RGB: 3,
+    ColorSpace.RGBA: 4,
+    ColorSpace.BGR: 3,
+    ColorSpace.BGRA: 4,
+}
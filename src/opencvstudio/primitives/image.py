@@ -3,33 +3,77 @@ from typing import Tuple
 
 import numpy
 from opencvstudio.dataops import convert_color
+from opencvstudio.primitives import Box, Size
 from opencvstudio.primitives.color import ColorSpace
 
 
 class Image:
-    def __init__(self, image_data: numpy.ndarray, color: ColorSpace):
+    """
+    Image data with its color space.
+
+    An image owning its data is the only user of it, so operations may
+    overwrite the data instead of allocating a new array. Images not owning
+    their data, e.g. views or inputs, must not be modified.
+    """
+
+    #: whether the data may be modified in place
+    _owned = False
+
+    def __init__(self, image_data: numpy.ndarray, color: ColorSpace,
+                 owned: bool = False):
         self._data = image_data
         self._color = color
+        self._owned = owned
 
-    def replace_data(self, data: numpy.ndarray) -> "Image":
+    def replace_data(self, data: numpy.ndarray,
+                     owned: bool = False) -> "Image":
         """
         Replace data without changing color space.
         """
-        return Image(data, self._color)
+        return Image(data, self._color, owned)
 
-    def replace_color_data(self, data: numpy.ndarray,
-                           color: ColorSpace) -> "Image":
+    def replace_color_data(self, data: numpy.ndarray, color: ColorSpace,
+                           owned: bool = False) -> "Image":
         """
         Replace data and color space.
         """
-        return Image(data, color)
+        return Image(data, color, owned)
 
     @property
-    def size(self) -> Tuple[int, int]:
+    def owned(self) -> bool:
+        """
+        :return: whether the data is used only by this image and may be
+          modified in place
+        """
+        return self._owned
+
+    def shared(self) -> "Image":
+        """
+        :return: image with the same data, which must not be modified in
+          place, e.g. to keep it as result
+        """
+        return Image(self._data, self._color) if self._owned else self
+
+    @property
+    def size(self) -> Size:
         """
         :return: Size of image
         """
-        return self._data.shape
+        return Size(self._data.shape[1], self._data.shape[0])
+
+    @property
+    def box(self) -> Box:
+        """
+        :return: Box covering the whole image
+        """
+        return Box(0, 0, self._data.shape[1], self._data.shape[0])
+
+    @property
+    def spec(self) -> "ImageSpec":
+        """
+        :return: Size and color space of image
+        """
+        return ImageSpec(self.size, self._color)
 
     @property
     def data(self) -> numpy.ndarray:
@@ -45,16 +89,21 @@ class Image:
         """
         return self._color
 
+    def reduced(self, scale: float) -> Tuple["Image", float]:
+        """
+        :return: the image at a resolution of at least `scale`, which may be
+          cheaper to get than the full resolution, and its scale
+        """
+        return self, 1.0
+
     def convert_color(self, color: ColorSpace) -> "Image":
         if self._color != color:
-            return Image(
-                convert_color(self._data, self._color, ColorSpace.RGB),
-                ColorSpace.RGB)
+            return Image(convert_color(self._data, self._color, color), color)
         else:
             return self
 
 
 @dataclass(frozen=True)
 class ImageSpec:
-    size: Tuple[int, int]
+    size: Size
     color: ColorSpace
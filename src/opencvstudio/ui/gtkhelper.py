@@ -1,7 +1,9 @@
 from contextlib import contextmanager
 
-from gi.repository import GdkPixbuf
+import numpy
+from gi.repository import GLib, GdkPixbuf
 from gi.repository.Gtk import Dialog, ResponseType
+from opencvstudio.primitives.color import ColorSpace
 from opencvstudio.primitives.image import Image
 
 
@@ -13,6 +15,32 @@ def run_dialog(dialog: Dialog) -> ResponseType:
         dialog.destroy()
 
 
-def pixbuf_from_image(img: Image):
-    GdkPixbuf.Colorspace.RGB
-    return GdkPixbuf.Pixbuf.new_from_bytes(img.data)
+def display_data(img: Image) -> numpy.ndarray:
+    """
+    :return: 8-bit RGB or RGBA data of `img`. The data of `img` is returned
+      without copy if it has already this format.
+    """
+    if img.color == ColorSpace.BGRA:
+        img = img.convert_color(ColorSpace.RGBA)
+    elif img.color not in (ColorSpace.RGB, ColorSpace.RGBA):
+        img = img.convert_color(ColorSpace.RGB)
+
+    data = img.data
+    if data.dtype == numpy.uint16:
+        data = (data >> 8).astype(numpy.uint8)
+    elif data.dtype.kind == "f":
+        data = (numpy.clip(data, 0.0, 1.0) * 255).astype(numpy.uint8)
+    elif data.dtype != numpy.uint8:
+        raise ValueError(f"Unsupported image depth {data.dtype}")
+    return data
+
+
+def pixbuf_from_image(img: Image) -> GdkPixbuf.Pixbuf:
+    # views, e.g. crops, are gathered into C order, other data is not copied
+    data = numpy.ascontiguousarray(display_data(img))
+    height, width, channels = data.shape
+    # GLib.Bytes.new makes the only copy of C ordered data, so the pixbuf
+    # does not depend on `data` afterwards
+    return GdkPixbuf.Pixbuf.new_from_bytes(
+        GLib.Bytes.new(memoryview(data).cast("B")), GdkPixbuf.Colorspace.RGB,
+        channels == 4, 8, width, height, width * channels)
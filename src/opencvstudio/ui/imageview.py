@@ -1,8 +1,92 @@
-from gi.repository import Gtk
+from typing import Optional, Tuple
 
+from gi.repository import Gdk, GdkPixbuf, Gtk
+from opencvstudio.primitives import Box
 
-class ImageView(Gtk.Image):
+
+class ImageView(Gtk.DrawingArea):
+    """
+    Shows an image scaled by `zoom`.
+
+    Instead of the whole image, a preview of a region rendered at screen
+    resolution can be shown (see `set_preview`).
+    """
 
     def __init__(self, *args, **kwargs):
         super(ImageView, self).__init__(*args, **kwargs)
+        self.zoom = 1.0
+        self._image_size: Optional[Tuple[int, int]] = None
+        self._pixbuf: Optional[GdkPixbuf.Pixbuf] = None
+        # region of image shown by preview in image coordinates
+        self._region: Optional[Box] = None
+        self.connect("draw", self.on_draw)
+
+    @property
+    def is_preview(self) -> bool:
+        return self._region is not None
+
+    def set_from_pixbuf(self, pixbuf: GdkPixbuf.Pixbuf) -> None:
+        self._pixbuf = pixbuf
+        self._region = None
+        self.set_image_size(pixbuf.get_width(), pixbuf.get_height())
+
+    def set_preview(self, pixbuf: GdkPixbuf.Pixbuf, region: Box) -> None:
+        """
+        Show `pixbuf` at `region` of the image. `pixbuf` must be rendered
+        with `zoom` as scale.
+        """
+        self._pixbuf = pixbuf
+        self._region = region
+        self.queue_draw()
+
+    def clear(self) -> None:
+        self._pixbuf = None
+        self._region = None
+        self.set_image_size(None, None)
+
+    def set_image_size(self, width: Optional[int], height: Optional[int]):
+        self._image_size = None if width is None else (width, height)
+        self._update_size_request()
+        self.queue_draw()
+
+    def set_zoom(self, zoom: float) -> None:
+        self.zoom = zoom
+        self._update_size_request()
+        self.queue_draw()
+
+    def viewport(self) -> Optional[Box]:
+        """
+        :return: part of the view visible in the parent scrollable in view
+          coordinates, or `None` if not inside a scrollable
+        """
+        parent = self.get_parent()
+        if not isinstance(parent, Gtk.Scrollable):
+            return None
+
+        hadj = parent.get_hadjustment()
+        vadj = parent.get_vadjustment()
+        return Box(
+            int(hadj.get_value()), int(vadj.get_value()),
+            int(hadj.get_page_size()) + 1, int(vadj.get_page_size()) + 1)
+
+    def _update_size_request(self) -> None:
+        if self._image_size is None:
+            self.set_size_request(-1, -1)
+        else:
+            width, height = self._image_size
+            self.set_size_request(
+                round(width * self.zoom), round(height * self.zoom))
+
+    def on_draw(self, widget, cr) -> bool:
+        if self._pixbuf is None:
+            return False
 
+        if self._region is None:
+            cr.scale(self.zoom, self.zoom)
+            Gdk.cairo_set_source_pixbuf(cr, self._pixbuf, 0, 0)
+        else:
+            Gdk.cairo_set_source_pixbuf(
+                cr, self._pixbuf,
+                self._region.x * self.zoom, self._region.y * self.zoom)
+        cr.paint()
+        return False
@@ -1,14 +1,19 @@
-from gi.repository import GLib, GdkPixbuf, Gio, Gtk
+from functools import partial
+from typing import Optional, Tuple
+
+from gi.repository import GLib, Gio, Gtk
 
 
 # list of tuples for each software, containing the software name, initial release, and main programming languages used
-from opencvstudio.dataops import open_image
-from opencvstudio.engine import Engine
-from opencvstudio.ui.gtkhelper import run_dialog
+from opencvstudio.engine import Engine, Preview
+from opencvstudio.engine.pipeline import PipelineFormatError, load_pipeline, \
+    save_pipeline
+from opencvstudio.engine.worker import Cancelled, EngineWorker, Task
+from opencvstudio.loader import load_image
+from opencvstudio.ui.gtkhelper import pixbuf_from_image, run_dialog
 from opencvstudio.opmodel import OperationContext
 from opencvstudio.ops.box_ops import CropOp
 from opencvstudio.primitives import Box
-from opencvstudio.primitives.color import ColorSpace
 from opencvstudio.primitives.image import Image
 from opencvstudio.ui.imageview import ImageView
 from opencvstudio.ui.opstore import OpStore
@@ -17,6 +22,11 @@ from opencvstudio.version import PRODUCT_NAME
 
 class MainWindow(Gtk.ApplicationWindow):
 
+    #: inputs with more pixels are first shown as preview of the visible part
+    PREVIEW_PIXELS = 4 * 1024 * 1024
+
+    ZOOM_STEP = 1.5
+
     def __init__(self, application):
         super().__init__(title=PRODUCT_NAME, application=application)
         self.set_border_width(10)
@@ -42,6 +52,9 @@ class MainWindow(Gtk.ApplicationWindow):
 
         # Creating the ListStore model
         self.engine = Engine(OperationContext())
+        self.worker = EngineWorker(self.engine, GLib.idle_add)
+        self.worker.start()
+        self.connect("destroy", self.on_destroy)
         self.liststore = OpStore(self.engine)
 
         self.treeview = Gtk.TreeView.new_with_model(self.liststore)
@@ -53,6 +66,11 @@ class MainWindow(Gtk.ApplicationWindow):
         select = self.treeview.get_selection()
         select.connect("changed", self.on_selection_changed)
 
+        # image currently shown by view
+        self._displayed = None
+        # index of selected step, output is shown if `None`
+        self._selected: Optional[int] = None
+
         # Sidebar
         self.sidebar = Gtk.HPaned.new()
         self.sidebar.set_position(200)
@@ -70,6 +88,10 @@ class MainWindow(Gtk.ApplicationWindow):
         self.scrollable_view.set_vexpand(True)
         self.scrollable_view.set_hexpand(True)
         self.scrollable_view.add(self.view)
+        self.scrollable_view.get_hadjustment().connect(
+            "value-changed", self.on_view_scrolled)
+        self.scrollable_view.get_vadjustment().connect(
+            "value-changed", self.on_view_scrolled)
         self.sidebar.add2(self.scrollable_view)
 
         self.add(self.sidebar)
@@ -78,6 +100,8 @@ class MainWindow(Gtk.ApplicationWindow):
     def create_main_menu(self):
         menumodel = Gio.Menu()
         menumodel.append("Open image", "win.open-image")
+        menumodel.append("Open pipeline", "win.open-pipeline")
+        menumodel.append("Save pipeline", "win.save-pipeline")
         menumodel.append("About", "win.about")
         menumodel.append("Quit", "app.quit")
 
@@ -85,6 +109,12 @@ class MainWindow(Gtk.ApplicationWindow):
         submenu.append("Cut", "win.add-cut")
         menumodel.append_submenu("Operations", submenu)
 
+        submenu = Gio.Menu()
+        submenu.append("Zoom in", "win.zoom-in")
+        submenu.append("Zoom out", "win.zoom-out")
+        submenu.append("Original size", "win.zoom-reset")
+        menumodel.append_submenu("View", submenu)
+
         return menumodel
 
     def _init_actions(self):
@@ -97,9 +127,28 @@ class MainWindow(Gtk.ApplicationWindow):
         open_image_action.connect("activate", self.on_open_image)
         self.add_action(open_image_action)
 
+        open_pipeline_action = Gio.SimpleAction.new("open-pipeline", None)
+        open_pipeline_action.connect("activate", self.on_open_pipeline)
+        self.add_action(open_pipeline_action)
+
+        save_pipeline_action = Gio.SimpleAction.new("save-pipeline", None)
+        save_pipeline_action.connect("activate", self.on_save_pipeline)
+        self.add_action(save_pipeline_action)
+
+        for name, factor in (("zoom-in", self.ZOOM_STEP),
+                             ("zoom-out", 1 / self.ZOOM_STEP),
+                             ("zoom-reset", None)):
+            zoom_action = Gio.SimpleAction.new(name, None)
+            zoom_action.connect("activate", self.on_zoom, factor)
+            self.add_action(zoom_action)
+
+    def on_destroy(self, widget):
+        self.worker.close()
+
     def on_cut_op(self, a, b):
         print(f"on_cut_op({a}, {b})")
-        self.liststore.append(CropOp(Box(50, 50, 500, 500)))
+        with self.worker.modify():
+            self.liststore.append(CropOp(Box(50, 50, 500, 500)))
         self.update_image()
 
     def on_open_image(self, action, params):
@@ -115,37 +164,143 @@ class MainWindow(Gtk.ApplicationWindow):
 
         with run_dialog(dialog) as response:
             if response == Gtk.ResponseType.OK:
-                self.set_test_input(
-                    Image(open_image(dialog.get_filename()), ColorSpace.BGR))
+                self.set_test_input(load_image(dialog.get_filename()))
             elif response == Gtk.ResponseType.CANCEL:
                 print("Cancel clicked")
 
+    def on_open_pipeline(self, action, params):
+        dialog = Gtk.FileChooserDialog(
+            title="Choose pipeline", parent=self,
+            action=Gtk.FileChooserAction.OPEN)
+        dialog.add_buttons(
+            Gtk.STOCK_CANCEL,
+            Gtk.ResponseType.CANCEL,
+            Gtk.STOCK_OPEN,
+            Gtk.ResponseType.OK,
+        )
+
+        with run_dialog(dialog) as response:
+            if response == Gtk.ResponseType.OK:
+                try:
+                    operations = load_pipeline(dialog.get_filename())
+                except (OSError, PipelineFormatError) as e:
+                    print(f"Failed to load pipeline: {e}")
+                    return
+
+                with self.worker.modify():
+                    self.liststore.clear()
+                    for operation in operations:
+                        self.liststore.append(operation)
+                self.update_image()
+
+    def on_save_pipeline(self, action, params):
+        dialog = Gtk.FileChooserDialog(
+            title="Save pipeline", parent=self,
+            action=Gtk.FileChooserAction.SAVE)
+        dialog.add_buttons(
+            Gtk.STOCK_CANCEL,
+            Gtk.ResponseType.CANCEL,
+            Gtk.STOCK_SAVE,
+            Gtk.ResponseType.OK,
+        )
+        dialog.set_do_overwrite_confirmation(True)
+
+        with run_dialog(dialog) as response:
+            if response == Gtk.ResponseType.OK:
+                save_pipeline(dialog.get_filename(), self.engine.operations)
+
     def on_selection_changed(self, selection):
         model, treeiter = selection.get_selected()
         if treeiter is not None:
             print("You selected", model[treeiter][0])
+            self._selected = model.get_path(treeiter).get_indices()[0]
+        else:
+            self._selected = None
 
-        self.update_image(treeiter)
+        # results are read on the worker thread, which may reuse their
+        # buffers while updating (up to date steps are not executed again)
+        self.update_image()
 
     def set_test_input(self, image: Image):
         if image is not None:
-            self.engine.set_input(image)
+            with self.worker.modify() as engine:
+                engine.set_input(image)
+
+            self.update_image()
 
+    def on_zoom(self, action, params, factor):
+        self.view.set_zoom(1.0 if factor is None else self.view.zoom * factor)
+        if self.view.is_preview:
             self.update_image()
 
-    def update_image(self, selection=None):
-        self.engine.update()
+    def on_view_scrolled(self, adjustment):
+        if self.view.is_preview:
+            self.update_image()
 
-        if selection is None:
-            output = self.engine.output
+    def update_image(self):
+        """
+        Execute engine in background and show the result of the selected
+        step or the output.
+
+        For the output, large images are first shown as preview of the
+        visible part at screen resolution. For a selected step only the
+        steps up to it are executed.
+        """
+        selected = self._selected
+        if selected is not None:
+            self.worker.request(
+                Task(partial(self._update_job, selected),
+                     partial(self._show_result, selected)))
+            return
+
+        self.worker.request(
+            Task(partial(self._preview_job, self.view.viewport(),
+                         self.view.zoom),
+                 self.show_preview),
+            Task(partial(self._update_job, None),
+                 partial(self._show_result, None)))
+
+    def _preview_job(self, viewport: Optional[Box], zoom: float,
+                     engine: Engine, cancelled: Cancelled) \
+            -> Optional[Tuple[Box, Optional[Preview]]]:
+        """
+        :return: extent of output and preview of the visible part, or `None`
+          if no preview is needed
+        """
+        return engine.viewport_preview(viewport, zoom, self.PREVIEW_PIXELS)
+
+    @staticmethod
+    def _update_job(index: Optional[int], engine: Engine,
+                    cancelled: Cancelled) -> Optional[Image]:
+        if index is None:
+            engine.update(cancelled)
+            return engine.output
+
+        engine.update(cancelled, until=index + 1)
+        return engine.result(index)
+
+    def _show_result(self, index: Optional[int], img: Optional[Image]):
+        if index == self._selected:
+            self.show_image(img)
+
+    def show_preview(
+            self, result: Optional[Tuple[Box, Optional[Preview]]]) -> None:
+        if result is None or self._selected is not None:
+            return
+
+        extent, preview = result
+        self.view.set_image_size(extent.width, extent.height)
+        if preview is not None:
+            self._displayed = None
+            self.view.set_preview(
+                pixbuf_from_image(preview.image), preview.region)
+
+    def show_image(self, img: Image) -> None:
+        if img is self._displayed and not self.view.is_preview:
+            return
+
+        self._displayed = img
+        if img is not None:
+            self.view.set_from_pixbuf(pixbuf_from_image(img))
         else:
-            output = None
-
-        if output is not None:
-            img = output.convert_color(ColorSpace.RGB)
-            # TODO: new_from_data
-            bytes = GLib.Bytes.new(output.data.tobytes())
-            pixbuf = GdkPixbuf.Pixbuf.new_from_bytes(
-                bytes, GdkPixbuf.Colorspace.RGB, False, 8,
-                img.size[1], img.size[0], img.size[1] * 3)
-            self.view.set_from_pixbuf(pixbuf)
+            self.view.clear()
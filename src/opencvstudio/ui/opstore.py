@@ -1,21 +1,55 @@
-from typing import Tuple
+from typing import Iterable, Optional, Tuple
 
 from gi.repository import Gtk
 from opencvstudio.engine import Engine, OperationStep
+from opencvstudio.engine.graph import PipelineGraph, TreeItem
 from opencvstudio.opmodel import Operation, OperationContext
 
 
-class OpStore(Gtk.ListStore):  # TODO: use gtk.TreeModel
+class OpStore(Gtk.TreeStore):
+    """
+    Operations of the engine as top level rows.
+    """
+
     def __init__(self, engine: Engine):
         super().__init__(str)
         self._model = engine
 
     def append(self, operation: Operation) -> None:
         self._model.add_operation(operation)
-        super().append(self._data(self._model[-1]))
+        super().append(None, self._data(self._model[-1]))
+
+    def clear(self) -> None:
+        self._model.clear_operations()
+        super().clear()
 
     def changed(self, row: int) -> None:
+        self._model.invalidate(row)
         self[(row,)] = self._data(self._model[row])
 
     def _data(self, step: OperationStep) -> Tuple:
         return (str(step.operation),)
+
+
+class GraphStore(Gtk.TreeStore):
+    """
+    Read-only view of a pipeline graph: the nodes of `graph`, each below the
+    source of its first input.
+    """
+
+    def __init__(self, graph: PipelineGraph):
+        super().__init__(str)
+        self.graph = graph
+        self._append_items(None, graph.tree())
+
+    def _append_items(self, parent: Optional[Gtk.TreeIter],
+                      items: Iterable[TreeItem]) -> None:
+        for item in items:
+            node = self.graph[item.name]
+            sources = sorted(set(node.inputs.values())
+                             - {node.inputs[node.operation.inputs[0]]})
+            label = f"{item.name}: {node.operation}"
+            if sources:
+                label += f" (+ {', '.join(sources)})"
+            row = self.append(parent, (label,))
+            self._append_items(row, item.children)
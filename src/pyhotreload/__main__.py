@@ -4,16 +4,23 @@ import logging
 import os
 import runpy
 import sys
-from functools import lru_cache
+from collections import OrderedDict
 from pathlib import Path
 from threading import Condition, Lock, Thread
+from time import monotonic
 from types import ModuleType
-from typing import Callable, Generic, List, Optional, TypeVar
-
+from typing import Callable, Dict, Generic, List, Optional, TypeVar
+
+from pyhotreload.graph import ImportGraph
+from pyhotreload import timing
+from pyhotreload.index import ModuleIndex, is_user_file
+from pyhotreload.timing import ReloadHistory, ReloadStats, ReloadTiming
+from pyhotreload.watch import FilteredEventHandler, ModuleWatcher, \
+    PathFilter
 from pyhotreload.xreload import xreload
 from watchdog.observers import Observer
-from watchdog.events import EVENT_TYPE_DELETED, FileSystemEvent, \
-    FileSystemEventHandler
+from watchdog.events import EVENT_TYPE_DELETED, EVENT_TYPE_MOVED, \
+    FileSystemEvent, FileSystemEventHandler
 
 
 T = TypeVar("T")
@@ -22,91 +29,115 @@ Self = TypeVar("Self")
 logger = logging.getLogger("pyhotreload")
 
 
-def get_root_dirs(dirs):
-    dirs = [f"{Path(d).absolute().resolve()}/" for d in dirs]
-    dirs.sort(key=len)
-
-    result = []
-    for d in dirs:
-        x = True
-        for r in result:
-            if d.startswith(r):
-                x = False
-                break
-        if x:
-            result.append(d)
-    return result
-
-
 class BatchedQueue(Thread, Generic[T]):
-    def __init__(self, interval: float, function: Callable[[List[T]], None]):
+    """
+    Collects items and passes them in batches to `function`.
+
+    A batch is processed after no new item arrived for a quiet period. The
+    quiet period starts at `min_latency` and doubles up to `max_latency`
+    whenever the batch grew while waiting, so a single change is processed
+    quickly and a burst of changes is processed at once. Items are
+    processed once per batch in the order they were first added.
+    """
+
+    def __init__(self, function: Callable[[List[T]], None],
+                 min_latency: float = 0.05, max_latency: float = 1.0):
         super().__init__(daemon=True, name="pyhotreload.BatchedQueue")
-        self.interval = interval
         self.function = function
-
-        self.items = []
+        self.min_latency = min_latency
+        self.max_latency = max_latency
+
+        # metrics
+        #: number of added items including duplicates
+        self.received = 0
+        #: number of processed batches
+        self.batches = 0
+        #: number of items in the last batch
+        self.last_batch_size = 0
+        #: seconds from first item of the last batch until its processing
+        self.last_latency = 0.0
+        #: seconds spent in `function` for the last batch
+        self.last_duration = 0.0
+
+        self._items: "OrderedDict[T, None]" = OrderedDict()
+        self._first = 0.0
+        self._last = 0.0
         self._should_exit = False
         self.cond = Condition(Lock())
 
+    @property
+    def depth(self) -> int:
+        """
+        :return: number of distinct items waiting
+        """
+        with self.cond:
+            return len(self._items)
+
     def add_item(self, item: T) -> None:
         assert self.is_alive()
         with self.cond:
-            self.items.append(item)
-            self.cond.notify()
+            self._last = monotonic()
+            self.received += 1
+            if not self._items:
+                self._first = self._last
+                self.cond.notify()
+            self._items[item] = None
 
     def close(self) -> None:
         with self.cond:
             self._should_exit = True
-            if not self.items:
-                self.items = [None]
             self.cond.notify()
 
         self.join()
 
     def run(self) -> None:
-        logger.info(f"run batched queue")
         while True:
-            # wait for first item
             with self.cond:
-                while not self.items and not self._should_exit:
+                # wait for first item
+                while not self._items and not self._should_exit:
                     self.cond.wait()
 
-                logger.info(f"wake up {self.items}")
-
-            if self._should_exit:
-                return
-
-            # wait timeout and reset on new item
-            with self.cond:
-                last_items_len = 0
-                while last_items_len != len(self.items) \
-                        and not self._should_exit:
-                    last_items_len = len(self.items)
-                    logger.info(f"wait {self.items}({self.interval})")
-                    self.cond.wait(self.interval)
-                self.items, items = [], self.items
-
-            if self._should_exit:
-                return
-
-            logger.info(f"execute {items}")
-            self.function(items)
-
-
-@lru_cache(maxsize=64)
-def file_to_module(file: str) -> Optional[str]:
-    _getattr = getattr
-    for name, module in sys.modules.items():
-        if _getattr(module, "__file__", None) == file:
-            return name
-    raise ValueError()
+                # wait for a quiet period
+                quiet = self.min_latency
+                depth = len(self._items)
+                while not self._should_exit:
+                    remaining = self._last + quiet - monotonic()
+                    if remaining <= 0:
+                        break
+                    self.cond.wait(remaining)
+                    if len(self._items) > depth:
+                        depth = len(self._items)
+                        quiet = min(2 * quiet, self.max_latency)
+
+                if self._should_exit:
+                    return
+                items = list(self._items)
+                self._items.clear()
+                first = self._first
+
+            start = monotonic()
+            logger.debug(f"Process {len(items)} items after "
+                         f"{start - first:.3f} s")
+            try:
+                self.function(items)
+            finally:
+                self.batches += 1
+                self.last_batch_size = len(items)
+                self.last_latency = start - first
+                self.last_duration = monotonic() - start
 
 
 class ReloadProcessor:
     batched: BatchedQueue[Path]
 
-    def __init__(self):
-        self.batched = BatchedQueue(1.0, self.reload_files)
+    def __init__(self, include: Callable[[str], bool] = is_user_file,
+                 history: ReloadHistory = timing.history):
+        self.index = ModuleIndex()
+        self.graph = ImportGraph(include)
+        self.history = history
+        # time of first change event by file not reloaded yet
+        self._changed: Dict[Path, float] = {}
+        self.batched = BatchedQueue(self.reload_files)
         self.batched.start()
 
     def __enter__(self: Self) -> Self:
@@ -122,50 +153,113 @@ class ReloadProcessor:
         if event.is_directory:
             return
 
-        if os.path.splitext(event.src_path)[-1] != ".py":
+        if event.event_type == EVENT_TYPE_MOVED:
+            # editors saving by renaming a temporary file
+            path = event.dest_path
+        else:
+            path = event.src_path
+
+        if os.path.splitext(path)[-1] != ".py":
             # TODO: what's with binary modules (*.so, *.pyd, ...)?
             return
 
         if event.event_type == EVENT_TYPE_DELETED:
             return  # TODO
-        # TODO: moved
 
-        logger.info(f"Detected change: {event}")
-        self.batched.add_item(Path(event.src_path).absolute().resolve())
+        logger.debug(f"Detected change: {event}")
+        path = Path(path).absolute().resolve()
+        self._changed.setdefault(path, monotonic())
+        self.batched.add_item(path)
 
     def reload_files(self, files: List[Path]):
         try:
-            for file in frozenset(files):
-                try:
-                    module = file_to_module(str(file))
-                except ValueError:
+            self.index.refresh()
+            changed = {}
+            for file in files:
+                changed_at = self._changed.pop(file, None)
+                module = self.index.lookup(str(file))
+                if module is None:
                     logging.debug(f"No loaded module found for file {file}")
                     continue
+                changed[module] = changed_at
 
-                logger.info(f"Reloading module {module}")
-                xreload(sys.modules[module])
+            self.graph.update(self.index.files(), self.index.packages())
+            for module in self.graph.order(changed):
+                self.reload_module(module, changed[module])
         except:
             logger.error(f"Top level exception catched while reloading",
                          exc_info=True)
 
+    def reload_module(self, name: str,
+                      changed_at: Optional[float] = None) -> None:
+        """
+        Reload module `name` in place and update names bound by
+        ``from name import ...`` in modules importing it.
+
+        :param changed_at: `time.monotonic` of the change event
+        """
+        logger.info(f"Reloading module {name}")
+        module = sys.modules[name]
+        old = dict(module.__dict__)
+        reload_timing = ReloadTiming()
+        try:
+            xreload(module, reload_timing, self.index.source_stat(name))
+        finally:
+            latency = None if changed_at is None \
+                else monotonic() - changed_at
+            self.history.add(ReloadStats(name, latency, reload_timing))
+
+        file = self.index.file(name)
+        if file is not None:
+            self.graph.rescan(name, file, hasattr(module, "__path__"))
+
+        for dependent in sorted(self.graph.dependents(name)):
+            self._update_bindings(dependent, name, old)
+
+    def _update_bindings(self, dependent: str, name: str,
+                         old: Dict[str, object]) -> None:
+        dependent_ns = getattr(sys.modules.get(dependent), "__dict__", None)
+        if dependent_ns is None:
+            return
+
+        new = sys.modules[name].__dict__
+        for binding in self.graph.imports(dependent).bindings:
+            if binding.module != name or binding.name not in new:
+                continue
+
+            value = dependent_ns.get(binding.alias)
+            if binding.name in old and value is old[binding.name] \
+                    and value is not new[binding.name]:
+                logger.info(f"Update {dependent}.{binding.alias}")
+                dependent_ns[binding.alias] = new[binding.name]
+
 
 def main():
     logging.basicConfig(level=logging.INFO)
 
     parser = argparse.ArgumentParser()
     parser.add_argument('-m', action="store_true", default=False, dest="mod")
+    parser.add_argument('--include', action="append", default=[],
+                        metavar="GLOB",
+                        help="only reload modules with matching paths")
+    parser.add_argument('--exclude', action="append", default=[],
+                        metavar="GLOB",
+                        help="do not reload modules with matching paths")
     parser.add_argument('file_or_mod', default=None)
     parser.add_argument('args', nargs=argparse.REMAINDER)
     args = parser.parse_args()
 
-    processor = ReloadProcessor()
+    path_filter = PathFilter(args.include, args.exclude)
+    processor = ReloadProcessor(include=path_filter)
     observer = Observer()
-    for path in get_root_dirs(sys.path):
-        if os.path.isdir(path):
-            print(f"Observe: {path}")
-            observer.schedule(
-                processor, os.path.abspath(path), recursive=True)
+    watcher = ModuleWatcher(
+        observer, FilteredEventHandler(processor, path_filter), path_filter)
+    if not args.mod:
+        # the script is not imported yet
+        watcher.watch(os.path.dirname(os.path.realpath(args.file_or_mod)))
+    watcher.update()
     observer.start()
+    watcher.start()
 
     try:
         sys.argv = [sys.argv[0]] + args.args
@@ -175,6 +269,7 @@ def main():
             sys.argv[0] = args.file_or_mod
             runpy.run_path(args.file_or_mod)
     finally:
+        watcher.close()
         observer.stop()
         observer.join()
         processor.close()
@@ -0,0 +1,224 @@
+"""
+Benchmark of reloading synthetic packages.
+
+    python -m pyhotreload.benchmark --modules 50 --classes 10 --functions 20
+
+A package with the given number of modules is generated, each importing the
+previous one and defining classes with methods and functions. Measured are
+
+* `xreload` split into load, compile, exec and patch for unchanged modules,
+  changed functions and changed module level statements,
+* `_update_class` per class,
+* latency from writing a file until the running `ReloadProcessor` finished
+  reloading it.
+"""
+import argparse
+import importlib
+import os
+import statistics
+import sys
+import tempfile
+from pathlib import Path
+from threading import Event
+from time import monotonic, perf_counter
+from types import ModuleType
+from typing import Dict, Iterable, List, Sequence
+
+from pyhotreload.__main__ import ReloadProcessor
+from pyhotreload.timing import ReloadHistory, ReloadStats, ReloadTiming
+from pyhotreload.watch import FilteredEventHandler, ModuleWatcher, \
+    PathFilter
+from pyhotreload.xreload import _update_class, xreload
+from watchdog.observers import Observer
+
+
+PACKAGE = "pyhotreload_benchmark"
+
+
+def generate_module(index: int, classes: int, functions: int,
+                    function_value: int = 0, module_value: int = 0) -> str:
+    """
+    :param function_value: returned by the first function
+    :param module_value: assigned to a module level constant
+    :return: source of a module importing module `index - 1`
+    """
+    lines = []
+    if index > 0:
+        lines.append(f"from . import module{index - 1}")
+    lines.append(f"VALUE = {module_value}")
+    for c in range(classes):
+        lines += ["", "", f"class Class{c}:", f"    ATTRIBUTE = {c}"]
+        for f in range(functions):
+            lines += ["", f"    def method{f}(self, x):",
+                      f"        return x + {f}"]
+    lines += ["", "", "def function0(x):", f"    return x + {function_value}"]
+    for f in range(1, functions):
+        lines += ["", "", f"def function{f}(x):", f"    return x * {f}"]
+    return "\n".join(lines) + "\n"
+
+
+class SyntheticPackage:
+    """
+    Package of generated modules in `root`.
+    """
+
+    def __init__(self, root: Path, modules: int, classes: int,
+                 functions: int):
+        self.root = root
+        self.classes = classes
+        self.functions = functions
+        self.directory = root / PACKAGE
+        self.directory.mkdir()
+        (self.directory / "__init__.py").write_text("")
+        self.names = [f"{PACKAGE}.module{i}" for i in range(modules)]
+        for i in range(modules):
+            self.write(i)
+
+    def path(self, index: int) -> Path:
+        return self.directory / f"module{index}.py"
+
+    def write(self, index: int, function_value: int = 0,
+              module_value: int = 0) -> None:
+        self.path(index).write_text(generate_module(
+            index, self.classes, self.functions,
+            function_value, module_value))
+
+    def import_all(self) -> List[ModuleType]:
+        sys.path.insert(0, str(self.root))
+        importlib.invalidate_caches()
+        return [importlib.import_module(name) for name in self.names]
+
+    def unload(self) -> None:
+        for name in list(sys.modules):
+            if name == PACKAGE or name.startswith(f"{PACKAGE}."):
+                del sys.modules[name]
+        sys.path.remove(str(self.root))
+
+
+def measure_xreload(package: SyntheticPackage, modules: Sequence[ModuleType],
+                    function_value: int, module_value: int) \
+        -> List[ReloadTiming]:
+    timings = []
+    for i, module in enumerate(modules):
+        package.write(i, function_value, module_value)
+        timing = ReloadTiming()
+        xreload(module, timing)
+        timings.append(timing)
+    return timings
+
+
+def measure_update_class(package: SyntheticPackage,
+                         modules: Sequence[ModuleType]) -> List[float]:
+    times = []
+    for i, module in enumerate(modules):
+        namespace = {"__name__": module.__name__,
+                     "__package__": PACKAGE}
+        exec(compile(package.path(i).read_text(), str(package.path(i)),
+                     "exec"), namespace)
+        for c in range(package.classes):
+            name = f"Class{c}"
+            start = perf_counter()
+            _update_class(getattr(module, name), namespace[name])
+            times.append(perf_counter() - start)
+    return times
+
+
+def measure_latency(package: SyntheticPackage, count: int) -> List[float]:
+    """
+    :return: seconds from writing a file until the reload finished
+    """
+    history = ReloadHistory()
+    reloaded = Event()
+    latencies = []
+
+    def on_reload(stats: ReloadStats) -> None:
+        reloaded.set()
+
+    history.subscribe(on_reload)
+    path_filter = PathFilter()
+    observer = Observer()
+    with ReloadProcessor(path_filter, history) as processor:
+        watcher = ModuleWatcher(
+            observer, FilteredEventHandler(processor, path_filter),
+            path_filter)
+        watcher.update()
+        observer.start()
+        try:
+            for n in range(count):
+                reloaded.clear()
+                index = n % len(package.names)
+                start = monotonic()
+                package.write(index, function_value=1000 + n)
+                if not reloaded.wait(10):
+                    raise RuntimeError("No reload within 10 s")
+                latencies.append(monotonic() - start)
+        finally:
+            observer.stop()
+            observer.join()
+    return latencies
+
+
+def format_times(name: str, times: Iterable[float]) -> str:
+    times = sorted(times)
+    if not times:
+        return f"{name:<28} -"
+    return (f"{name:<28} mean {statistics.mean(times) * 1000:8.3f} ms, "
+            f"median {statistics.median(times) * 1000:8.3f} ms, "
+            f"max {times[-1] * 1000:8.3f} ms ({len(times)})")
+
+
+def format_timings(name: str, timings: List[ReloadTiming]) -> List[str]:
+    modes: Dict[str, int] = {}
+    for timing in timings:
+        modes[timing.mode] = modes.get(timing.mode, 0) + 1
+    lines = [f"{name}: " + ", ".join(
+        f"{count} {mode}" for mode, count in sorted(modes.items()))]
+    for phase in ("total", "load", "compile", "exec", "patch"):
+        lines.append("  " + format_times(
+            phase, (getattr(timing, phase) for timing in timings)))
+    return lines
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m pyhotreload.benchmark",
+        description="Measure reloading of a generated package")
+    parser.add_argument("--modules", type=int, default=20)
+    parser.add_argument("--classes", type=int, default=10)
+    parser.add_argument("--functions", type=int, default=10,
+                        help="functions per module and methods per class")
+    parser.add_argument("--events", type=int, default=10,
+                        help="file changes for the latency measurement")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as root:
+        package = SyntheticPackage(
+            Path(root), args.modules, args.classes, args.functions)
+        modules = package.import_all()
+        try:
+            # first reload executes the modules as no source is known yet
+            measure_xreload(package, modules, 0, 1)
+
+            lines = []
+            lines += format_timings("unchanged", measure_xreload(
+                package, modules, 0, 1))
+            lines += format_timings("changed function", measure_xreload(
+                package, modules, 1, 1))
+            lines += format_timings("changed module", measure_xreload(
+                package, modules, 1, 2))
+            lines.append(format_times(
+                "_update_class", measure_update_class(package, modules)))
+            if args.events > 0:
+                lines.append(format_times(
+                    "event to reload", measure_latency(package, args.events)))
+        finally:
+            package.unload()
+
+    print(f"{args.modules} modules, {args.classes} classes, "
+          f"{args.functions} functions (pid {os.getpid()})")
+    print("\n".join(lines))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
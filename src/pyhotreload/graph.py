@@ -0,0 +1,167 @@
+import ast
+import heapq
+import logging
+import tokenize
+from importlib.util import resolve_name
+from typing import Callable, Dict, FrozenSet, Iterable, Iterator, List, \
+    Mapping, NamedTuple, Optional, Set, Tuple
+
+
+logger = logging.getLogger("pyhotreload")
+
+
+class Binding(NamedTuple):
+    """
+    Name bound by ``from module import name as alias``
+    """
+    module: str
+    name: str
+    alias: str
+
+
+class Imports(NamedTuple):
+    #: absolute names of all imported modules
+    modules: FrozenSet[str]
+    #: names bound at module level by ``from ... import ...``
+    bindings: Tuple[Binding, ...]
+
+
+def scan_imports(source: str, name: str, is_package: bool) -> Imports:
+    """
+    Find imports in the source of module `name`.
+    """
+    tree = ast.parse(source)
+    package = name if is_package else name.rpartition(".")[0]
+
+    modules = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                modules.add(alias.name)
+        elif isinstance(node, ast.ImportFrom):
+            base = _resolve(node, package)
+            if base is not None:
+                modules.add(base)
+                modules.update(f"{base}.{alias.name}" for alias in node.names
+                               if alias.name != "*")
+
+    bindings = []
+    for node in _module_level(tree.body):
+        if isinstance(node, ast.ImportFrom):
+            base = _resolve(node, package)
+            if base is not None:
+                bindings.extend(
+                    Binding(base, alias.name, alias.asname or alias.name)
+                    for alias in node.names if alias.name != "*")
+
+    return Imports(frozenset(modules), tuple(bindings))
+
+
+def _resolve(node: ast.ImportFrom, package: str) -> Optional[str]:
+    try:
+        return resolve_name("." * node.level + (node.module or ""), package)
+    except (ImportError, ValueError):
+        return None
+
+
+def _module_level(body: List[ast.stmt]) -> Iterator[ast.stmt]:
+    for node in body:
+        yield node
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef,
+                             ast.ClassDef)):
+            continue
+
+        for attr in ("body", "orelse", "finalbody"):
+            yield from _module_level(getattr(node, attr, []))
+        for handler in getattr(node, "handlers", []):
+            yield from _module_level(handler.body)
+
+
+class ImportGraph:
+    """
+    Imports between loaded modules.
+
+    Modules are scanned once by parsing their source and again after they
+    were reloaded (see `rescan`).
+    """
+
+    def __init__(self, include: Callable[[str], bool] = lambda path: True):
+        self.include = include
+        self._imports: Dict[str, Imports] = {}
+        self._dependents: Dict[str, Set[str]] = {}
+
+    def update(self, files: Mapping[str, str],
+               packages: Iterable[str] = ()) -> None:
+        """
+        Scan modules not scanned yet and forget removed modules.
+
+        :param files: source file of each loaded module
+        :param packages: names of loaded modules which are packages
+        """
+        packages = frozenset(packages)
+        for name in self._imports.keys() - files.keys():
+            self._set(name, Imports(frozenset(), ()))
+            del self._imports[name]
+
+        for name in sorted(files.keys() - self._imports.keys()):
+            if self.include(files[name]):
+                self.rescan(name, files[name], name in packages)
+
+    def rescan(self, name: str, file: str, is_package: bool) -> None:
+        try:
+            with tokenize.open(file) as fp:
+                imports = scan_imports(fp.read(), name, is_package)
+        except (OSError, SyntaxError, ValueError) as e:
+            logger.debug(f"Can not scan imports of {name}: {e}")
+            imports = Imports(frozenset(), ())
+        self._set(name, imports)
+
+    def imports(self, name: str) -> Imports:
+        return self._imports.get(name, Imports(frozenset(), ()))
+
+    def dependents(self, name: str) -> FrozenSet[str]:
+        """
+        :return: names of scanned modules importing module `name`
+        """
+        return frozenset(self._dependents.get(name, ()))
+
+    def order(self, names: Iterable[str]) -> List[str]:
+        """
+        :return: `names` sorted so that modules come after the modules they
+          import. Ties and cycles are resolved by name.
+        """
+        names = set(names)
+        deps = {name: set(self.imports(name).modules & names - {name})
+                for name in names}
+        users = {name: set() for name in names}
+        for name, imported in deps.items():
+            for dep in imported:
+                users[dep].add(name)
+
+        result = []
+        ready = [name for name, imported in deps.items() if not imported]
+        heapq.heapify(ready)
+        while len(result) < len(names):
+            if not ready:
+                # cycle: continue with smallest remaining name
+                cycle = min(name for name in names if deps[name])
+                deps[cycle] = set()
+                ready.append(cycle)
+
+            name = heapq.heappop(ready)
+            result.append(name)
+            for user in sorted(users[name]):
+                if deps[user]:
+                    deps[user].discard(name)
+                    if not deps[user]:
+                        heapq.heappush(ready, user)
+        return result
+
+    def _set(self, name: str, imports: Imports) -> None:
+        old = self._imports.get(name)
+        if old is not None:
+            for dep in old.modules:
+                self._dependents.get(dep, set()).discard(name)
+        self._imports[name] = imports
+        for dep in imports.modules:
+            self._dependents.setdefault(dep, set()).add(name)
@@ -0,0 +1,135 @@
+import os
+import sys
+import sysconfig
+import time
+from functools import lru_cache
+from types import ModuleType
+from typing import Dict, Iterator, MutableMapping, Optional, Tuple
+
+
+@lru_cache(maxsize=None)
+def library_dirs() -> Tuple[str, ...]:
+    """
+    :return: directories of the standard library and installed packages
+    """
+    paths = sysconfig.get_paths()
+    dirs = {os.path.realpath(paths[key]) + os.sep
+            for key in ("stdlib", "platstdlib", "purelib", "platlib")
+            if key in paths}
+    return tuple(sorted(dirs))
+
+
+def is_user_file(path: str) -> bool:
+    """
+    :return: whether `path` is not part of the standard library or an
+      installed package
+    """
+    return not path.startswith(library_dirs())
+
+
+def file_stat(path: str) -> Optional[Tuple[int, int]]:
+    """
+    :return: modification time in nanoseconds and size of `path`
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+class ModuleIndex:
+    """
+    Maps source files to the names of loaded modules.
+
+    The index is updated by `refresh` from the difference between
+    `sys.modules` and its state at the last refresh, so lookups do not scan
+    all modules.
+
+    For each module the state of its file when it was added is kept (see
+    `source_stat`), which tells whether the file changed since the module
+    was loaded.
+    """
+
+    def __init__(self, modules: Optional[MutableMapping[str, ModuleType]]
+                 = None):
+        self._modules = sys.modules if modules is None else modules
+        self._files: Dict[str, str] = {}
+        self._entries: Dict[str, Tuple[ModuleType, Optional[str]]] = {}
+        self._stats: Dict[str, Tuple[int, int]] = {}
+        # time.time_ns() of the last refresh
+        self._refreshed: Optional[int] = None
+
+    def __len__(self) -> int:
+        return len(self._files)
+
+    def lookup(self, file: str) -> Optional[str]:
+        """
+        :param file: absolute path without symbolic links
+        :return: name of module loaded from `file` or `None`
+        """
+        return self._files.get(file)
+
+    def file(self, name: str) -> Optional[str]:
+        """
+        :return: source file of loaded module `name`
+        """
+        entry = self._entries.get(name)
+        return None if entry is None else entry[1]
+
+    def files(self) -> Dict[str, str]:
+        """
+        :return: source file of each loaded module with a file
+        """
+        return {name: path for name, (_, path) in self._entries.items()
+                if path is not None}
+
+    def source_stat(self, name: str) -> Optional[Tuple[int, int]]:
+        """
+        :return: modification time in nanoseconds and size of the file of
+          module `name` when it was loaded, `None` if unknown, e.g. because
+          the file changed after the previous refresh
+        """
+        return self._stats.get(name)
+
+    def packages(self) -> Iterator[str]:
+        """
+        :return: names of loaded packages
+        """
+        return (name for name, (module, _) in self._entries.items()
+                if hasattr(module, "__path__"))
+
+    def refresh(self) -> None:
+        modules = self._modules
+        entries = self._entries
+        now = time.time_ns()
+        # new modules were loaded after the previous refresh, files not
+        # modified since then are unchanged. Modules found by the first
+        # refresh are assumed to be unchanged.
+        loaded_after = now if self._refreshed is None else self._refreshed
+
+        for name, (module, _) in list(entries.items()):
+            if modules.get(name) is not module:
+                self._remove(name)
+
+        for name in modules.keys() - entries.keys():
+            module = modules.get(name)
+            if module is not None:
+                self._add(name, module, loaded_after)
+        self._refreshed = now
+
+    def _add(self, name: str, module: ModuleType, loaded_after: int) -> None:
+        file = getattr(module, "__file__", None)
+        path = os.path.realpath(file) if isinstance(file, str) else None
+        self._entries[name] = (module, path)
+        if path is not None:
+            self._files[path] = name
+            stat = file_stat(path)
+            if stat is not None and stat[0] <= loaded_after:
+                self._stats[name] = stat
+
+    def _remove(self, name: str) -> None:
+        self._stats.pop(name, None)
+        _, path = self._entries.pop(name)
+        if path is not None and self._files.get(path) == name:
+            del self._files[path]
@@ -0,0 +1,86 @@
+"""
+Timing of reloads.
+
+A running application can query the recent reloads done by pyhotreload or
+subscribe to them::
+
+    from pyhotreload.timing import history
+
+    history.subscribe(lambda stats: print(stats.module, stats.latency))
+"""
+from collections import deque
+from dataclasses import dataclass
+from threading import Lock
+from typing import Callable, Deque, List, NamedTuple, Optional
+
+
+@dataclass
+class ReloadTiming:
+    """
+    Seconds spent in the phases of `xreload`.
+    """
+    #: how the module was reloaded: "skipped", "definitions" (only changed
+    #: definitions executed), "module" (whole module executed), "reload"
+    #: (importlib.reload) or "namespace" (nothing to execute)
+    mode: str = ""
+    #: finding, reading and parsing the source
+    load: float = 0.0
+    compile: float = 0.0
+    exec: float = 0.0
+    #: patching old classes and functions
+    patch: float = 0.0
+
+    @property
+    def total(self) -> float:
+        return self.load + self.compile + self.exec + self.patch
+
+
+class ReloadStats(NamedTuple):
+    module: str
+    #: seconds from the first change event of the file until the module
+    #: was reloaded, or `None` if not known
+    latency: Optional[float]
+    timing: ReloadTiming
+
+
+class ReloadHistory:
+    """
+    The last `size` reloads.
+    """
+
+    def __init__(self, size: int = 1000):
+        self._items: Deque[ReloadStats] = deque(maxlen=size)
+        self._listeners: List[Callable[[ReloadStats], None]] = []
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def items(self) -> List[ReloadStats]:
+        """
+        :return: reloads, oldest first
+        """
+        with self._lock:
+            return list(self._items)
+
+    def subscribe(self, listener: Callable[[ReloadStats], None]) -> None:
+        """
+        Call `listener` after each reload in the thread doing the reload.
+        """
+        with self._lock:
+            self._listeners.append(listener)
+
+    def unsubscribe(self, listener: Callable[[ReloadStats], None]) -> None:
+        with self._lock:
+            self._listeners.remove(listener)
+
+    def add(self, stats: ReloadStats) -> None:
+        with self._lock:
+            self._items.append(stats)
+            listeners = list(self._listeners)
+        for listener in listeners:
+            listener(stats)
+
+
+#: reloads done by `ReloadProcessor`
+history = ReloadHistory()
@@ -0,0 +1,131 @@
+"""
+Watching of the directories of loaded user modules.
+
+Instead of watching every entry of `sys.path` recursively, only directories
+containing loaded modules are watched. Directories of modules imported later
+are added by `ModuleWatcher`, which polls the loaded modules.
+"""
+import logging
+import os
+from fnmatch import fnmatch
+from threading import Event, Thread
+from typing import Callable, Iterable, Optional, Set
+
+from pyhotreload.index import ModuleIndex, is_user_file
+from watchdog.events import EVENT_TYPE_CREATED, EVENT_TYPE_DELETED, \
+    EVENT_TYPE_MODIFIED, EVENT_TYPE_MOVED, FileSystemEvent, \
+    FileSystemEventHandler
+
+
+logger = logging.getLogger("pyhotreload")
+
+#: patterns of paths never passed to the reload processor
+IGNORED = (
+    "*.pyc",
+    f"*{os.sep}__pycache__{os.sep}*",
+    f"*{os.sep}.git{os.sep}*",
+)
+
+#: event types passed to the reload processor, i.e. not opening or closing
+CHANGE_EVENT_TYPES = frozenset((
+    EVENT_TYPE_CREATED, EVENT_TYPE_DELETED, EVENT_TYPE_MODIFIED,
+    EVENT_TYPE_MOVED,
+))
+
+
+class PathFilter:
+    """
+    Accepts user files matching one of `include` (if given) and none of
+    `exclude` or `IGNORED`.
+    """
+
+    def __init__(self, include: Iterable[str] = (),
+                 exclude: Iterable[str] = (),
+                 accept: Callable[[str], bool] = is_user_file):
+        self.include = tuple(include)
+        self.exclude = tuple(exclude) + IGNORED
+        self.accept = accept
+
+    def __call__(self, path: str) -> bool:
+        if self.include and not any(
+                fnmatch(path, pattern) for pattern in self.include):
+            return False
+        if any(fnmatch(path, pattern) for pattern in self.exclude):
+            return False
+        return self.accept(path)
+
+
+class FilteredEventHandler(FileSystemEventHandler):
+    """
+    Passes file change events with a path accepted by `path_filter` to
+    `handler`.
+    """
+
+    def __init__(self, handler, path_filter: Callable[[str], bool]):
+        super().__init__()
+        self.handler = handler
+        self.path_filter = path_filter
+
+    def dispatch(self, event: FileSystemEvent) -> None:
+        if event.is_directory or event.event_type not in CHANGE_EVENT_TYPES:
+            return
+
+        paths = (event.src_path, getattr(event, "dest_path", ""))
+        if any(path and self.path_filter(os.fsdecode(path))
+               for path in paths):
+            self.handler.dispatch(event)
+
+
+class ModuleWatcher(Thread):
+    """
+    Schedules non-recursive watches of directories containing loaded
+    modules accepted by `path_filter` and adds directories of newly imported
+    modules every `interval` seconds.
+    """
+
+    def __init__(self, observer, handler,
+                 path_filter: Callable[[str], bool] = PathFilter(),
+                 interval: float = 1.0,
+                 index: Optional[ModuleIndex] = None):
+        super().__init__(daemon=True, name="pyhotreload.ModuleWatcher")
+        self.observer = observer
+        self.handler = handler
+        self.path_filter = path_filter
+        self.interval = interval
+        self.index = ModuleIndex() if index is None else index
+        self.directories: Set[str] = set()
+        self._closed = Event()
+
+    def update(self) -> None:
+        """
+        Watch directories of modules imported since the last update.
+        """
+        self.index.refresh()
+        directories = {
+            os.path.dirname(file) for file in self.index.files().values()
+            if self.path_filter(file)
+        }
+        for directory in sorted(directories - self.directories):
+            self.watch(directory)
+
+    def watch(self, directory: str) -> None:
+        if directory in self.directories:
+            return
+
+        if os.path.isdir(directory):
+            logger.info(f"Observe: {directory}")
+            self.observer.schedule(self.handler, directory, recursive=False)
+        self.directories.add(directory)
+
+    def close(self) -> None:
+        self._closed.set()
+        if self.is_alive():
+            self.join()
+
+    def run(self) -> None:
+        while not self._closed.wait(self.interval):
+            try:
+                self.update()
+            except Exception:
+                logger.error("Failed to update watched directories",
+                             exc_info=True)
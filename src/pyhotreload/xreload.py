@@ -28,17 +28,29 @@ Some of the many limitiations include:
   reloading foo deletes foo.bar, the dependent module continues to use
   the old foo.bar object rather than failing
 
-- Frozen modules and modules loaded from zip files aren't handled
-  correctly
+- Frozen, builtin and extension modules are reloaded by
+  importlib.reload(); namespace packages have no code and are left alone
 
 - Classes involving __slots__ are not handled correctly
+
+Modules whose source did not change since the last reload are skipped. If
+only functions and classes changed, only their definitions are executed
+again instead of the whole module (see `_changed_definitions`).
 """
-import imp
+import ast
 import importlib
+import importlib.util
 import logging
-import pkgutil
-import sys
-from types import FunctionType, MethodType
+import marshal
+import os
+from collections import OrderedDict
+from hashlib import blake2b
+from time import perf_counter
+from types import CodeType, FunctionType, MethodType
+from typing import Dict, FrozenSet, List, NamedTuple, Optional, Set, Tuple
+
+from pyhotreload.index import file_stat
+from pyhotreload.timing import ReloadTiming
 
 # TODO:
 #  * Enums
@@ -54,6 +66,36 @@ from types import FunctionType, MethodType
 
 logger = logging.getLogger("pyhotreload")
 
+#: maximum number of compiled sources kept in `_sources`
+SOURCE_CACHE_SIZE = 64
+
+
+class _Source:
+    """
+    Parsed module source. The code object is set on first execution.
+    """
+
+    def __init__(self, digest: bytes, text: str, filename: str):
+        self.digest = digest
+        self.text = text
+        self.tree = ast.parse(text, filename)
+        self.filename = filename
+        self.code: Optional[CodeType] = None
+        self._layout: Optional[_Layout] = None
+
+    @property
+    def layout(self) -> "_Layout":
+        if self._layout is None:
+            self._layout = _split_module(
+                self.tree, self.text.splitlines(True))
+        return self._layout
+
+
+# sources by file name and digest, least recently used first
+_sources: "OrderedDict[Tuple[str, bytes], _Source]" = OrderedDict()
+# source last executed by module name
+_executed: Dict[str, _Source] = {}
+
 
 def _closure_changed(oldcl, newcl):
     old = oldcl is None and -1 or len(oldcl)
@@ -68,51 +110,88 @@ def _closure_changed(oldcl, newcl):
     return False
 
 
-def xreload(mod):
+def xreload(mod, timing: Optional[ReloadTiming] = None,
+            loaded: Optional[Tuple[int, int]] = None):
     """Reload a module in place, updating classes, methods and functions.
 
     Args:
       mod: a module object
+      timing: if given, filled with the time spent in each phase
+      loaded: modification time in nanoseconds and size of the source file
+        when `mod` was loaded (see `ModuleIndex.source_stat`). Without it
+        the first reload always executes the module.
 
     Returns:
       The (updated) input object itself.
     """
-    # Get the module name, e.g. 'foo.bar.whatever'
-    modname = mod.__name__
+    if timing is None:
+        timing = ReloadTiming()
+    start = perf_counter()
+
     # Get the module namespace (dict) early; this is part of the type check
     modns = mod.__dict__
-    # Parse it into package name and module name, e.g. 'foo.bar' and 'whatever'
-    i = modname.rfind(".")
-    if i >= 0:
-        pkgname, modname = modname[:i], modname[i+1:]
-    else:
-        pkgname = None
-
-    # Compute the search path
-    if pkgname:
-        # We're not reloading the package, only the module in it
-        path = sys.modules[pkgname].__path__  # Search inside the package
-    else:
-        # Search the top-level module path
-        path = None  # Make find_module() uses the default search path
 
-    # Find the module; may raise ImportError
-    # TODO: port to new import logic using importlib.util.find_spec and loader
-    (stream, filename, (suffix, mode, kind)) = imp.find_module(modname, path)
-    # Turn it into a code object
-    try:
-        # Is it Python source code or byte code read from a file?
-        if kind not in (imp.PY_COMPILED, imp.PY_SOURCE):
-            # Fall back to built-in reload()
+    # Find the loader; may raise ImportError
+    spec = _find_spec(mod)
+    if spec.origin is None and spec.submodule_search_locations is not None:
+        # Namespace package: nothing to execute, __path__ is dynamic
+        timing.mode = "namespace"
+        return mod
+    loader = spec.loader
+    if not hasattr(loader, "get_source") or not hasattr(loader, "get_code"):
+        # Fall back to built-in reload()
+        timing.mode = "reload"
+        timing.exec = perf_counter() - start
+        return importlib.reload(mod)
+
+    if hasattr(loader, "invalidate_caches"):
+        # zipimporter caches the table of contents of the archive
+        loader.invalidate_caches()
+    stat = file_stat(spec.origin) if spec.cached else None
+    text = loader.get_source(spec.name)
+    if stat is not None and file_stat(spec.origin) != stat:
+        # changed while reading
+        stat = None
+    if text is None:
+        # Byte code without source or an extension module
+        code = loader.get_code(spec.name)
+        if code is None:
+            timing.mode = "reload"
+            timing.exec = perf_counter() - start
             return importlib.reload(mod)
-        if kind == imp.PY_SOURCE:
-            source = stream.read()
-            code = compile(source, filename, "exec")
+        source = None
+        timing.load = perf_counter() - start
+    else:
+        source = _parse(text, spec.origin)
+        timing.load = perf_counter() - start
+        executed = _executed.get(mod.__name__)
+        if executed is None:
+            # first reload: compare with the source the module was loaded
+            # from, or with bytecode compiled from it, e.g. on import
+            unchanged = loaded is not None and loaded == stat
+            if not unchanged and loaded is not None and spec.cached:
+                cached = _read_bytecode(spec.cached, loaded)
+                unchanged = cached is not None and \
+                    _code(source, spec.cached, stat, timing) == cached
+            timing.load = perf_counter() - start - timing.compile
+            if unchanged:
+                logger.info(f"Skip unchanged module {mod.__name__}")
+                timing.mode = "skipped"
+                _executed[mod.__name__] = source
+                return mod
+        elif executed.digest == source.digest:
+            logger.info(f"Skip unchanged module {mod.__name__}")
+            timing.mode = "skipped"
+            return mod
         else:
-            code = pkgutil.read_code(stream)
-    finally:
-        if stream:
-            stream.close()
+            changes = _changed_definitions(executed, source)
+            timing.load = perf_counter() - start
+            if changes is not None:
+                _reload_definitions(mod, source, *changes, timing)
+                _executed[mod.__name__] = source
+                return mod
+        code = _code(source, spec.cached, stat, timing)
+    timing.mode = "module"
 
     # Execute the code.  We copy the module dict to a temporary; then
     # clear the module dict; then execute the new code in the module
@@ -123,23 +202,224 @@ def xreload(mod):
     tmpns = modns.copy()
     modns.clear()
     modns["__name__"] = tmpns["__name__"]
-    for attr in ("__file__", "__path__", "__spec__", "__package__"):
+    for attr in ("__file__", "__path__", "__spec__", "__package__",
+                 "__loader__", "__cached__"):
         if attr in tmpns:
             modns[attr] = tmpns[attr]
 
+    start = perf_counter()
     exec(code, modns)
+    if source is not None:
+        _executed[mod.__name__] = source
+    timing.exec = perf_counter() - start
 
     # Now we get to the hard part
     oldnames = set(tmpns)
     newnames = set(modns)
 
     # Update attributes in place
+    start = perf_counter()
     for name in oldnames & newnames:
         _update(tmpns[name], modns[name])
+    timing.patch = perf_counter() - start
 
     return mod
 
 
+def _find_spec(mod):
+    spec = getattr(mod, "__spec__", None)
+    if spec is None:
+        # e.g. __main__ of a script
+        filename = getattr(mod, "__file__", None)
+        if filename is not None:
+            spec = importlib.util.spec_from_file_location(
+                mod.__name__, filename)
+    if spec is None or spec.loader is None and spec.origin is not None:
+        raise ImportError(f"No loader for module {mod.__name__}",
+                          name=mod.__name__)
+    return spec
+
+
+def _code(source: _Source, cached: Optional[str],
+          stat: Optional[Tuple[int, int]],
+          timing: ReloadTiming) -> CodeType:
+    """
+    :param cached: bytecode cache file of the module
+    :param stat: modification time and size of the source file when
+      `source` was read
+    :return: code object of `source`, taken from `cached` if it was
+      compiled from the same source
+    """
+    if source.code is None:
+        start = perf_counter()
+        # not loader.get_code(), which reads the file again: it may have
+        # changed since and would not match the digest of `source`
+        code = None if cached is None \
+            else _read_bytecode(cached, stat, source.text)
+        source.code = code or compile(source.tree, source.filename, "exec")
+        timing.compile = perf_counter() - start
+    return source.code
+
+
+def _read_bytecode(cached: str, stat: Optional[Tuple[int, int]],
+                   text: Optional[str] = None) -> Optional[CodeType]:
+    """
+    Check the header of bytecode cache file `cached` like the import
+    system, but against a known state of the source.
+
+    :param stat: modification time and size of the source
+    :param text: the source, to check hash based bytecode
+    :return: code object if `cached` was compiled from that source
+    """
+    try:
+        with open(cached, "rb") as stream:
+            written = os.fstat(stream.fileno()).st_mtime_ns
+            data = stream.read()
+    except OSError:
+        return None
+    if len(data) < 16 or data[:4] != importlib.util.MAGIC_NUMBER:
+        return None
+
+    flags = int.from_bytes(data[4:8], "little")
+    if flags & 0b1:
+        if text is None or data[8:16] != importlib.util.source_hash(
+                text.encode("utf-8")):
+            return None
+    else:
+        if stat is None:
+            return None
+        mtime, size = stat
+        seconds = mtime // 1_000_000_000
+        if data[8:16] != _pack_uint32(seconds) + _pack_uint32(size):
+            return None
+        # the header has whole seconds: a source written in the same
+        # second as the bytecode may have changed after compilation
+        if written < (seconds + 1) * 1_000_000_000:
+            return None
+
+    try:
+        code = marshal.loads(data[16:])
+    except (EOFError, TypeError, ValueError):
+        return None
+    return code if isinstance(code, CodeType) else None
+
+
+def _pack_uint32(value: int) -> bytes:
+    return (value & 0xFFFFFFFF).to_bytes(4, "little")
+
+
+def _parse(text: str, filename: str) -> _Source:
+    digest = blake2b(text.encode("utf-8"), digest_size=16).digest()
+    key = (filename, digest)
+    source = _sources.get(key)
+    if source is None:
+        source = _Source(digest, text, filename)
+        _sources[key] = source
+        if len(_sources) > SOURCE_CACHE_SIZE:
+            _sources.popitem(last=False)
+    else:
+        _sources.move_to_end(key)
+    return source
+
+
+_DEFINITION_TYPES = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+
+
+def _changed_definitions(old: _Source, new: _Source) \
+        -> Optional[Tuple[List[ast.stmt], Set[str]]]:
+    """
+    Compare the top level statements of two versions of a module by their
+    source text.
+
+    Definitions are compared including their position, so that the line
+    numbers of the patched code stay correct.
+
+    :return: new or changed definitions and names of removed definitions,
+      or `None` if the module has to be executed again. This is the case,
+      if other statements changed, if a name is defined twice or if other
+      statements refer to a changed definition.
+    """
+    old_layout = old.layout
+    new_layout = new.layout
+    if old_layout.definitions is None or new_layout.definitions is None \
+            or old_layout.other != new_layout.other:
+        return None
+
+    old_definitions = old_layout.definitions
+    changed = [
+        node for name, (segment, node) in new_layout.definitions.items()
+        if name not in old_definitions or old_definitions[name][0] != segment
+    ]
+    removed = old_definitions.keys() - new_layout.definitions.keys()
+
+    if new_layout.used & ({node.name for node in changed} | removed):
+        return None
+    return changed, removed
+
+
+class _Layout(NamedTuple):
+    #: top level definitions by name with first line and source text, or
+    #: `None` if a name is defined twice
+    definitions: Optional[Dict[str, Tuple[Tuple[int, str], ast.stmt]]]
+    #: source text of other top level statements
+    other: Tuple[str, ...]
+    #: names used by other top level statements
+    used: FrozenSet[str]
+
+
+def _split_module(tree: ast.Module, lines: List[str]) -> _Layout:
+    body = tree.body
+    starts = [min([stmt.lineno] + [
+        decorator.lineno for decorator in getattr(stmt, "decorator_list", ())
+    ]) for stmt in body]
+    starts.append(len(lines) + 1)
+
+    definitions = {}
+    other = []
+    used = set()
+    for stmt, start, end in zip(body, starts, starts[1:]):
+        text = "".join(lines[start - 1:end - 1])
+        if not isinstance(stmt, _DEFINITION_TYPES):
+            other.append(text)
+            used.update(node.id for node in ast.walk(stmt)
+                        if isinstance(node, ast.Name))
+        elif definitions is not None:
+            if stmt.name in definitions:
+                definitions = None
+            else:
+                definitions[stmt.name] = ((start, text), stmt)
+    return _Layout(definitions, tuple(other), frozenset(used))
+
+
+def _reload_definitions(mod, source: _Source, changed: List[ast.stmt],
+                        removed: Set[str], timing: ReloadTiming) -> None:
+    """
+    Execute only `changed` definitions of `source` in the namespace of `mod`
+    and patch the previous objects.
+    """
+    timing.mode = "definitions"
+    modns = mod.__dict__
+    old = {node.name: modns[node.name] for node in changed
+           if node.name in modns}
+    for name in removed:
+        modns.pop(name, None)
+
+    if changed:
+        start = perf_counter()
+        code = compile(ast.Module(body=changed, type_ignores=[]),
+                       source.filename, "exec")
+        timing.compile = perf_counter() - start
+
+        start = perf_counter()
+        exec(code, modns)
+        timing.exec = perf_counter() - start
+
+    start = perf_counter()
+    for name, oldobj in old.items():
+        _update(oldobj, modns[name])
+    timing.patch = perf_counter() - start
+
+
 def _update(oldobj, newobj):
     """Update oldobj, if possible in place, with newobj.
 
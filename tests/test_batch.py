@@ -0,0 +1,90 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy
+
+from opencvstudio.batch import iter_inputs, main
+from opencvstudio.engine.parallel import imap_bounded
+from opencvstudio.engine.pipeline import save_pipeline
+from opencvstudio.ops.box_ops import CropOp
+from opencvstudio.ops.color_ops import ChangeColorSpaceOp
+from opencvstudio.primitives import Box
+from opencvstudio.primitives.color import ColorSpace
+
+
+def test_imap_bounded_limits_pending_calls():
+    consumed = []
+
+    def source():
+        for i in range(10):
+            consumed.append(i)
+            yield i
+
+    with ThreadPoolExecutor(2) as executor:
+        results = imap_bounded(executor, lambda x: x * 2, source(),
+                               max_pending=3)
+        assert next(results) == 0
+        assert len(consumed) == 4
+        assert list(results) == [2 * i for i in range(1, 10)]
+
+
+def test_batch_processes_directory(tmpdir):
+    root = tmpdir.mkdir("in")
+    root.mkdir("sub")
+    for name in ("a.png", "b.png", "sub/c.png"):
+        cv2.imwrite(str(root / name), numpy.zeros((20, 30, 3), numpy.uint8))
+    (root / "notes.txt").write_text("", encoding="utf-8")
+
+    pipeline = tmpdir / "pipeline.json"
+    save_pipeline(str(pipeline), [ChangeColorSpaceOp(ColorSpace.GRAY)])
+
+    assert [str(rel) for _, rel in iter_inputs([str(root)], True)] == \
+        ["a.png", "b.png", "sub/c.png"]
+
+    out = tmpdir / "out"
+    assert main([str(pipeline), str(root), "-r", "-j", "1",
+                 "-o", str(out), "-f", "bmp"]) == 0
+    assert cv2.imread(str(out / "sub" / "c.bmp"), -1).shape == (20, 30)
+
+
+def test_batch_keeps_glob_paths_apart(tmpdir):
+    root = tmpdir.mkdir("in")
+    root.mkdir("a")
+    root.mkdir("b")
+    for name in ("a/x.png", "b/x.png", "b/x.jpg"):
+        cv2.imwrite(str(root / name), numpy.zeros((20, 30, 3), numpy.uint8))
+
+    pipeline = tmpdir / "pipeline.json"
+    save_pipeline(str(pipeline), [ChangeColorSpaceOp(ColorSpace.GRAY)])
+
+    pattern = str(root / "*" / "*.png")
+    assert [str(rel) for _, rel in iter_inputs([pattern])] == \
+        ["a/x.png", "b/x.png"]
+
+    out = tmpdir / "out"
+    assert main([str(pipeline), pattern, "-j", "1", "-o", str(out)]) == 0
+    assert (out / "a" / "x.png").exists() and (out / "b" / "x.png").exists()
+
+    # outputs would be saved as x.png.json and x.jpg.json
+    assert main([str(pipeline), str(root / "b"), "-j", "1",
+                 "-o", str(out)]) == 0
+
+    # x.png and x.jpg both map to x.bmp, only the first one is written
+    assert main([str(pipeline), str(root / "b"), "-j", "1",
+                 "-o", str(out), "-f", "bmp"]) == 1
+    assert (out / "x.bmp").exists()
+
+
+def test_batch_check_reads_headers(tmpdir, monkeypatch):
+    root = tmpdir.mkdir("in")
+    cv2.imwrite(str(root / "small.png"), numpy.zeros((20, 30), numpy.uint8))
+    cv2.imwrite(str(root / "large.jpg"), numpy.zeros((80, 90, 3), numpy.uint8))
+    pipeline = tmpdir / "pipeline.json"
+    save_pipeline(str(pipeline), [CropOp(Box(0, 0, 50, 50))])
+
+    def imread(*args):
+        raise AssertionError("image decoded")
+
+    monkeypatch.setattr(cv2, "imread", imread)
+    assert main([str(pipeline), str(root), "--check"]) == 2
+    assert main([str(pipeline), str(root / "large.jpg"), "--check"]) == 0
@@ -0,0 +1,520 @@
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from functools import partial
+
+import cv2
+import numpy
+import pytest
+
+from opencvstudio.dataops import create_npy, open_npy, read_frames
+from opencvstudio.engine import Engine, apply_operations, run_operations, \
+    validate_operations
+from opencvstudio.engine.cache import ResultCache
+from opencvstudio.engine.outputs import OutputFormatError, load_outputs, \
+    save_outputs
+from opencvstudio.engine.planner import color_path
+from opencvstudio.engine.tiled import run_tiled
+from opencvstudio.engine.worker import EngineWorker, Task
+from opencvstudio.opmodel import Operation, OperationContext, \
+    OperationResult, Parameter
+from opencvstudio.ops.box_ops import CropOp
+from opencvstudio.ops.color_ops import ChangeColorSpaceOp
+from opencvstudio.ops.filter_ops import GaussianBlurOp
+from opencvstudio.ops.mask_ops import MaskOp, ThresholdOp
+from opencvstudio.primitives import Box, Size
+from opencvstudio.primitives.box import BoxArray
+from opencvstudio.primitives.buffers import BufferPool
+from opencvstudio.primitives.color import ColorSpace
+from opencvstudio.primitives.error import ImageOperationError
+from opencvstudio.primitives.image import Image, ImageSpec
+
+
+executions = Counter()
+
+
+@dataclass(eq=False)
+class AddOp(Operation):
+
+    value: int = 1
+
+    @classmethod
+    def parameters(cls):
+        return [
+            Parameter("value", int, 1)
+        ]
+
+    def execute(self, ctx: OperationContext, img: Image) -> Image:
+        executions[id(self)] += 1
+        return img.replace_data(img.data + self.value)
+
+
+@pytest.fixture()
+def engine():
+    executions.clear()
+    engine = Engine(OperationContext())
+    engine.set_input(
+        Image(numpy.zeros((4, 6, 3), dtype=numpy.uint8), ColorSpace.BGR))
+    return engine
+
+
+def calls(engine):
+    return [executions[id(step.operation)] for step in engine.steps]
+
+
+def test_update_resumes_from_added_step(engine):
+    engine.add_operation(AddOp(1))
+    engine.add_operation(AddOp(2))
+    engine.update()
+    assert calls(engine) == [1, 1]
+
+    engine.add_operation(AddOp(3))
+    engine.update()
+    assert calls(engine) == [1, 1, 1]
+    assert engine.output.data[0, 0, 0] == 6
+
+
+def test_update_detects_edited_parameters(engine):
+    for i in range(3):
+        engine.add_operation(AddOp(1))
+    engine.update()
+
+    engine[1].operation.value = 10
+    engine.update()
+    assert calls(engine) == [1, 2, 2]
+    assert engine.output.data[0, 0, 0] == 12
+
+    engine.update()
+    assert calls(engine) == [1, 2, 2]
+
+
+def test_set_input_invalidates_all_steps(engine):
+    engine.add_operation(AddOp(1))
+    engine.add_operation(AddOp(1))
+    engine.update()
+
+    engine.set_input(
+        Image(numpy.ones((2, 2, 3), dtype=numpy.uint8), ColorSpace.BGR))
+    engine.update()
+    assert calls(engine) == [2, 2]
+    assert engine.output.data[0, 0, 0] == 3
+
+
+def test_set_operation_invalidates_following_steps(engine):
+    engine.add_operation(AddOp(1))
+    engine.add_operation(AddOp(1))
+    engine.update()
+
+    engine.set_operation(1, AddOp(5))
+    engine.update()
+    assert calls(engine) == [1, 1]
+    assert engine.output.data[0, 0, 0] == 6
+
+
+def test_cache_returns_result_for_restored_parameters(engine):
+    engine.add_operation(AddOp(1))
+    engine.add_operation(AddOp(2))
+    engine.update()
+
+    engine[1].operation.value = 3
+    engine.update()
+    engine[1].operation.value = 2
+    engine.update()
+    assert calls(engine) == [1, 2]
+    assert engine.output.data[0, 0, 0] == 3
+    assert engine.cache.hits == 1
+
+
+def test_cache_evicts_least_recently_used():
+    cache = ResultCache(max_bytes=250)
+
+    def image(value):
+        return Image(numpy.full((10, 10), value, numpy.uint8), ColorSpace.GRAY)
+
+    cache.put("a", OperationResult(image(1)))
+    cache.put("b", OperationResult(image(2)))
+    assert cache.get("a") is not None
+    cache.put("c", OperationResult(image(3)))
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+    assert cache.size == 200
+    assert cache.evicted_bytes == 100
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+@pytest.fixture()
+def crop_engine():
+    engine = Engine(OperationContext())
+    data = numpy.random.RandomState(0).randint(
+        0, 256, (60, 80, 3), dtype=numpy.uint8)
+    engine.set_input(Image(data, ColorSpace.BGR))
+    engine.add_operation(CropOp(Box(10, 5, 50, 40)))
+    engine.add_operation(ChangeColorSpaceOp(ColorSpace.GRAY))
+    engine.add_operation(CropOp(Box(4, 2, 40, 30)))
+    return engine
+
+
+def test_output_region(crop_engine):
+    assert crop_engine.output_region() == Box(0, 0, 40, 30)
+
+
+def test_preview_computes_region_only(crop_engine):
+    preview = crop_engine.preview(Box(5, 6, 20, 50))
+
+    assert preview.region == Box(5, 6, 20, 24)
+    assert crop_engine.dirty == 0
+    crop_engine.update()
+    numpy.testing.assert_array_equal(
+        preview.image.data, crop_engine.output.data[6:30, 5:25])
+
+
+def test_preview_scaled(crop_engine):
+    preview = crop_engine.preview(Box(0, 0, 40, 30), 0.5)
+
+    assert preview.region == Box(0, 0, 40, 30)
+    assert preview.image.data.shape == (15, 20)
+
+
+def test_preview_crops_neighborhood_margin():
+    engine = Engine(OperationContext())
+    engine.set_input(Image(numpy.random.RandomState(0).randint(
+        0, 255, (40, 40), numpy.uint8), ColorSpace.GRAY))
+    engine.add_operation(GaussianBlurOp(1.0))
+    preview = engine.preview(Box(20, 20, 10, 10))
+
+    assert preview.region == Box(20, 20, 10, 10)
+    engine.update()
+    numpy.testing.assert_array_equal(
+        preview.image.data, engine.output.data[20:30, 20:30])
+
+
+def test_preview_falls_back_to_output(engine):
+    engine.add_operation(AddOp(1))
+    preview = engine.preview(Box(1, 1, 2, 2))
+
+    assert preview.region == Box(1, 1, 2, 2)
+    assert preview.image.data.shape == (2, 2, 3)
+    assert calls(engine) == [1]
+
+
+def test_worker_executes_only_newest_request(engine):
+    started = threading.Event()
+    release = threading.Event()
+    done = threading.Event()
+    results = []
+
+    def blocking(engine, cancelled):
+        started.set()
+        release.wait()
+        return "blocking"
+
+    def update(engine, cancelled):
+        return engine.update(cancelled)
+
+    def deliver(result):
+        results.append(result)
+        done.set()
+
+    worker = EngineWorker(engine)
+    worker.start()
+    try:
+        worker.request(Task(blocking, deliver))
+        started.wait()
+        for i in range(3):
+            worker.request(Task(lambda engine, cancelled, i=i: i, deliver))
+        worker.request(Task(update, deliver))
+        release.set()
+        assert done.wait(5)
+    finally:
+        worker.close()
+
+    assert results == [True]
+
+
+def test_update_stops_when_cancelled(engine):
+    for i in range(3):
+        engine.add_operation(AddOp(1))
+
+    assert not engine.update(lambda: sum(calls(engine)) == 2)
+    assert calls(engine) == [1, 1, 0]
+    assert engine.update()
+    assert calls(engine) == [1, 1, 1]
+
+
+def test_update_prefix_and_step_results(engine):
+    for i in range(3):
+        engine.add_operation(AddOp(1))
+
+    assert engine.update(until=2)
+    assert calls(engine) == [1, 1, 0]
+    assert engine.result(1).data[0, 0, 0] == 2
+    assert engine.result(2) is None
+
+    engine[1].operation.value = 5
+    assert engine.result(0) is not None
+    assert engine.result(1) is None
+
+
+def test_validate_propagates_spec():
+    engine = Engine(OperationContext())
+    engine.add_operation(CropOp(Box(10, 10, 50, 40)))
+    engine.add_operation(ChangeColorSpaceOp(ColorSpace.GRAY))
+    engine.add_operation(ChangeColorSpaceOp(ColorSpace.RGBA))
+    engine.add_operation(CropOp(Box(0, 0, 60, 40)))
+
+    spec = ImageSpec(Size(100, 100), ColorSpace.BGR)
+    errors = engine.validate(spec)
+
+    assert [i for i, _ in errors] == [3]
+    assert "exceeds" in errors[0][1][0]
+    assert engine.validate(ImageSpec(Size(40, 40), ColorSpace.BGR))[0][0] == 0
+
+
+def test_validate_rejects_operations_with_several_inputs():
+    operations = [ThresholdOp(), MaskOp()]
+    spec = ImageSpec(Size(100, 100), ColorSpace.GRAY)
+    assert validate_operations(operations, spec) == [
+        (1, ["Mask needs a mask input"])]
+
+
+def test_color_conversions_are_fused(crop_engine):
+    engine = crop_engine
+    engine.set_operation(1, ChangeColorSpaceOp(ColorSpace.RGB))
+    engine.add_operation(ChangeColorSpaceOp(ColorSpace.RGB))
+    engine.add_operation(ChangeColorSpaceOp(ColorSpace.GRAY))
+    engine.update()
+
+    expected = cv2.cvtColor(engine.input.data, cv2.COLOR_BGR2GRAY)[7:37, 14:54]
+    numpy.testing.assert_array_equal(engine.output.data, expected)
+    assert engine.output.color == ColorSpace.GRAY
+    assert engine.result(2) is not None
+    assert engine.result(3) is None
+
+    assert engine.update(until=4)
+    assert engine.result(3).color == ColorSpace.RGB
+
+
+@pytest.mark.parametrize("color, targets, path", [
+    (ColorSpace.BGR, [ColorSpace.RGB, ColorSpace.GRAY], [ColorSpace.GRAY]),
+    (ColorSpace.GRAY, [ColorSpace.RGB, ColorSpace.GRAY], []),
+    (ColorSpace.BGR, [ColorSpace.GRAY, ColorSpace.RGB],
+     [ColorSpace.GRAY, ColorSpace.RGB]),
+    (ColorSpace.RGBA, [ColorSpace.BGR, ColorSpace.RGBA],
+     [ColorSpace.BGR, ColorSpace.RGBA]),
+    (ColorSpace.BGR, [ColorSpace.BGR], []),
+])
+def test_color_path(color, targets, path):
+    assert color_path(color, targets) == path
+
+
+def test_map_yields_results_in_order(engine):
+    engine.add_operation(AddOp(1))
+    engine.add_operation(AddOp(2))
+    read = []
+
+    def images():
+        for i in range(20):
+            read.append(i)
+            yield Image(numpy.full((4, 6, 3), i, dtype=numpy.uint8),
+                        ColorSpace.BGR)
+
+    results = engine.map(images(), workers=2, max_pending=3)
+    first = next(results)
+    assert int(first.data[0, 0, 0]) == 3
+    # back-pressure: not all images were read
+    assert len(read) <= 4
+
+    assert [int(img.data[0, 0, 0]) for img in results] == \
+        [i + 3 for i in range(1, 20)]
+
+
+def test_map_video_frames(engine, tmpdir):
+    path = str(tmpdir / "video.avi")
+    writer = cv2.VideoWriter(
+        path, cv2.VideoWriter_fourcc(*"MJPG"), 10, (6, 4))
+    for i in range(5):
+        writer.write(numpy.full((4, 6, 3), i * 40, dtype=numpy.uint8))
+    writer.release()
+
+    engine.add_operation(CropOp(Box(1, 1, 2, 2)))
+    frames = (Image(frame, ColorSpace.BGR) for frame in read_frames(path))
+    results = list(engine.map(frames, workers=2))
+
+    assert len(results) == 5
+    assert all(img.size == Size(2, 2) for img in results)
+
+
+def test_run_tiled_matches_full_execution(tmpdir):
+    data = numpy.random.default_rng(0).integers(
+        0, 256, (100, 130, 3), dtype=numpy.uint8)
+    numpy.save(str(tmpdir / "input.npy"), data)
+    source = Image(open_npy(tmpdir / "input.npy"), ColorSpace.BGR)
+    operations = [CropOp(Box(5, 7, 110, 80)), GaussianBlurOp(1.5),
+                  ChangeColorSpaceOp(ColorSpace.GRAY)]
+
+    expected = run_operations(OperationContext(), operations, source)
+    result = run_tiled(
+        OperationContext(), operations, source, tile_size=16, workers=2,
+        allocate=partial(create_npy, tmpdir / "output.npy"))
+
+    assert result.color == ColorSpace.GRAY
+    assert numpy.array_equal(result.data, expected.data)
+    assert numpy.array_equal(open_npy(tmpdir / "output.npy"), expected.data)
+
+
+def test_run_tiled_rejects_unsupported_operation(engine):
+    with pytest.raises(ImageOperationError):
+        run_tiled(OperationContext(), [AddOp(1)], engine.input)
+
+
+def test_buffer_pool_reuses_released_arrays():
+    pool = BufferPool()
+    array = pool.take((4, 6), numpy.uint8)
+    pool.release(array)
+    assert pool.take((4, 6), numpy.uint8) is array
+    assert (pool.hits, pool.misses, pool.size) == (1, 1, 0)
+
+    # views may be referenced by their base
+    pool.release(array[1:])
+    pool.release(numpy.zeros((3, 3), numpy.uint8).T)
+    assert pool.size == 0
+
+
+def test_run_operations_reuses_owned_data():
+    ctx = OperationContext()
+    operations = [ChangeColorSpaceOp(ColorSpace.RGB),
+                  ChangeColorSpaceOp(ColorSpace.BGR),
+                  GaussianBlurOp(1.0)]
+    data = numpy.random.RandomState(0).randint(
+        0, 255, (16, 16, 3), numpy.uint8)
+    expected = run_operations(ctx, operations, Image(data, ColorSpace.BGR))
+    assert expected.owned
+    assert ctx.buffers.misses > 0
+
+    ctx.release(expected)
+    misses = ctx.buffers.misses
+    owned = Image(data.copy(), ColorSpace.BGR, owned=True)
+    result = run_operations(ctx, operations, owned)
+    assert ctx.buffers.misses == misses
+    assert numpy.may_share_memory(result.data, owned.data)
+    numpy.testing.assert_array_equal(result.data, expected.data)
+
+
+def test_update_reuses_replaced_results():
+    ctx = OperationContext()
+    engine = Engine(ctx, ResultCache(max_bytes=0))
+    engine.set_input(Image(numpy.zeros((8, 8, 3), numpy.uint8),
+                           ColorSpace.BGR))
+    engine.add_operation(GaussianBlurOp(1.0))
+    engine.add_operation(GaussianBlurOp(1.0))
+    engine.update()
+    assert (ctx.buffers.hits, ctx.buffers.misses) == (0, 2)
+
+    engine[1].operation.sigma = 2.0
+    engine.update()
+    assert (ctx.buffers.hits, ctx.buffers.misses) == (1, 2)
+
+    # results passed outside of the engine are never reused
+    output = engine.output
+    engine[1].operation.sigma = 3.0
+    engine.update()
+    assert (ctx.buffers.hits, ctx.buffers.misses) == (1, 3)
+    assert output.data is not engine.output.data
+
+
+def test_update_does_not_modify_kept_results(engine):
+    data = engine.input.data.copy()
+    engine.add_operation(ChangeColorSpaceOp(ColorSpace.RGB))
+    engine.add_operation(GaussianBlurOp(1.0))
+    engine.update()
+    first = engine[0].result.data.copy()
+
+    assert not engine.output.owned
+    assert not engine[0].result.owned
+    numpy.testing.assert_array_equal(engine.input.data, data)
+    numpy.testing.assert_array_equal(engine[0].result.data, first)
+
+
+@dataclass(eq=False)
+class DetectOp(Operation):
+    """
+    Finds nonzero pixels and measures the mean.
+    """
+
+    def execute(self, ctx: OperationContext, img: Image) -> OperationResult:
+        executions[id(self)] += 1
+        y, x = numpy.nonzero(img.data[..., 0])
+        return OperationResult(img, {
+            "boxes": BoxArray.from_columns(x, y, 1, 1),
+            "mean": float(img.data.mean()),
+        })
+
+
+@dataclass(eq=False)
+class CountOp(Operation):
+    """
+    Uses boxes of a previous step.
+    """
+
+    def apply(self, ctx: OperationContext,
+              input: OperationResult) -> OperationResult:
+        executions[id(self)] += 1
+        return input.updated(OperationResult(input.image, {
+            "count": len(input.outputs["boxes"])}))
+
+
+def test_update_passes_outputs_to_following_steps(engine):
+    engine.input.data[1, 2] = 9
+    engine.set_input(engine.input)
+    engine.add_operation(DetectOp())
+    engine.add_operation(AddOp(1))
+    engine.add_operation(CountOp())
+    engine.update()
+
+    assert engine.outputs["count"] == 1
+    assert list(engine.outputs["boxes"]) == [Box(2, 1, 1, 1)]
+    assert engine.operation_result(1).outputs.keys() == {"boxes", "mean"}
+
+    # outputs are cached with the images
+    engine.clear_operations()
+    executions.clear()
+    for operation in (DetectOp(), AddOp(1), CountOp()):
+        engine.add_operation(operation)
+    engine.update()
+    assert calls(engine) == [0, 0, 0]
+    assert engine.outputs["count"] == 1
+
+
+def test_apply_operations_keeps_outputs():
+    img = Image(numpy.zeros((4, 6, 3), numpy.uint8), ColorSpace.BGR)
+    result = apply_operations(
+        OperationContext(), [DetectOp(), AddOp(2)], OperationResult(img))
+
+    assert result.image.data[0, 0, 0] == 2
+    assert len(result.outputs["boxes"]) == 0
+    assert result.outputs["mean"] == 0.0
+
+
+def test_outputs_roundtrip(tmpdir):
+    outputs = {
+        "boxes": BoxArray.from_xywh([[1, 2, 3, 4]]),
+        "confidences": numpy.array([0.5, 0.25], numpy.float32),
+        "mean": 1.5,
+        "words": ("a", "b"),
+        "text": "a b",
+    }
+    path = str(tmpdir / "outputs.json")
+    save_outputs(path, outputs)
+    loaded = load_outputs(path)
+
+    assert list(loaded["boxes"]) == [Box(1, 2, 3, 4)]
+    assert loaded["confidences"].dtype == numpy.float32
+    numpy.testing.assert_array_equal(
+        loaded["confidences"], outputs["confidences"])
+    assert (loaded["mean"], loaded["words"], loaded["text"]) == (
+        1.5, ("a", "b"), "a b")
+
+    with pytest.raises(OutputFormatError):
+        save_outputs(path, {"image": Image})
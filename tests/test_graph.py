@@ -0,0 +1,139 @@
+import threading
+from dataclasses import dataclass
+
+import numpy
+import pytest
+
+from opencvstudio.engine import run_operations
+from opencvstudio.engine.graph import INPUT, GraphEngine, GraphError, \
+    PipelineGraph, TreeItem
+from opencvstudio.engine.pipeline import PipelineFormatError, dump_graph, \
+    dump_pipeline, parse_graph, parse_pipeline
+from opencvstudio.opmodel import Operation, OperationContext
+from opencvstudio.ops.color_ops import ChangeColorSpaceOp
+from opencvstudio.ops.filter_ops import GaussianBlurOp
+from opencvstudio.ops.mask_ops import MaskOp, ThresholdOp
+from opencvstudio.primitives.color import ColorSpace
+from opencvstudio.primitives.image import Image
+
+
+@dataclass(eq=False)
+class BarrierOp(Operation):
+    """
+    Blocks until all operations sharing `barrier` run at the same time.
+    """
+
+    barrier: threading.Barrier = None
+
+    def execute(self, ctx: OperationContext, img: Image) -> Image:
+        self.barrier.wait(timeout=5)
+        return img
+
+
+def branching_graph():
+    graph = PipelineGraph()
+    graph.add("gray", ChangeColorSpaceOp(ColorSpace.GRAY))
+    graph.add("binary", ThresholdOp(100.0), "gray")
+    graph.add("blur", GaussianBlurOp(1.0), "gray")
+    graph.add("masked", MaskOp(), {"image": INPUT, "mask": "binary"})
+    return graph
+
+
+@pytest.fixture()
+def img():
+    data = numpy.zeros((8, 10, 3), numpy.uint8)
+    data[2:5, 3:7] = (50, 200, 250)
+    return Image(data, ColorSpace.BGR)
+
+
+def test_graph_order_and_tree():
+    graph = branching_graph()
+
+    assert graph.order() == ["gray", "binary", "blur", "masked"]
+    assert graph.order(["blur"]) == ["gray", "blur"]
+    assert graph.outputs() == ["blur", "masked"]
+    assert graph.tree() == [
+        TreeItem("gray", (TreeItem("binary", ()), TreeItem("blur", ()))),
+        TreeItem("masked", ()),
+    ]
+
+    with pytest.raises(GraphError):
+        graph.connect("gray", "image", "masked")
+    with pytest.raises(GraphError):
+        graph.remove("binary")
+    with pytest.raises(GraphError):
+        graph.add("mask2", MaskOp(), "missing")
+
+
+def test_graph_engine_computes_shared_results_once(img):
+    engine = GraphEngine(OperationContext(), branching_graph())
+    engine.set_input(img)
+    assert engine.update()
+
+    masked = engine.result("masked").image
+    expected = numpy.zeros_like(img.data)
+    expected[2:5, 3:7] = (50, 200, 250)
+    numpy.testing.assert_array_equal(masked.data, expected)
+    numpy.testing.assert_array_equal(
+        engine.result("blur").image.data,
+        run_operations(OperationContext(), [
+            ChangeColorSpaceOp(ColorSpace.GRAY), GaussianBlurOp(1.0)],
+            img).data)
+    assert engine.cache.misses == 4
+
+    engine.graph["blur"].operation.sigma = 2.0
+    assert engine.stale() == ["blur"]
+    versions = {node.name: node.version for node in engine.graph}
+    engine.update()
+    assert {node.name: node.version for node in engine.graph} == {
+        **versions, "blur": 2}
+
+    engine.set_input(img.replace_data(img.data.copy()))
+    assert engine.result("gray") is None
+    engine.update(targets=["binary"])
+    assert engine.stale() == ["blur", "masked"]
+    assert engine.cache.hits == 2
+
+
+def test_graph_engine_runs_branches_concurrently(img):
+    barrier = threading.Barrier(2)
+    graph = PipelineGraph()
+    graph.add("a", BarrierOp(barrier))
+    graph.add("b", BarrierOp(barrier))
+    engine = GraphEngine(OperationContext(), graph, workers=2)
+    engine.set_input(img)
+
+    assert engine.update()
+    assert engine.result("a").image is engine.input
+
+
+def test_graph_engine_cancel(img):
+    engine = GraphEngine(OperationContext(), branching_graph())
+    engine.set_input(img)
+
+    assert not engine.update(cancelled=lambda: True)
+    assert engine.result("gray") is None
+
+
+def test_graph_roundtrip():
+    graph = branching_graph()
+    data = dump_graph(graph)
+    assert data["version"] == 2
+    assert data["operations"][3] == {
+        "name": "masked", "type": "mask", "parameters": {},
+        "inputs": {"image": "input", "mask": "binary"}}
+
+    parsed = parse_graph(data)
+    assert [(node.name, node.operation, node.inputs) for node in parsed] \
+        == [(node.name, node.operation, node.inputs) for node in graph]
+    with pytest.raises(PipelineFormatError):
+        parse_pipeline(data)
+
+
+def test_linear_pipeline_as_graph():
+    operations = [ChangeColorSpaceOp(ColorSpace.GRAY), ThresholdOp(otsu=True)]
+    graph = parse_graph(dump_pipeline(operations))
+
+    assert [node.name for node in graph] == ["step1", "step2"]
+    assert graph.chain() == operations
+    assert parse_pipeline(dump_graph(graph)) == operations
@@ -0,0 +1,187 @@
+import importlib
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+from types import ModuleType
+
+from pyhotreload import benchmark
+from pyhotreload.__main__ import BatchedQueue, ReloadProcessor
+from pyhotreload.graph import Binding, scan_imports
+from pyhotreload.index import ModuleIndex, file_stat
+from pyhotreload.timing import ReloadHistory
+from pyhotreload.watch import FilteredEventHandler, ModuleWatcher, \
+    PathFilter
+from watchdog.events import FileModifiedEvent
+
+
+def module(name, file=None):
+    mod = ModuleType(name)
+    if file is not None:
+        mod.__file__ = file
+    return mod
+
+
+def test_module_index(tmpdir):
+    a = str(tmpdir / "a.py")
+    b = str(tmpdir / "b.py")
+    modules = {"a": module("a", a), "builtin": module("builtin")}
+    index = ModuleIndex(modules)
+
+    index.refresh()
+    assert index.lookup(os.path.realpath(a)) == "a"
+    assert index.lookup(os.path.realpath(b)) is None
+
+    # modules imported later are found after refresh
+    modules["b"] = module("b", b)
+    index.refresh()
+    assert index.lookup(os.path.realpath(b)) == "b"
+
+    # removed and replaced modules
+    del modules["a"]
+    modules["b"] = module("b", a)
+    index.refresh()
+    assert index.lookup(os.path.realpath(a)) == "b"
+    assert index.lookup(os.path.realpath(b)) is None
+    assert len(index) == 1
+
+
+def test_module_index_source_stat(tmpdir):
+    a = str(tmpdir / "a.py")
+    b = str(tmpdir / "b.py")
+    for path in (a, b):
+        Path(path).write_text("")
+    modules = {"a": module("a", a)}
+    index = ModuleIndex(modules)
+    index.refresh()
+    assert index.source_stat("a") == file_stat(a)
+
+    # b may have changed after it was loaded
+    later = time.time_ns() + 10 ** 9
+    os.utime(b, ns=(later, later))
+    modules["b"] = module("b", b)
+    index.refresh()
+    assert index.source_stat("b") is None
+
+
+def test_scan_imports():
+    source = (
+        "import os.path\n"
+        "from . import sibling\n"
+        "from .sub import name as alias\n"
+        "try:\n"
+        "    from json import loads\n"
+        "except ImportError:\n"
+        "    pass\n"
+        "def f():\n"
+        "    from re import compile\n"
+    )
+    imports = scan_imports(source, "pkg.mod", False)
+
+    assert {"os.path", "pkg", "pkg.sibling", "pkg.sub", "json", "re"} \
+        <= imports.modules
+    assert imports.bindings == (
+        Binding("pkg", "sibling", "sibling"),
+        Binding("pkg.sub", "name", "alias"),
+        Binding("json", "loads", "loads"),
+    )
+
+
+def test_batched_queue():
+    batches = []
+    done = threading.Event()
+
+    def process(items):
+        batches.append(items)
+        done.set()
+
+    queue = BatchedQueue(process, min_latency=0.05, max_latency=0.5)
+    queue.start()
+    try:
+        for i in range(100):
+            queue.add_item(f"file{i % 10}")
+        assert done.wait(5)
+    finally:
+        queue.close()
+
+    assert batches == [[f"file{i}" for i in range(10)]]
+    assert queue.received == 100
+    assert queue.batches == 1
+    assert queue.last_batch_size == 10
+    assert queue.last_latency >= 0.05
+    assert queue.depth == 0
+
+
+def test_reload_order_and_bindings(pypackage):
+    pkg = Path(pypackage) / "pyhotreload_graph"
+    pkg.mkdir()
+    (pkg / "__init__.py").write_text("")
+    (pkg / "a.py").write_text("VALUE = 1\n")
+    (pkg / "b.py").write_text("from .a import VALUE\n")
+    (pkg / "c.py").write_text("from pyhotreload_graph import b\n")
+    importlib.import_module("pyhotreload_graph.c")
+
+    history = ReloadHistory()
+    with ReloadProcessor(history=history) as processor:
+        processor.index.refresh()
+        processor.graph.update(
+            processor.index.files(), processor.index.packages())
+        assert processor.graph.order(
+            ["pyhotreload_graph.c", "pyhotreload_graph.b",
+             "pyhotreload_graph.a"]) == \
+            ["pyhotreload_graph.a", "pyhotreload_graph.b",
+             "pyhotreload_graph.c"]
+
+        (pkg / "a.py").write_text("VALUE = 2\n")
+        processor.reload_files([(pkg / "a.py").resolve()])
+
+    assert sys.modules["pyhotreload_graph.b"].VALUE == 2
+    assert [stats.module for stats in history.items()] == \
+        ["pyhotreload_graph.a"]
+    assert history.items()[0].timing.mode == "module"
+
+
+def test_benchmark(capsys):
+    assert benchmark.main(["--modules", "2", "--classes", "1",
+                           "--functions", "2", "--events", "0"]) == 0
+    out = capsys.readouterr().out
+    assert "changed function: 2 definitions" in out
+    assert "changed module: 2 module" in out
+
+
+def test_filtered_event_handler(tmpdir):
+    events = []
+
+    class Handler:
+        def dispatch(self, event):
+            events.append(event.src_path)
+
+    path_filter = PathFilter(exclude=["*/generated/*"])
+    handler = FilteredEventHandler(Handler(), path_filter)
+    for path in ["a.py", "__pycache__/a.cpython-37.pyc", ".git/index",
+                 "generated/b.py", "b.py"]:
+        handler.dispatch(FileModifiedEvent(str(tmpdir / path)))
+
+    assert events == [str(tmpdir / "a.py"), str(tmpdir / "b.py")]
+
+
+def test_module_watcher(tmpdir):
+    scheduled = []
+
+    class Observer:
+        def schedule(self, handler, path, recursive):
+            scheduled.append((path, recursive))
+
+    (tmpdir / "sub").mkdir()
+    modules = {"a": module("a", str(tmpdir / "a.py"))}
+    watcher = ModuleWatcher(Observer(), None, PathFilter(),
+                            index=ModuleIndex(modules))
+    watcher.update()
+    assert scheduled == [(os.path.realpath(tmpdir), False)]
+
+    # directories of newly imported modules are added
+    modules["b"] = module("b", str(tmpdir / "b.py"))
+    modules["c"] = module("c", str(tmpdir / "sub" / "c.py"))
+    watcher.update()
+    assert scheduled[1:] == [(os.path.realpath(tmpdir / "sub"), False)]
@@ -0,0 +1,81 @@
+import cv2
+import numpy
+import pytest
+
+from opencvstudio.dataops import read_image, read_image_header
+from opencvstudio.engine import Engine
+from opencvstudio.engine.cache import image_fingerprint
+from opencvstudio.loader import LazyImage, load_image
+from opencvstudio.opmodel import OperationContext
+from opencvstudio.ops.color_ops import ChangeColorSpaceOp
+from opencvstudio.primitives import Box, Size
+from opencvstudio.primitives.color import ColorSpace
+
+
+@pytest.mark.parametrize("name, shape, dtype", [
+    ("gray.png", (20, 30), numpy.uint8),
+    ("bgr.png", (20, 30, 3), numpy.uint8),
+    ("bgra.png", (20, 30, 4), numpy.uint8),
+    ("deep.png", (20, 30, 3), numpy.uint16),
+    ("gray.jpg", (21, 31), numpy.uint8),
+    ("bgr.jpg", (21, 31, 3), numpy.uint8),
+    ("bgr.npy", (20, 30, 3), numpy.float32),
+])
+def test_header_matches_decoded_data(tmpdir, name, shape, dtype):
+    path = str(tmpdir / name)
+    data = numpy.arange(numpy.prod(shape)).reshape(shape).astype(dtype)
+    if name.endswith(".npy"):
+        numpy.save(path, data)
+    else:
+        cv2.imwrite(path, data)
+
+    decoded = read_image(path)
+    channels = decoded.shape[2] if decoded.ndim == 3 else 1
+    assert read_image_header(path) == \
+        (decoded.shape[1], decoded.shape[0], channels, decoded.dtype)
+
+
+def test_lazy_image_decodes_on_data_access(tmpdir):
+    path = str(tmpdir / "image.png")
+    cv2.imwrite(path, numpy.full((40, 60, 4), 7, numpy.uint8))
+
+    img = load_image(path)
+    assert isinstance(img, LazyImage)
+    assert img.spec.size == Size(60, 40)
+    assert img.color == ColorSpace.BGRA
+    image_fingerprint(img)
+    assert not img.loaded
+
+    assert img.data.shape == (40, 60, 4)
+    assert img.loaded
+
+
+def test_preview_decodes_reduced(tmpdir):
+    path = str(tmpdir / "image.jpg")
+    cv2.imwrite(path, numpy.full((400, 600, 3), 128, numpy.uint8))
+
+    engine = Engine(OperationContext())
+    engine.set_input(load_image(path))
+    preview = engine.preview(Box(0, 0, 600, 400), 0.25)
+
+    assert not engine.input.loaded
+    assert preview.image.data.shape == (100, 150, 3)
+
+
+@pytest.mark.parametrize("operations", [
+    [], [ChangeColorSpaceOp(ColorSpace.RGB)]])
+def test_viewport_preview_keeps_large_input_unloaded(tmpdir, operations):
+    path = str(tmpdir / "image.jpg")
+    cv2.imwrite(path, numpy.full((400, 600, 3), 128, numpy.uint8))
+
+    engine = Engine(OperationContext())
+    engine.set_input(load_image(path))
+    for operation in operations:
+        engine.add_operation(operation)
+    extent, preview = engine.viewport_preview(
+        Box(0, 0, 100, 50), 0.25, max_pixels=1000)
+
+    assert not engine.input.loaded
+    assert extent == Box(0, 0, 600, 400)
+    assert preview.region == Box(0, 0, 400, 200)
+    assert preview.image.data.shape == (50, 100, 3)
@@ -0,0 +1,134 @@
+import shutil
+
+import cv2
+import numpy
+import pytest
+
+from opencvstudio import ocr
+from opencvstudio.engine.pipeline import dump_pipeline, parse_pipeline
+from opencvstudio.ocr import OcrResult, TesseractPool, parse_data
+from opencvstudio.opmodel import OperationResult
+from opencvstudio.ops.ocr_ops import OcrOp
+from opencvstudio.primitives import Box
+from opencvstudio.primitives.box import BoxArray
+from opencvstudio.primitives.color import ColorSpace
+from opencvstudio.primitives.error import ImageOperationError
+from opencvstudio.primitives.image import Image
+
+
+def tesseract_data(*words):
+    """
+    :param words: tuples of page, line and text
+    """
+    columns = ("level", "page_num", "block_num", "par_num", "line_num",
+               "left", "top", "width", "height", "conf", "text")
+    data = {column: [] for column in columns}
+    for i, (page, line, text) in enumerate(words):
+        values = (5, page, 1, 1, line, 10 * i, 2, 8, 6, "91.5", text)
+        for column, value in zip(columns, values):
+            data[column].append(value)
+    return data
+
+
+def test_parse_data_splits_pages():
+    data = tesseract_data(
+        (1, 1, "Hello"), (1, 1, "world"), (1, 2, "again"), (3, 1, "last"),
+        (3, 1, " "))
+
+    first, second, third = parse_data(data, 3)
+
+    assert first.text == "Hello world\nagain"
+    assert first.words == ("Hello", "world", "again")
+    assert first.boxes.to_xywh().tolist() == [
+        [0, 2, 8, 6], [10, 2, 8, 6], [20, 2, 8, 6]]
+    assert first.confidences.tolist() == [91.5] * 3
+    assert (second.text, len(second.boxes)) == ("", 0)
+    assert third.words == ("last",)
+
+
+class FakeRecognizer:
+
+    def __init__(self):
+        self.batches = []
+
+    def __call__(self, images, language, config):
+        self.batches.append(len(images))
+        return [OcrResult(str(img.shape), BoxArray.from_xywh([0, 0, 1, 1]),
+                          (str(img.shape),), numpy.array([90.0]))
+                for img in images]
+
+
+def test_pool_batches_and_caches_regions():
+    recognizer = FakeRecognizer()
+    pool = TesseractPool(workers=2, recognize=recognizer)
+    images = [numpy.full((4, 4), i, numpy.uint8) for i in range(5)]
+
+    results = pool.run(images + [images[0]])
+    assert recognizer.batches == [3, 2]
+    assert results[0] is results[-1]
+    assert pool.processes == 2
+
+    pool.run(images[:3])
+    assert recognizer.batches == [3, 2]
+    assert pool.hits == 3
+
+
+def test_pool_is_created_on_first_use(monkeypatch):
+    monkeypatch.setattr(ocr, "_pool", None)
+    pool = ocr.get_pool()
+    assert isinstance(pool, TesseractPool)
+    assert ocr.get_pool() is pool
+
+
+def test_ocr_op_translates_regions(monkeypatch):
+    recognizer = FakeRecognizer()
+    monkeypatch.setattr(ocr, "_pool", TesseractPool(recognize=recognizer))
+    op = OcrOp((Box(2, 3, 4, 5), Box(6, 0, 10, 10)))
+    img = Image(numpy.zeros((8, 12, 3), numpy.uint8), ColorSpace.BGR)
+
+    result = op.recognize(img)
+
+    assert result.text == "(5, 4)\n\n(8, 6)"
+    assert list(result.boxes) == [Box(2, 3, 1, 1), Box(6, 0, 1, 1)]
+    assert op.execute(None, img).image.data[3, 2].tolist() == [0, 0, 255]
+    assert img.data.max() == 0
+    assert op.errors(img.spec) == (
+        "OCR region 6x0x10x10 exceeds image of size 12x8",)
+
+
+def test_ocr_op_uses_regions_of_previous_step(monkeypatch):
+    monkeypatch.setattr(
+        ocr, "_pool", TesseractPool(recognize=FakeRecognizer()))
+    img = Image(numpy.zeros((8, 12), numpy.uint8), ColorSpace.GRAY)
+    input = OperationResult(img, {
+        "lines": BoxArray.from_xywh([[0, 0, 12, 3], [0, 4, 12, 3]])})
+
+    result = OcrOp(regions_from="lines").apply(None, input)
+
+    assert result.outputs["text"] == "(3, 12)\n\n(3, 12)"
+    assert result.outputs["words"] == ("(3, 12)", "(3, 12)")
+    assert list(result.outputs["word_boxes"]) == [
+        Box(0, 0, 1, 1), Box(0, 4, 1, 1)]
+    assert "lines" in result.outputs
+    with pytest.raises(ImageOperationError):
+        OcrOp(regions_from="missing").apply(None, input)
+
+
+def test_ocr_op_roundtrip():
+    operations = [OcrOp((Box(1, 2, 3, 4),), "deu", 6)]
+    assert parse_pipeline(dump_pipeline(operations)) == operations
+
+
+@pytest.mark.skipif(shutil.which("tesseract") is None,
+                    reason="tesseract is not installed")
+def test_run_tesseract():
+    pytest.importorskip("pytesseract")
+    images = []
+    for text in ("HELLO", "WORLD"):
+        img = numpy.full((60, 240), 255, numpy.uint8)
+        cv2.putText(img, text, (10, 45), cv2.FONT_HERSHEY_SIMPLEX, 1.5, 0, 3)
+        images.append(img)
+
+    results = ocr.run_tesseract(images, "eng", "--psm 7")
+
+    assert [result.words for result in results] == [("HELLO",), ("WORLD",)]
@@ -0,0 +1,58 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+from opencvstudio.engine.pipeline import PipelineFormatError, \
+    load_pipeline, parse_pipeline, save_pipeline
+from opencvstudio.ops.box_ops import CropOp
+from opencvstudio.ops.color_ops import ChangeColorSpaceOp
+from opencvstudio.primitives import Box
+from opencvstudio.primitives.color import ColorSpace
+
+
+def test_save_load_roundtrip(tmpdir):
+    operations = [CropOp(Box(1, 2, 3, 4)), ChangeColorSpaceOp(ColorSpace.RGB)]
+    path = str(tmpdir / "pipeline.json")
+
+    save_pipeline(path, operations)
+
+    assert load_pipeline(path) == operations
+    assert json.loads((tmpdir / "pipeline.json").read_text("utf-8")) == {
+        "format": "opencvstudio.pipeline",
+        "version": 1,
+        "operations": [
+            {"type": "crop", "parameters": {
+                "box": {"x": 1, "y": 2, "width": 3, "height": 4}}},
+            {"type": "change_color_space", "parameters": {"target": "RGB"}},
+        ],
+    }
+
+
+@pytest.mark.parametrize("data", [
+    {},
+    {"format": "opencvstudio.pipeline", "version": 3, "operations": []},
+    {"format": "opencvstudio.pipeline", "version": 1,
+     "operations": [{"type": "unknown"}]},
+    {"format": "opencvstudio.pipeline", "version": 1,
+     "operations": [{"type": "change_color_space",
+                     "parameters": {"target": "XYZ"}}]},
+])
+def test_parse_invalid(data):
+    with pytest.raises(PipelineFormatError):
+        parse_pipeline(data)
+
+
+def test_parse_missing_type():
+    data = {"format": "opencvstudio.pipeline", "version": 1,
+            "operations": [{"parameters": {}}]}
+    with pytest.raises(PipelineFormatError,
+                       match="Missing type of operation"):
+        parse_pipeline(data)
+
+
+def test_load_does_not_import_gtk():
+    code = ("import sys, opencvstudio.engine.pipeline;"
+            "assert 'gi' not in sys.modules")
+    subprocess.run([sys.executable, "-c", code], check=True)
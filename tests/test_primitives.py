@@ -0,0 +1,64 @@
+import copy
+import pickle
+
+import numpy
+import pytest
+
+from opencvstudio.primitives import Box, RgbaColor, Size
+from opencvstudio.primitives.box import BoxArray
+
+
+@pytest.mark.parametrize("value", [
+    Box(1, 2, 3, 4), Size(5, 6), RgbaColor(1, 2, 3, 4)])
+def test_primitives_are_slotted_and_picklable(value):
+    assert not hasattr(value, "__dict__")
+    assert pickle.loads(pickle.dumps(value)) == value
+    assert copy.deepcopy(value) == value
+    with pytest.raises(AttributeError):
+        value.x = 0
+
+
+@pytest.fixture()
+def boxes():
+    return BoxArray.from_boxes(
+        [Box(0, 0, 10, 10), Box(5, 5, 10, 10), Box(-4, 8, 6, 4)])
+
+
+def test_box_array_matches_box(boxes):
+    bounds = Box(2, 2, 10, 10)
+    assert list(boxes.intersection(bounds)) == [
+        box.intersection(bounds) for box in boxes]
+    assert list(boxes.clipped(Size(12, 10))) == [
+        Box(0, 0, 10, 10), Box(5, 5, 7, 5), Box(0, 8, 2, 2)]
+    assert boxes.area().tolist() == [100, 100, 24]
+    assert boxes[1] == Box(5, 5, 10, 10)
+    assert list(boxes[boxes.x >= 0]) == [boxes[0], boxes[1]]
+
+
+def test_box_array_iou(boxes):
+    iou = boxes.iou(boxes)
+    assert iou.shape == (3, 3)
+    assert iou[0, 1] == pytest.approx(25 / 175)
+    numpy.testing.assert_allclose(numpy.diag(iou), 1.0)
+
+
+def test_box_array_nms():
+    boxes = BoxArray.from_xywh(
+        [[0, 0, 10, 10], [1, 1, 10, 10], [20, 20, 5, 5], [0, 0, 10, 9]])
+    keep = boxes.nms([0.5, 0.9, 0.3, 0.8], threshold=0.5)
+    assert keep.tolist() == [1, 2]
+    assert boxes.nms([0.5, 0.9, 0.3, 0.8], threshold=0.9).tolist() == \
+        [1, 3, 0, 2]
+
+
+def test_box_array_crop_and_extract(boxes):
+    img = numpy.arange(12 * 16).reshape(12, 16)
+    crops = boxes.crop(img)
+    assert [crop.shape for crop in crops] == [(10, 10), (7, 10), (4, 2)]
+    numpy.testing.assert_array_equal(crops[1], img[5:12, 5:15])
+
+    patches = BoxArray.from_xywh([[0, 0, 4, 4], [8, 4, 2, 2]]).extract(
+        img, Size(2, 2))
+    assert patches.shape == (2, 2, 2)
+    numpy.testing.assert_array_equal(patches[0], img[1:4:2, 1:4:2])
+    numpy.testing.assert_array_equal(patches[1], img[4:6, 8:10])
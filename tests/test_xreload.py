@@ -1,11 +1,18 @@
 import importlib
 import os
+import py_compile
 import re
 import sys
 import shutil
+import time
+import zipfile
 from pathlib import Path
 
 import pytest
+from opencvstudio.opmodel import operation_type, \
+    register_operation
+from pyhotreload import xreload as xreload_module
+from pyhotreload.index import ModuleIndex
 from pyhotreload.xreload import xreload
 
 filetests = Path(__file__).parent / "filetests"
@@ -52,3 +59,157 @@ def test_xreload(pypackage, testfile: os.DirEntry):
 
     # test
     test_after()
+
+
+def test_xreload_executes_only_changes(pypackage):
+    pkg = Path(pypackage) / "pyhotreload_tests_changes"
+    pkg.mkdir()
+    (pkg / "__init__.py").write_text("executions = 0\n")
+    module_path = pkg / "mod.py"
+    module_path.write_text(
+        "import pyhotreload_tests_changes as pkg\n"
+        "pkg.executions += 1\n"
+        "def function():\n"
+        "    return 0\n")
+    mod = importlib.import_module("pyhotreload_tests_changes.mod")
+    pkg_mod = sys.modules["pyhotreload_tests_changes"]
+    function = mod.function
+
+    # unchanged source compared with bytecode of the loaded source
+    past = time.time() - 10
+    os.utime(str(module_path), (past, past))
+    py_compile.compile(str(module_path), cfile=mod.__cached__)
+    index = ModuleIndex()
+    index.refresh()
+    module_path.write_text(module_path.read_text())
+    xreload(mod, loaded=index.source_stat(mod.__name__))
+    assert pkg_mod.executions == 1
+
+    # only the changed function is executed
+    module_path.write_text(module_path.read_text().replace("0", "42"))
+    xreload(mod)
+    assert pkg_mod.executions == 1
+    assert function() == 42
+
+    # other statements changed
+    module_path.write_text(module_path.read_text() + "VALUE = 1\n")
+    xreload(mod)
+    assert pkg_mod.executions == 2
+    assert mod.VALUE == 1
+
+
+def test_xreload_executes_source_it_read(pypackage, monkeypatch):
+    module_path = Path(pypackage) / "pyhotreload_tests_read.py"
+    module_path.write_text("VALUE = 1\n")
+    mod = importlib.import_module("pyhotreload_tests_read")
+    loader = mod.__spec__.loader
+    get_source = loader.get_source
+
+    def get_source_and_change(name):
+        text = get_source(name)
+        module_path.write_text("VALUE = 3\n")
+        return text
+
+    # the file changes again while reloading
+    module_path.write_text("VALUE = 2\n")
+    monkeypatch.setattr(loader, "get_source", get_source_and_change)
+    xreload(mod)
+    assert mod.VALUE == 2
+
+    monkeypatch.undo()
+    xreload(mod)
+    assert mod.VALUE == 3
+
+
+def test_xreload_registered_operation(pypackage):
+    module_path = Path(pypackage) / "pyhotreload_tests_op.py"
+    module_path.write_text(
+        "from opencvstudio.opmodel import Operation, register_operation\n"
+        "@register_operation('pyhotreload_test')\n"
+        "class TestOp(Operation):\n"
+        "    pass\n"
+        "VALUE = 1\n")
+    mod = importlib.import_module("pyhotreload_tests_op")
+
+    module_path.write_text(
+        module_path.read_text().replace("VALUE = 1", "VALUE = 2"))
+    xreload(mod)
+    assert mod.VALUE == 2
+    assert operation_type("pyhotreload_test").__module__ == mod.__name__
+
+    with pytest.raises(ValueError, match="already registered"):
+        register_operation("pyhotreload_test")(type("TestOp", (), {}))
+
+
+def test_xreload_reuses_fresh_bytecode(pypackage, monkeypatch):
+    module_path = Path(pypackage) / "pyhotreload_tests_pyc.py"
+    module_path.write_text("VALUE = 1\n")
+    mod = importlib.import_module("pyhotreload_tests_pyc")
+    module_path.write_text("VALUE = 2\n")
+    xreload(mod)
+
+    compiled = []
+
+    def counting_compile(*args):
+        compiled.append(args)
+        return compile(*args)
+
+    monkeypatch.setattr(xreload_module, "compile", counting_compile,
+                        raising=False)
+
+    # bytecode written after the second the source was modified in
+    module_path.write_text("VALUE = 3\n")
+    past = time.time() - 10
+    os.utime(str(module_path), (past, past))
+    py_compile.compile(str(module_path), cfile=mod.__cached__)
+    xreload(mod)
+    assert mod.VALUE == 3
+    assert not compiled
+
+    module_path.write_text("VALUE = 4\n")
+    xreload(mod)
+    assert mod.VALUE == 4
+    assert len(compiled) == 1
+
+
+def test_xreload_ignores_bytecode_of_other_source(pypackage):
+    module_path = Path(pypackage) / "pyhotreload_tests_stale.py"
+    module_path.write_text("VALUE = 1\n")
+    mod = importlib.import_module("pyhotreload_tests_stale")
+    index = ModuleIndex()
+    index.refresh()
+
+    # e.g. written by another process importing the changed module
+    module_path.write_text("VALUE = 2\n")
+    past = time.time() - 10
+    os.utime(str(module_path), (past, past))
+    py_compile.compile(str(module_path), cfile=mod.__cached__)
+    xreload(mod, loaded=index.source_stat(mod.__name__))
+    assert mod.VALUE == 2
+
+
+def test_xreload_zip(tmpdir):
+    archive = str(tmpdir / "modules.zip")
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("pyhotreload_tests_zip.py", "def f():\n    return 1\n")
+    sys.path.append(archive)
+    try:
+        mod = importlib.import_module("pyhotreload_tests_zip")
+        f = mod.f
+
+        with zipfile.ZipFile(archive, "w") as zf:
+            zf.writestr("pyhotreload_tests_zip.py",
+                        "def f():\n    return 42\n")
+        xreload(mod)
+    finally:
+        sys.path.remove(archive)
+    assert f() == 42
+
+
+def test_xreload_namespace_package(pypackage):
+    (Path(pypackage) / "pyhotreload_tests_namespace").mkdir()
+    mod = importlib.import_module("pyhotreload_tests_namespace")
+    path = list(mod.__path__)
+
+    assert xreload(mod) is mod
+    assert list(mod.__path__) == path